@@ -1,5 +1,5 @@
 from selenium.webdriver.common.by import By
-import time
+from typing import Optional, Set
 from includes.AttributeManager import AttributeManager
 from includes.SiteProcessor import SiteProcessor
 from includes import globals
@@ -9,10 +9,11 @@ from includes.BaseAutomation import BaseAutomation
 from includes.argument_parser_utility import create_base_parser, add_property_arguments
 
 class AttributesProcessor(BaseAutomation):
-    def __init__(self, username: str, password: str, property_name: str, start_number: int = 1, debug: bool = False):
+    def __init__(self, username: str, password: str, property_name: str, start_number: int = 1, debug: bool = False, sites: Optional[Set[int]] = None):
         super().__init__(username, password, debug)
         self.property_name = property_name
         self.start_number = start_number
+        self.sites = sites
         self.attribute_manager = None
         self.site_processor = None
 
@@ -26,19 +27,19 @@ class AttributesProcessor(BaseAutomation):
         self.selenium_helper.wait_for_element(By.XPATH, RMS_XPaths.MAIN_WINDOW, timeout=DEFAULT_TIMEOUT)
         self.logger.info("Main window loaded")
 
-        globals.wait_for_dropdown_and_select(self.driver, self.property_name)
-        time.sleep(2)
-        current_number = self.start_number - 1
+        globals.wait_for_dropdown_and_select(self.driver, self.property_name, pacer=self.selenium_helper.pacer, settle_fallback=5)
         container_xpath = RMS_XPaths.CONTAINER
 
-        while True:
-            next_row, next_number, _ = self.site_processor.find_next_site(current_number, container_xpath)
-            if not next_row:
-                self.logger.info(f"No more sites found after number {current_number}. Ending process.")
-                break
+        self.site_processor.build_site_index(container_xpath)
+        entries = self.site_processor.select_sites(self.start_number, self.sites)
+        self.open_journal(f"AttributesProcessor:{self.property_name}", (entry.site_number for entry in entries))
+        self.site_processor.process_sites(
+            entries, container_xpath,
+            lambda row, entry: self.site_processor.process_site_attrs(row, entry.site_number, attributes_to_add, attributes_to_remove),
+            self.journal, self.retry_failed, self.item_timeout
+        )
 
-            self.site_processor.process_site_attrs(next_row, next_number, attributes_to_add, attributes_to_remove)
-            current_number = next_number
+        self.logger.info("All selected sites processed. Ending process.")
 
 def main():
     parser = create_base_parser("RMS Cloud Attributes Processor Automation Script")
@@ -47,7 +48,8 @@ def main():
 
     setup_logging(f"attributes_processor_{args.property}")
 
-    processor = AttributesProcessor(args.username, args.password, args.property, args.start, args.debug)
+    processor = AttributesProcessor(args.username, args.password, args.property, args.start, args.debug, args.sites)
+    processor.apply_common_args(args)
     processor.run()
 
 if __name__ == "__main__":
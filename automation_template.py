@@ -86,6 +86,7 @@ def main():
     data = load_data_from_file(args.data_file)
 
     automation = AutomationTemplate(args.username, args.password, args.property, data, args.debug)
+    automation.apply_common_args(args)
     automation.run()
 
 if __name__ == "__main__":
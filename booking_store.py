@@ -0,0 +1,48 @@
+import argparse
+import os
+from includes.BookingStore import BookingBlobStore
+
+def export_bookings(store: BookingBlobStore, folder: str) -> int:
+    """Writes every stored booking back out as <reservation id>.html, for tools that want plain files."""
+    os.makedirs(folder, exist_ok=True)
+    count = 0
+    for reservation_id in store.reservation_ids():
+        with open(os.path.join(folder, f"{reservation_id}.html"), 'w', encoding='utf-8') as f:
+            f.write(store.read(reservation_id))
+        count += 1
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the saved booking store written by the Newbook dump scripts")
+    parser.add_argument("--bookings", default="bookings", help="Booking store folder")
+    parser.add_argument("--raw-html", action="store_true", help="Import pages as saved instead of normalizing them")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="Add a folder of legacy <reservation id>.html files to the store")
+    import_parser.add_argument("folder")
+    subparsers.add_parser("stats", help="Show booking, blob and size counts")
+    subparsers.add_parser("normalize", help="Re-save bookings stored before normalization (then run compact)")
+    subparsers.add_parser("compact", help="Drop content no booking refers to any more (run while no dump is saving)")
+    export_parser = subparsers.add_parser("export", help="Write every booking out as <reservation id>.html")
+    export_parser.add_argument("folder")
+    args = parser.parse_args()
+
+    store = BookingBlobStore(args.bookings, normalize=not args.raw_html)
+    try:
+        if args.command == "import":
+            print(f"Imported {store.import_folder(args.folder)} bookings into {args.bookings}")
+        elif args.command == "stats":
+            stats = store.stats()
+            ratio = stats["stored_bytes"] / stats["html_bytes"] if stats["html_bytes"] else 0
+            print(f"{stats['bookings']} bookings, {stats['blobs']} distinct pages, "
+                  f"{stats['html_bytes'] / 1024 / 1024:.1f} MB of HTML stored in {stats['stored_bytes'] / 1024 / 1024:.1f} MB ({ratio:.0%})")
+        elif args.command == "normalize":
+            print(f"Normalized {store.normalize_all()} bookings; run compact to reclaim the space")
+        elif args.command == "compact":
+            print(f"Reclaimed {store.compact() / 1024 / 1024:.1f} MB")
+        elif args.command == "export":
+            print(f"Exported {export_bookings(store, args.folder)} bookings to {args.folder}")
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()
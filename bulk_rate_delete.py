@@ -1,45 +1,69 @@
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import TimeoutException, ElementClickInterceptedException
 import time
+from typing import Dict, Optional
+from includes.SeleniumHelper import GridRow
+from includes.JobJournal import FAILED
 from includes.logging_config import setup_logging
 from includes.constants import DEFAULT_TIMEOUT, RMS_XPaths
-from includes.BaseAutomation import BaseAutomation
+from includes.BaseAutomation import BaseAutomation, NO_ERROR_MODAL, ERROR_MODAL_DISMISSED
+from includes.ItemDeadline import ItemDeadlineExceeded
 from includes.argument_parser_utility import create_base_parser
 
 class BulkRateDelete(BaseAutomation):
     def __init__(self, username: str, password: str, debug: bool = False):
         super().__init__(username, password, debug)
+        self.requires_manual_navigation = True
+        self.max_row_attempts = 3
 
     def perform_automation(self):
+        self.open_journal(f"{self.__class__.__name__}:{self.driver.current_url}")
         self.delete_all_rows()
 
     def get_grid_rows(self):
         try:
-            container = self.selenium_helper.wait_for_element(By.XPATH, RMS_XPaths.BULK_RATE_GRID_CONTAINER, timeout=DEFAULT_TIMEOUT)
-            return container.find_elements(By.XPATH, './/div[contains(@class, "GridLiteRow")]')
+            return self.selenium_helper.snapshot_grid((By.XPATH, RMS_XPaths.BULK_RATE_GRID_CONTAINER), timeout=DEFAULT_TIMEOUT)
         except TimeoutException:
             self.logger.error("Timeout waiting for grid rows to load.")
             return []
 
-    def select_first_row(self):
+    def next_row(self) -> Optional[GridRow]:
+        rows = self.get_grid_rows()
+        self.logger.info(f"Rows remaining: {len(rows)}")
+        # Every listed row still needs deleting, whatever an earlier run recorded; only failed rows are skipped
+        for row in rows:
+            if self.retry_failed or self.journal.status(row.identity()) != FAILED:
+                return row
+        return None
+
+    def count_listed(self, row: GridRow) -> int:
+        """How many listed rows have the same content as row."""
+        rows = self.selenium_helper.snapshot_grid((By.XPATH, RMS_XPaths.BULK_RATE_GRID_CONTAINER), timeout=0)
+        return sum(1 for listed in rows if listed.content() == row.content())
+
+    def is_row_listed(self, row: GridRow, listed_before: int) -> bool:
+        """Whether row is still in the grid: its element is, or as many rows with its content as before deleting it."""
+        rows = self.selenium_helper.snapshot_grid((By.XPATH, RMS_XPaths.BULK_RATE_GRID_CONTAINER), timeout=0)
+        if any(listed.key == row.key for listed in rows):
+            return True
+        return sum(1 for listed in rows if listed.content() == row.content()) >= listed_before
+
+    def select_row(self, row: GridRow):
         try:
-            rows = self.get_grid_rows()
-            if rows:
-                first_column = rows[0].find_element(By.XPATH, './/div[contains(@class, "GridLiteColumn")][1]')
-                first_column.click()
-                self.logger.info("First row selected.")
-                time.sleep(1)  # Wait for any potential UI updates
-            else:
-                self.logger.warning("No rows found to select.")
-                return False
+            row_element = self.selenium_helper.get_row_element(row)
+            first_column = row_element.find_element(By.XPATH, './/div[contains(@class, "GridLiteColumn")][1]')
+            first_column.click()
+            self.logger.info(f"Row selected: {row.identity()}")
+            time.sleep(1)  # Wait for any potential UI updates
             return True
         except Exception as e:
-            self.logger.error(f"Error selecting first row: {str(e)}")
+            self.logger.error(f"Error selecting row: {str(e)}")
             return False
 
-    def delete_row(self):
+    def delete_row(self, row: GridRow):
         try:
-            if not self.select_first_row():
+            listed_before = self.count_listed(row)
+            if not self.select_row(row):
                 return False
 
             if not self.selenium_helper.wait_and_click(By.XPATH, RMS_XPaths.BULK_RATE_DELETE_BUTTON, timeout=DEFAULT_TIMEOUT):
@@ -51,7 +75,12 @@ class BulkRateDelete(BaseAutomation):
                 return False
             
             self.logger.info("Row deleted successfully.")
-            time.sleep(2)  # Wait for the grid to refresh
+            removed = lambda driver: not self.is_row_listed(row, listed_before)
+            pacer = self.selenium_helper.pacer
+            if pacer.settle("delete_rate_row", removed, fallback=2, quiet=0.2) is None and pacer.poll(removed, DEFAULT_TIMEOUT) is None:
+                # Counted as a failed attempt, so a row that never leaves the grid is not deleted over and over
+                self.logger.warning(f"Row still listed after deletion: {row.identity()}")
+                return False
             return True
         except ElementClickInterceptedException:
             self.logger.warning("Delete button is intercepted. Trying to remove overlays...")
@@ -63,7 +92,7 @@ class BulkRateDelete(BaseAutomation):
                     }
                 """)
                 time.sleep(1)
-                return self.delete_row()  # Retry deletion
+                return self.delete_row(row)  # Retry deletion
             except Exception as e:
                 self.logger.error(f"Error removing overlay: {str(e)}")
         except Exception as e:
@@ -71,14 +100,39 @@ class BulkRateDelete(BaseAutomation):
         return False
 
     def delete_all_rows(self):
+        attempts: Dict[str, int] = {}
         while True:
-            rows = self.get_grid_rows()
-            if not rows:
+            row = self.next_row()
+            if row is None:
                 self.logger.info("No more rows to delete. Process complete.")
                 break
-            
-            self.logger.info(f"Rows remaining: {len(rows)}")
-            if not self.delete_row():
+
+            identity = row.identity()
+            self.circuit_breaker.acquire()
+            self.journal.begin(identity)
+            try:
+                with self.item_deadline(identity):
+                    deleted = self.delete_row(row)
+            except ItemDeadlineExceeded as e:
+                self.logger.error(str(e))
+                self.journal.fail(identity, str(e))
+                continue
+            modal = self.check_and_dismiss_error_modal()
+            if modal == ERROR_MODAL_DISMISSED:
+                # Left to the circuit breaker rather than counted as a failed attempt at this row
+                continue
+            if deleted:
+                # Not a success for the circuit breaker while an error modal is stuck open
+                if modal == NO_ERROR_MODAL:
+                    self.circuit_breaker.record_success()
+                self.journal.complete(identity)
+                continue
+
+            attempts[identity] = attempts.get(identity, 0) + 1
+            if attempts[identity] >= self.max_row_attempts:
+                self.logger.error(f"Giving up on row after {attempts[identity]} attempts: {identity}")
+                self.journal.fail(identity, "Row could not be deleted")
+            else:
                 self.logger.warning("Failed to delete row. Retrying...")
                 time.sleep(2)
 
@@ -89,6 +143,7 @@ def main():
     setup_logging("bulk_rate_delete")
 
     bulk_delete = BulkRateDelete(args.username, args.password, args.debug)
+    bulk_delete.apply_common_args(args)
     bulk_delete.run()
 
 if __name__ == "__main__":
@@ -2,15 +2,19 @@ from selenium.webdriver.common.by import By
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.remote.webelement import WebElement
 import time
+from typing import List, Optional
+from includes.SeleniumHelper import GridRow
+from includes.JobJournal import DONE
 from includes.PropertyManager import PropertyManager
 from includes.logging_config import setup_logging
 from includes.constants import DEFAULT_TIMEOUT, RMS_XPaths
-from includes.BaseAutomation import BaseAutomation
+from includes.BaseAutomation import BaseAutomation, NO_ERROR_MODAL, ERROR_MODAL_STUCK
 from includes.argument_parser_utility import create_base_parser
 
 class BulkRateTableReassign(BaseAutomation):
     def __init__(self, username: str, password: str, property_to_select: str, property_to_remove: str, debug: bool = False):
         super().__init__(username, password, debug)
+        self.requires_manual_navigation = True
         self.property_to_select = property_to_select
         self.property_to_remove = property_to_remove
         self.property_manager = None
@@ -20,18 +24,22 @@ class BulkRateTableReassign(BaseAutomation):
         self.property_manager = PropertyManager(self.selenium_helper)
 
     def perform_automation(self):
+        self.open_journal(f"{self.__class__.__name__}:{self.property_to_select}:{self.property_to_remove}")
         self.update_all_rows(self.property_to_select, self.property_to_remove, max_retries=10)
 
-    def get_grid_rows(self):
+    def get_grid_rows(self) -> List[GridRow]:
         try:
-            container = self.selenium_helper.wait_for_element(
-                By.XPATH, RMS_XPaths.RATE_TABLE_GRID_CONTAINER, timeout=DEFAULT_TIMEOUT
-            )
-            return container.find_elements(By.XPATH, './/div[contains(@class, "GridLiteRow")]')
+            return self.selenium_helper.snapshot_grid((By.XPATH, RMS_XPaths.RATE_TABLE_GRID_CONTAINER), timeout=DEFAULT_TIMEOUT)
         except TimeoutException:
             self.logger.error("Timeout waiting for grid rows to load.")
             return []
 
+    def next_row(self) -> Optional[GridRow]:
+        for row in self.get_grid_rows():
+            if self.should_process(row.identity()):
+                return row
+        return None
+
     def is_row_selected(self, row: WebElement):
         try:
             checkbox = row.find_element(By.XPATH, './/div[contains(@class, "GridLiteColumn")][1]//input[@type="checkbox"]')
@@ -39,21 +47,21 @@ class BulkRateTableReassign(BaseAutomation):
         except:
             return False
 
-    def click_first_row_with_retry(self, max_attempts=5, wait_time=10):
+    def click_row_with_retry(self, identity: str, max_attempts=5, wait_time=10):
         for attempt in range(max_attempts):
             try:
-                rows = self.get_grid_rows()
+                rows = [row for row in self.get_grid_rows() if row.identity() == identity]
                 if not rows:
-                    self.logger.warning("No rows found.")
+                    self.logger.warning(f"Row not found: {identity}")
                     return False
                 
-                first_row = rows[0]
+                row_element = self.selenium_helper.get_row_element(rows[0])
                 
-                if not self.is_row_selected(first_row):
-                    first_row.click()
-                    self.logger.info(f"Selected first row (Attempt {attempt + 1})")
+                if not self.is_row_selected(row_element):
+                    row_element.click()
+                    self.logger.info(f"Selected row {identity} (Attempt {attempt + 1})")
                 else:
-                    self.logger.info(f"First row already selected (Attempt {attempt + 1})")
+                    self.logger.info(f"Row {identity} already selected (Attempt {attempt + 1})")
                 
                 if self.selenium_helper.wait_and_click(By.XPATH, RMS_XPaths.EDIT_BUTTON, timeout=wait_time, max_attempts=10, retry_interval=2.0):
                     self.logger.info(f"Clicked Edit button (Attempt {attempt + 1})")
@@ -102,40 +110,38 @@ class BulkRateTableReassign(BaseAutomation):
         self.logger.error("Failed to open AdvancedPropertySelectionModal after all attempts")
         return False
 
-    def check_and_dismiss_error_modal(self, timeout=5):
-        try:
-            if self.selenium_helper.is_modal_visible("ResStatusWarnings"):
-                self.logger.warning("Server error modal detected.")
-                
-                if self.selenium_helper.wait_and_click(By.XPATH, RMS_XPaths.ERROR_MODAL_OK_BUTTON, timeout=timeout):
-                    self.logger.info("Dismissed server error modal.")
-                    return True
-                else:
-                    self.logger.warning("Failed to dismiss server error modal.")
-                    return False
-            else:
-                return False
-        except Exception as e:
-            self.logger.error(f"Error handling server error modal: {str(e)}")
-            return False
-
     def update_all_rows(self, property_to_select: str, property_to_remove: str, max_retries=3):
         retry_count = 0
+        identity = None
         while retry_count < max_retries:
+            # Dismissed server error modals do not use up retries: the circuit breaker backs off until RMS
+            # recovers. A modal that stays open does, as the page cannot be used while it shows
+            self.circuit_breaker.acquire()
             try:
-                if self.check_and_dismiss_error_modal():
-                    self.logger.info("Dismissed error modal, retrying from the beginning.")
-                    retry_count += 1
+                modal = self.check_and_dismiss_error_modal()
+                if modal != NO_ERROR_MODAL:
+                    self.logger.info("Error modal showing, retrying from the beginning.")
+                    if modal == ERROR_MODAL_STUCK:
+                        retry_count += 1
                     continue
 
-                if not self.click_first_row_with_retry():
+                row = self.next_row()
+                if row is None:
+                    self.logger.info("No more rows to update. Process complete.")
+                    return
+                identity = row.identity()
+                self.journal.begin(identity)
+
+                if not self.click_row_with_retry(identity):
                     self.logger.warning("Failed to select and edit a row. Retrying from the beginning.")
                     retry_count += 1
                     continue
 
-                if self.check_and_dismiss_error_modal():
-                    self.logger.info("Dismissed error modal after row selection, retrying from the beginning.")
-                    retry_count += 1
+                modal = self.check_and_dismiss_error_modal()
+                if modal != NO_ERROR_MODAL:
+                    self.logger.info("Error modal after row selection, retrying from the beginning.")
+                    if modal == ERROR_MODAL_STUCK:
+                        retry_count += 1
                     continue
 
                 if not self.click_properties_button_with_retry():
@@ -161,12 +167,16 @@ class BulkRateTableReassign(BaseAutomation):
 
                 time.sleep(1)
 
-                if self.check_and_dismiss_error_modal():
-                    self.logger.info("Dismissed error modal after saving, retrying from the beginning.")
-                    retry_count += 1
+                modal = self.check_and_dismiss_error_modal()
+                if modal != NO_ERROR_MODAL:
+                    self.logger.info("Error modal after saving, retrying from the beginning.")
+                    if modal == ERROR_MODAL_STUCK:
+                        retry_count += 1
                     continue
 
+                self.journal.complete(identity)
                 self.logger.info("Successfully processed a row.")
+                self.circuit_breaker.record_success()
                 retry_count = 0  # Reset the retry count on success
 
             except Exception as e:
@@ -178,6 +188,8 @@ class BulkRateTableReassign(BaseAutomation):
 
         if retry_count >= max_retries:
             self.logger.error(f"Maximum retries ({max_retries}) reached. Exiting the process.")
+            if identity is not None and self.journal.status(identity) != DONE:
+                self.journal.fail(identity, f"Maximum retries ({max_retries}) reached")
 
 def main():
     parser = create_base_parser("RMS Cloud Bulk Rate Table Reassign Automation Script")
@@ -188,6 +200,7 @@ def main():
     setup_logging("bulk_rate_table_reassign")
 
     bulk_reassign = BulkRateTableReassign(args.username, args.password, args.property_to_select, args.property_to_remove, args.debug)
+    bulk_reassign.apply_common_args(args)
     bulk_reassign.run()
 
 if __name__ == "__main__":
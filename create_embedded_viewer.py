@@ -1,30 +1,235 @@
-import os
+import argparse
+import base64
+import gzip
 import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Set, TextIO, Tuple
+from includes.BookingManifest import BookingManifest, ManifestChanges
+from includes.BookingStore import open_bookings
+from includes.SearchIndex import SearchIndexBuilder
+
+DATA_MARKER = '/*BOOKING_DATA*/{}/*BOOKING_DATA*/'
+SEARCH_INDEX_MARKER = '/*SEARCH_INDEX*/null/*SEARCH_INDEX*/'
+DEFAULT_TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'booking-viewer-template.html')
+
+def bucket_of(reservation_id: str, buckets: int) -> int:
+    """FNV-1a hash of the reservation id, matched by BookingShards.bucketOf in the viewer template."""
+    value = 0x811c9dc5
+    for byte in reservation_id.encode('utf-8'):
+        value = ((value ^ byte) * 0x01000193) & 0xffffffff
+    return value % buckets
+
+def script_safe_json(value) -> str:
+    # Keeps "</script>" inside booking HTML from closing the viewer's script element
+    return json.dumps(value).replace('</', '<\\/')
+
+def gzip_base64(text: str) -> str:
+    return base64.b64encode(gzip.compress(text.encode('utf-8'))).decode('ascii')
+
+def write_compressed_chunks(out: TextIO, bookings: Iterator[Tuple[str, str]], chunk_bytes: int) -> int:
+    """Writes a JS array of base64 strings, each a gzip member of [reservation id, html] JSON lines."""
+    count = 0
+    buffer = bytearray()
+    out.write('[\n')
+
+    def write_chunk():
+        out.write('"' + base64.b64encode(gzip.compress(bytes(buffer))).decode('ascii') + '",\n')
+        buffer.clear()
+
+    for reservation_id, html in bookings:
+        buffer += (json.dumps([reservation_id, html]) + '\n').encode('utf-8')
+        count += 1
+        if len(buffer) >= chunk_bytes:
+            write_chunk()
+    if buffer:
+        write_chunk()
+    out.write(']')
+    return count
+
+def write_plain_object(out: TextIO, bookings: Iterator[Tuple[str, str]]) -> int:
+    count = 0
+    out.write('{')
+    for reservation_id, html in bookings:
+        out.write((',\n' if count else '\n') + script_safe_json(reservation_id) + ': ' + script_safe_json(html))
+        count += 1
+    out.write('\n}')
+    return count
 
-def create_embedded_viewer(bookings_folder, template_file, output_file):
-    # Read the HTML template
-    with open(template_file, 'r') as f:
+def write_bucket_file(path: str, bucket: int, bookings: Iterator[Tuple[str, str]]) -> None:
+    """Writes one shard: the index of its bookings (byte offset and length in the uncompressed data) and the gzip data."""
+    index: Dict[str, List[int]] = {}
+    data = bytearray()
+    for reservation_id, html in bookings:
+        encoded = html.encode('utf-8')
+        index[reservation_id] = [len(data), len(encoded)]
+        data += encoded
+    with open(path, 'w', encoding='utf-8') as out:
+        out.write(f"registerBookingBucket({bucket}, {script_safe_json(index)}, "
+                  f"\"{base64.b64encode(gzip.compress(bytes(data))).decode('ascii')}\");\n")
+
+def open_manifest(output_file: str, full: bool) -> BookingManifest:
+    manifest = BookingManifest(os.path.splitext(output_file)[0] + ".manifest.sqlite3")
+    if full:
+        manifest.reset()
+    return manifest
+
+def refresh_manifest(manifest: BookingManifest, bookings, executor: ThreadPoolExecutor) -> ManifestChanges:
+    """
+    Brings the manifest up to date with the saved bookings. Any change drops the cached search index, also in
+    builds that do not write one, so a later build never reuses an index from before the change.
+    """
+    changes = manifest.refresh(bookings, executor)
+    if changes.changed or changes.removed:
+        manifest.delete_setting("search_index")
+    return changes
+
+def search_index_json(manifest: BookingManifest) -> str:
+    """The search index as JSON, cached in the manifest until refresh_manifest sees a booking change."""
+    cached = manifest.get_setting("search_index")
+    if cached is not None:
+        return cached
+    index = SearchIndexBuilder()
+    for reservation_id, fields in manifest.search_fields():
+        index.add_fields(reservation_id, fields)
+    index_json = json.dumps(index.to_dict())
+    manifest.set_setting("search_index", index_json)
+    return index_json
+
+def write_viewer(template_file: str, output_file: str, write_data: Callable[[TextIO], int],
+                 write_search_index: Optional[Callable[[TextIO], None]] = None) -> int:
+    """
+    Writes the template up to the data marker, then whatever write_data streams in, then the template up to
+    the search index marker, the index, and the rest. Templates without the search index marker get no index.
+    """
+    with open(template_file, 'r', encoding='utf-8') as f:
         template = f.read()
+    if DATA_MARKER not in template:
+        raise ValueError(f"{template_file} has no {DATA_MARKER} marker")
+    prefix, suffix = template.split(DATA_MARKER, 1)
+    middle, suffix = suffix.split(SEARCH_INDEX_MARKER, 1) if SEARCH_INDEX_MARKER in suffix else (suffix, "")
+
+    temp_file = f"{output_file}.tmp"
+    with open(temp_file, 'w', encoding='utf-8') as out:
+        out.write(prefix)
+        count = write_data(out)
+        out.write(middle)
+        if suffix:
+            if write_search_index:
+                write_search_index(out)
+            else:
+                out.write('null')
+            out.write(suffix)
+    os.replace(temp_file, output_file)
+    return count
+
+def create_embedded_viewer(bookings_folder: str, template_file: str, output_file: str, compress: bool = True,
+                           chunk_kb: int = 1024, search_index: bool = True, workers: int = 8, full: bool = False) -> int:
+    """
+    Streams every saved booking into a single viewer file. Search fields come from the build manifest, so
+    only new or changed bookings are parsed again. Returns the number of bookings.
+    """
+    bookings = open_bookings(bookings_folder)
+    manifest = open_manifest(output_file, full)
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ViewerRead") as executor:
+            refresh_manifest(manifest, bookings, executor)
+            pages = bookings.read_many(manifest.reservation_ids(), executor)
+            if compress:
+                write_data = lambda out: write_compressed_chunks(out, pages, chunk_kb * 1024)
+                write_index = lambda out: out.write(json.dumps({"gzip": gzip_base64(search_index_json(manifest))}))
+            else:
+                write_data = lambda out: write_plain_object(out, pages)
+                write_index = lambda out: out.write(search_index_json(manifest).replace('</', '<\\/'))
+            count = write_viewer(template_file, output_file, write_data, write_index if search_index else None)
+        manifest.commit()
+        return count
+    finally:
+        manifest.close()
+        bookings.close()
+
+def create_sharded_viewer(bookings_folder: str, template_file: str, output_file: str, shard_size: int = 200,
+                          search_index: bool = True, workers: int = 8, full: bool = False) -> int:
+    """
+    Writes a viewer that only inlines a small manifest, plus <output name>_data/bucket-NNNN.js shards that the
+    page loads on demand. Bookings are assigned to shards by a hash of the reservation id, so the page can find
+    a booking's shard without loading a full index. The search index goes to search-index.js in the same
+    folder and is only loaded on the first search. Returns the number of bookings.
+
+    Rebuilds only rewrite the shards holding new, changed or removed bookings. The shard count is kept
+    between builds until the average shard drifts past half or twice shard_size.
+    """
+    data_folder = os.path.splitext(output_file)[0] + "_data"
+    os.makedirs(data_folder, exist_ok=True)
+    bookings = open_bookings(bookings_folder)
+    manifest = open_manifest(output_file, full)
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ViewerRead") as executor:
+            changes = refresh_manifest(manifest, bookings, executor)
+            reservation_ids = manifest.reservation_ids()
+
+            wanted = max(1, math.ceil(len(reservation_ids) / shard_size))
+            buckets = int(manifest.get_setting("buckets") or 0)
+            bucket_path = lambda bucket: os.path.join(data_folder, f"bucket-{bucket:04d}.js")
+            if not buckets or buckets * 2 < wanted or buckets > wanted * 2:
+                buckets = wanted
+                for entry in os.scandir(data_folder):
+                    if entry.name.startswith('bucket-') and entry.name.endswith('.js'):
+                        os.remove(entry.path)
+            dirty: Set[int] = {bucket_of(reservation_id, buckets) for reservation_id in changes.changed + changes.removed}
+            dirty.update(bucket for bucket in range(buckets) if not os.path.exists(bucket_path(bucket)))
 
-    # Gather booking data
-    booking_data = {}
-    for filename in os.listdir(bookings_folder):
-        if filename.endswith('.html'):
-            reservation_id = filename.split('.')[0]
-            with open(os.path.join(bookings_folder, filename), 'r') as f:
-                booking_data[reservation_id] = f.read()
+            bucket_ids: Dict[int, List[str]] = {bucket: [] for bucket in dirty}
+            for reservation_id in reservation_ids:
+                bucket = bucket_of(reservation_id, buckets)
+                if bucket in bucket_ids:
+                    bucket_ids[bucket].append(reservation_id)
+            for bucket in sorted(dirty):
+                write_bucket_file(bucket_path(bucket), bucket, bookings.read_many(bucket_ids[bucket], executor))
+            manifest.set_setting("buckets", str(buckets))
 
-    # Convert booking data to JSON
-    json_data = json.dumps(booking_data)
+        folder = os.path.basename(data_folder)
+        index_file = os.path.join(data_folder, "search-index.js")
+        if search_index:
+            with open(index_file, 'w', encoding='utf-8') as out:
+                out.write(f"registerSearchIndex(\"{gzip_base64(search_index_json(manifest))}\");\n")
+        elif os.path.exists(index_file):
+            os.remove(index_file)
 
-    # Insert the JavaScript data into the template
-    output_html = template.replace('/*BOOKING_DATA*/{}/*BOOKING_DATA*/', json_data)
+        shards = {"folder": folder, "buckets": buckets}
+        write_viewer(template_file, output_file, lambda out: out.write(f"new BookingShards({json.dumps(shards)})"),
+                     (lambda out: out.write(json.dumps({"src": f"{folder}/search-index.js"}))) if search_index else None)
+        manifest.commit()
+        return len(reservation_ids)
+    finally:
+        manifest.close()
+        bookings.close()
 
-    # Write the final HTML file
-    with open(output_file, 'w') as f:
-        f.write(output_html)
+def main():
+    parser = argparse.ArgumentParser(description="Build a single-file HTML viewer for saved Newbook booking tables")
+    parser.add_argument("--bookings", default="bookings", help="Saved bookings: a booking store or a legacy folder of <reservation id>.html files")
+    parser.add_argument("--template", default=DEFAULT_TEMPLATE, help="Viewer template containing the " + DATA_MARKER + " marker")
+    parser.add_argument("--output", default="co-booking-viewer.html", help="Viewer file to write")
+    parser.add_argument("--chunk-kb", type=int, default=1024, help="Uncompressed size of each embedded data chunk in KB")
+    parser.add_argument("--no-compress", action="store_true",
+                        help="Embed the bookings as a plain JSON object (for browsers without DecompressionStream)")
+    parser.add_argument("--sharded", action="store_true",
+                        help="Write the bookings to <output name>_data/ shards that the viewer loads on demand, "
+                             "keeping the viewer itself small; the folder must stay next to the viewer")
+    parser.add_argument("--shard-size", type=int, default=200, help="Average number of bookings per shard with --sharded")
+    parser.add_argument("--no-search-index", action="store_true", help="Skip building the search index (exact reservation ID lookup only)")
+    parser.add_argument("--workers", type=int, default=8, help="Threads used to scan and read booking files")
+    parser.add_argument("--full", action="store_true", help="Ignore the build manifest and re-read every booking")
+    args = parser.parse_args()
 
-    print(f"Created embedded viewer: {output_file}")
+    if args.sharded:
+        count = create_sharded_viewer(args.bookings, args.template, args.output, args.shard_size, not args.no_search_index,
+                                      args.workers, args.full)
+    else:
+        count = create_embedded_viewer(args.bookings, args.template, args.output, not args.no_compress, args.chunk_kb,
+                                       not args.no_search_index, args.workers, args.full)
+    print(f"Created embedded viewer: {args.output} ({count} bookings, {os.path.getsize(args.output) / 1024 / 1024:.1f} MB)")
 
-# Call this function in your main script
-create_embedded_viewer('bookings', 'booking-viewer-template.html', 'co-booking-viewer.html')
\ No newline at end of file
+if __name__ == "__main__":
+    main()
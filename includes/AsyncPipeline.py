@@ -0,0 +1,133 @@
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple, Type
+from includes.logging_config import get_logger
+
+class RateLimiter:
+    """Token bucket limiting how many requests per second start against each host."""
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self.buckets: Dict[str, Tuple[float, float]] = {}
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, host: str) -> None:
+        while True:
+            async with self.lock:
+                now = time.monotonic()
+                tokens, updated = self.buckets.get(host, (float(self.burst), now))
+                tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+                if tokens >= 1:
+                    self.buckets[host] = (tokens - 1, now)
+                    return
+                self.buckets[host] = (tokens, now)
+                wait = (1 - tokens) / self.rate
+            await asyncio.sleep(wait)
+
+class AsyncPipeline:
+    """
+    ID source -> fetch -> parse -> sink pipeline with bounded concurrency.
+
+    fetch(item) may be a coroutine function or a blocking function (run on a dedicated thread pool).
+    parse(item, fetched) turns the fetched payload into a result; sink(item, result, error) receives
+    every item exactly once, with error set when fetch/parse still failed after all retries.
+    With ordered=True, sink sees items in source order; otherwise as soon as they finish.
+    parse runs on the fetch thread pool and sink on a thread of its own, one item at a time, so
+    neither holds up the event loop that keeps the fetches going.
+    """
+    def __init__(self, fetch: Callable[[Any], Any], parse: Callable[[Any, Any], Any], sink: Callable[[Any, Any, Optional[str]], None],
+                 concurrency: int = 16, rate_per_host: Optional[float] = None, host_of: Optional[Callable[[Any], str]] = None,
+                 retries: int = 3, base_delay: float = 0.5, max_delay: float = 10.0, ordered: bool = True,
+                 retry_exceptions: Tuple[Type[Exception], ...] = (Exception,)):
+        self.fetch = fetch
+        self.parse = parse
+        self.sink = sink
+        self.concurrency = concurrency
+        self.rate_limiter = RateLimiter(rate_per_host) if rate_per_host else None
+        self.host_of = host_of or (lambda item: "")
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.ordered = ordered
+        self.retry_exceptions = retry_exceptions
+        self.logger = get_logger(self.__class__.__name__)
+        self.stats = {"processed": 0, "failed": 0, "retried": 0}
+
+    def run(self, source: Iterable[Any]) -> Dict[str, float]:
+        return asyncio.run(self.run_async(source))
+
+    async def run_async(self, source: Iterable[Any]) -> Dict[str, float]:
+        started = time.monotonic()
+        work_queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        self.pending_results: Dict[int, Tuple[Any, Any, Optional[str]]] = {}
+        self.next_index = 0
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="PipelineFetch") as executor, \
+                ThreadPoolExecutor(max_workers=1, thread_name_prefix="PipelineSink") as sink_executor:
+            self.executor = executor
+            self.sink_executor = sink_executor
+            workers = [asyncio.create_task(self.worker(work_queue)) for _ in range(self.concurrency)]
+            for index, item in enumerate(source):
+                await work_queue.put((index, item))
+            for _ in workers:
+                await work_queue.put(None)
+            await asyncio.gather(*workers)
+
+        elapsed = time.monotonic() - started
+        self.stats["elapsed"] = elapsed
+        self.stats["per_minute"] = self.stats["processed"] * 60 / elapsed if elapsed else 0.0
+        self.logger.info(f"Pipeline finished: {self.stats['processed']} items ({self.stats['failed']} failed, "
+                         f"{self.stats['retried']} retries) in {elapsed:.1f}s, {self.stats['per_minute']:.0f}/min")
+        return self.stats
+
+    async def worker(self, work_queue: asyncio.Queue) -> None:
+        while True:
+            entry = await work_queue.get()
+            if entry is None:
+                return
+            index, item = entry
+            result, error = await self.process(item)
+            await self.emit(index, item, result, error)
+
+    async def process(self, item: Any) -> Tuple[Any, Optional[str]]:
+        for attempt in range(self.retries + 1):
+            try:
+                if self.rate_limiter:
+                    await self.rate_limiter.acquire(self.host_of(item))
+                fetched = await self.call_fetch(item)
+                return await asyncio.get_running_loop().run_in_executor(self.executor, self.parse, item, fetched), None
+            except self.retry_exceptions as e:
+                if attempt == self.retries:
+                    return None, str(e)
+                # Full jitter keeps concurrent retries from hitting the host in lockstep
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                self.stats["retried"] += 1
+                self.logger.warning(f"{item}: {str(e)}, retrying in {delay:.2f} seconds...")
+                await asyncio.sleep(delay)
+
+    async def call_fetch(self, item: Any) -> Any:
+        if asyncio.iscoroutinefunction(self.fetch):
+            return await self.fetch(item)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.fetch, item)
+
+    async def emit(self, index: int, item: Any, result: Any, error: Optional[str]) -> None:
+        if not self.ordered:
+            await self.deliver(item, result, error)
+            return
+        # Hold finished items until every earlier item has been delivered
+        self.pending_results[index] = (item, result, error)
+        deliveries = []
+        while self.next_index in self.pending_results:
+            # Handed to the sink thread in order before awaiting, so other workers cannot overtake them
+            deliveries.append(self.deliver(*self.pending_results.pop(self.next_index)))
+            self.next_index += 1
+        for delivery in deliveries:
+            await delivery
+
+    def deliver(self, item: Any, result: Any, error: Optional[str]) -> asyncio.Future:
+        self.stats["processed"] += 1
+        if error is not None:
+            self.stats["failed"] += 1
+        return asyncio.get_running_loop().run_in_executor(self.sink_executor, self.sink, item, result, error)
@@ -1,9 +1,22 @@
+from typing import Dict, Any, Callable, Iterable, Optional, ContextManager
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
 from includes.SeleniumHelper import SeleniumHelper
+from includes.SessionCache import SessionCache
+from includes.CallProfiler import CallProfiler
+from includes.CircuitBreaker import CircuitBreaker
+from includes.ItemDeadline import ItemDeadline, item_deadline
+from includes.JobJournal import JobJournal
 from includes.logging_config import get_logger
+from includes.constants import RMS_CLIENT_ID, NB_CR_LOGIN_CODE, RMS_LOGIN_URL, NB_LOGIN_URL, RMS_XPaths, JOB_JOURNAL_PATH
 from includes import globals
 
+# Outcomes of BaseAutomation.check_and_dismiss_error_modal
+NO_ERROR_MODAL = "none"
+ERROR_MODAL_DISMISSED = "dismissed"
+ERROR_MODAL_STUCK = "stuck"
+
 class BaseAutomation:
     def __init__(self, username: str, password: str, debug: bool = False):
         self.username = username
@@ -12,14 +25,108 @@ class BaseAutomation:
         self.logger = get_logger(self.__class__.__name__)
         self.driver = None
         self.selenium_helper = None
+        self.fresh_login = False
+        # Scripts that expect the operator to navigate to a starting page before pressing Enter
+        self.requires_manual_navigation = False
+        self.session_cache = SessionCache(username, password)
+        self.journal: Optional[JobJournal] = None
+        self.journal_path = JOB_JOURNAL_PATH
+        self.restart_journal = False
+        self.retry_failed = False
+        self.profiler: Optional[CallProfiler] = None
+        self.item_timeout: Optional[float] = None
+        # Shared by worker copies, so all browsers back off together while RMS is failing
+        self.circuit_breaker = CircuitBreaker("RMS server errors")
 
-    def setup(self):
+    def apply_common_args(self, args):
+        """Applies the options added by create_base_parser that every automation shares."""
+        self.fresh_login = getattr(args, "fresh_login", False)
+        self.journal_path = getattr(args, "journal", JOB_JOURNAL_PATH)
+        self.restart_journal = getattr(args, "restart", False)
+        self.retry_failed = getattr(args, "retry_failed", False)
+        self.item_timeout = getattr(args, "item_timeout", None)
+        if getattr(args, "profile", False):
+            self.profiler = CallProfiler()
+
+    def open_journal(self, job: str, items: Iterable[str] = (), is_recorded: Optional[Callable[[str], bool]] = None) -> JobJournal:
+        """
+        Opens the job journal for this run and registers its work items. Items an interrupted run left
+        in flight are marked done when is_recorded finds their output, otherwise they are queued again.
+        """
+        self.journal = JobJournal(job, self.journal_path)
+        if self.restart_journal:
+            self.logger.info(f"Restarting job {job}: clearing its journal")
+            self.journal.reset()
+        self.journal.register(items)
+        self.journal.recover(is_recorded)
+
+        summary = self.journal.summary()
+        self.logger.info(f"Job journal {job}: {summary['done']} done, {summary['failed']} failed, {summary['pending']} pending")
+        if summary["failed"] and not self.retry_failed:
+            self.logger.info("Failed items are skipped. Use --retry-failed to process them again.")
+        return self.journal
+
+    def item_deadline(self, item: str) -> ContextManager[Optional[ItemDeadline]]:
+        """Bounds the browser waits made while processing item by --item-timeout (see ItemDeadline)."""
+        return item_deadline(item, self.item_timeout)
+
+    def should_process(self, item: str) -> bool:
+        return self.journal is None or self.journal.should_process(item, self.retry_failed)
+
+    def close_journal(self):
+        if self.journal:
+            failures = self.journal.failures()
+            if failures:
+                self.logger.warning(f"{len(failures)} items failed: {', '.join(item for item, _, _ in failures)}")
+            self.journal.close()
+            self.journal = None
+
+    def create_driver(self) -> webdriver.Chrome:
         chrome_options = Options()
         chrome_options.add_argument("--start-maximized")
-        self.driver = webdriver.Chrome(options=chrome_options)
-        self.selenium_helper = SeleniumHelper(self.driver)
+        return webdriver.Chrome(options=chrome_options)
+
+    def create_selenium_helper(self, driver: webdriver.Chrome) -> SeleniumHelper:
+        """A SeleniumHelper for driver, sharing pacing statistics with the main one and profiled under --profile."""
+        pacer = self.selenium_helper.pacer if self.selenium_helper else None
+        helper = SeleniumHelper(driver, pacer=pacer)
+        if self.profiler:
+            self.profiler.instrument(helper)
+        return helper
+
+    def setup(self):
+        self.driver = self.create_driver()
+        self.selenium_helper = self.create_selenium_helper(self.driver)
+
+    def create_worker_driver(self, session_state: Dict[str, Any]) -> webdriver.Chrome:
+        """Starts an extra browser and clones an authenticated session (see SeleniumHelper.get_session_state) into it."""
+        driver = self.create_driver()
+        try:
+            SeleniumHelper(driver).restore_session_state(session_state)
+        except Exception:
+            driver.quit()
+            raise
+        return driver
+
+    def session_tenant(self, isNewbook: bool = False) -> str:
+        if isNewbook:
+            return f"newbook-{NB_CR_LOGIN_CODE}"
+        return f"rms-training-{RMS_CLIENT_ID}" if self.debug else f"rms-{RMS_CLIENT_ID}"
 
     def login(self, isNewbook: bool = False):
+        tenant = self.session_tenant(isNewbook)
+        if self.fresh_login:
+            self.session_cache.clear(tenant)
+        elif self.restore_cached_session(tenant, isNewbook):
+            return
+
+        self.interactive_login(isNewbook)
+        try:
+            self.session_cache.save(tenant, self.selenium_helper.get_session_state())
+        except Exception as e:
+            self.logger.warning(f"Could not cache session for {tenant}: {str(e)}")
+
+    def interactive_login(self, isNewbook: bool = False):
         if isNewbook:
             globals.NB_login_with_2fa_and_wait(self.driver, self.username, self.password)
             return
@@ -29,6 +136,71 @@ class BaseAutomation:
         else:
             globals.RMS_login_with_2fa_and_wait(self.driver, self.username, self.password)
 
+    def restore_cached_session(self, tenant: str, isNewbook: bool = False) -> bool:
+        state = self.session_cache.load(tenant)
+        if not state:
+            return False
+
+        self.logger.info(f"Restoring cached session for {tenant}")
+        try:
+            self.selenium_helper.restore_session_state(state)
+            self.selenium_helper.wait_for_page_load()
+        except Exception as e:
+            self.logger.warning(f"Failed to restore cached session: {str(e)}")
+            return False
+
+        if not self.is_logged_in(isNewbook):
+            self.logger.info("Cached session is no longer valid. Falling back to interactive login.")
+            self.session_cache.clear(tenant)
+            return False
+
+        self.logger.info("Cached session restored. Skipping login and 2FA.")
+        if self.requires_manual_navigation:
+            self.logger.info("Navigate to the correct page and press Enter when you're ready to start the automation process.")
+            input()
+        return True
+
+    def is_logged_in(self, isNewbook: bool = False) -> bool:
+        login_url = NB_LOGIN_URL if isNewbook else RMS_LOGIN_URL
+        if self.driver.current_url.lower().startswith(login_url.lower()):
+            return False
+        if isNewbook:
+            return not self.selenium_helper.is_element_present(By.ID, "login_code")
+        return not self.selenium_helper.is_element_present(By.CSS_SELECTOR, RMS_XPaths.CLIENT_ID_INPUT)
+
+    def check_and_dismiss_error_modal(self, timeout=5) -> str:
+        """
+        Dismisses the RMS server error modal if it is showing and reports it to the circuit breaker.
+        Returns NO_ERROR_MODAL, ERROR_MODAL_DISMISSED, or ERROR_MODAL_STUCK when it is still showing.
+        """
+        try:
+            if not self.selenium_helper.dialogs.showing("rms_server_error"):
+                return NO_ERROR_MODAL
+        except Exception as e:
+            self.logger.error(f"Error checking for the server error modal: {str(e)}")
+            return NO_ERROR_MODAL
+        self.logger.warning("Server error modal detected.")
+        self.circuit_breaker.record_failure()
+        try:
+            if self.selenium_helper.wait_and_click(By.XPATH, RMS_XPaths.ERROR_MODAL_OK_BUTTON, timeout=timeout):
+                self.logger.info("Dismissed server error modal.")
+                return ERROR_MODAL_DISMISSED
+            self.logger.warning("Failed to dismiss server error modal.")
+        except Exception as e:
+            self.logger.error(f"Error dismissing the server error modal: {str(e)}")
+        return ERROR_MODAL_STUCK
+
+    def log_reports(self):
+        if self.circuit_breaker.total_failures:
+            self.logger.info(self.circuit_breaker.summary())
+        if self.selenium_helper:
+            if self.selenium_helper.dialogs.appearances:
+                self.logger.info(f"Dialogs: {self.selenium_helper.dialogs.summary()}")
+            self.selenium_helper.pacer.log_report()
+        if self.profiler:
+            self.profiler.log_report()
+            self.profiler.close()
+
     def navigate_to_page(self, url):
         self.driver.get(url)
         self.logger.info(f"Navigated to {url}")
@@ -44,6 +216,8 @@ class BaseAutomation:
         except Exception as e:
             self.logger.error(f"An error occurred: {str(e)}")
         finally:
+            self.close_journal()
+            self.log_reports()
             if self.driver:
                 self.driver.quit()
             self.logger.info("Script execution completed.")
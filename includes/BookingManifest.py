@@ -0,0 +1,121 @@
+import hashlib
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+from includes.logging_config import get_logger
+from includes.BookingStore import BookingBlobStore, BookingFolder
+from includes.SearchIndex import SearchFields, extract_search_fields
+
+class ManifestChanges(NamedTuple):
+    changed: List[str]
+    removed: List[str]
+    total: int
+
+class BookingManifest:
+    """
+    What a viewer build last saw of each saved booking: its version (blob hash in a booking store,
+    size and mtime for a legacy folder), content hash and the search fields extracted from it.
+    refresh() compares the saved bookings against it so a rebuild only reads bookings whose version
+    moved, and only parses them when the content hash differs too (the dump scripts re-save
+    unchanged bookings). Kept in SQLite next to the viewer, with a small key/value table for build
+    settings.
+
+    Updates stay in one open transaction until commit(), which the build calls once its output is
+    written; a build that fails halfway leaves the manifest as it was, so the next run redoes the work.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.logger = get_logger(self.__class__.__name__)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        columns = {row[1] for row in self.connection.execute("PRAGMA table_info(bookings)")}
+        if columns and "version" not in columns:
+            self.logger.info("Manifest predates booking versions; rebuilding it")
+            self.connection.execute("DROP TABLE bookings")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS bookings (
+                reservation_id TEXT PRIMARY KEY,
+                version TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                terms TEXT NOT NULL,
+                balance REAL
+            )
+        """)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)")
+        self.connection.commit()
+
+    def refresh(self, bookings: Union[BookingBlobStore, BookingFolder], executor: ThreadPoolExecutor) -> ManifestChanges:
+        versions = bookings.versions(executor)
+        with self.lock:
+            known: Dict[str, Tuple[str, str]] = {
+                row[0]: (row[1], row[2]) for row in self.connection.execute("SELECT reservation_id, version, hash FROM bookings")
+            }
+        candidates = [
+            reservation_id for reservation_id, version in versions.items()
+            if known.get(reservation_id, (None, None))[0] != version
+        ]
+        removed = sorted(set(known) - set(versions))
+
+        changed = []
+        touched = []
+        updated = []
+        for reservation_id, html in bookings.read_many(candidates, executor):
+            version = versions[reservation_id]
+            digest = hashlib.sha1(html.encode('utf-8')).hexdigest()
+            if reservation_id in known and known[reservation_id][1] == digest:
+                touched.append((version, reservation_id))
+                continue
+            fields = extract_search_fields(reservation_id, html)
+            updated.append((reservation_id, version, digest, " ".join(fields.terms), fields.balance))
+            changed.append(reservation_id)
+
+        with self.lock:
+            self.connection.executemany("UPDATE bookings SET version = ? WHERE reservation_id = ?", touched)
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO bookings (reservation_id, version, hash, terms, balance) VALUES (?, ?, ?, ?, ?)",
+                updated
+            )
+            self.connection.executemany("DELETE FROM bookings WHERE reservation_id = ?", [(reservation_id,) for reservation_id in removed])
+
+        self.logger.info(f"{len(versions)} bookings: {len(changed)} new or changed, {len(touched)} touched, {len(removed)} removed")
+        return ManifestChanges(sorted(changed), removed, len(versions))
+
+    def reservation_ids(self) -> List[str]:
+        with self.lock:
+            return [row[0] for row in self.connection.execute("SELECT reservation_id FROM bookings ORDER BY reservation_id")]
+
+    def search_fields(self) -> Iterator[Tuple[str, SearchFields]]:
+        with self.lock:
+            rows = self.connection.execute("SELECT reservation_id, terms, balance FROM bookings ORDER BY reservation_id").fetchall()
+        for reservation_id, terms, balance in rows:
+            yield reservation_id, SearchFields(terms.split(), balance)
+
+    def get_setting(self, key: str) -> Optional[str]:
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_setting(self, key: str, value: str) -> None:
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
+
+    def delete_setting(self, key: str) -> None:
+        with self.lock:
+            self.connection.execute("DELETE FROM settings WHERE key = ?", (key,))
+
+    def reset(self) -> None:
+        with self.lock:
+            self.connection.execute("DELETE FROM bookings")
+            self.connection.execute("DELETE FROM settings")
+
+    def commit(self) -> None:
+        with self.lock:
+            self.connection.commit()
+
+    def close(self) -> None:
+        """Closes without committing; anything since the last commit() is rolled back."""
+        with self.lock:
+            self.connection.close()
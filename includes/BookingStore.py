@@ -0,0 +1,342 @@
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+from includes.logging_config import get_logger
+from includes.html_normalizer import normalize_booking_html, split_metadata_comments
+
+INDEX_FILENAME = "index.sqlite3"
+READ_BATCH_SIZE = 256
+STAT_BATCH_SIZE = 1024
+SEGMENT_BYTES = 64 * 1024 * 1024
+CODECS = ("zstd", "gzip")
+
+def default_codec() -> str:
+    """zstd when the optional zstandard package is installed, gzip otherwise."""
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return "gzip"
+    return "zstd"
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+class BlobLocation(NamedTuple):
+    codec: str
+    segment: int
+    offset: int
+    length: int
+
+class BookingRecord(NamedTuple):
+    reservation_id: str
+    hash: str
+    url: Optional[str]
+    saved_at: float
+
+class BookingFolder:
+    """
+    The original layout, one <reservation id>.html file per booking in a flat folder. Read-only;
+    kept so folders saved before the blob store still work with every reader.
+    """
+    def __init__(self, path: str):
+        self.path = path
+
+    def file_path(self, reservation_id: str) -> str:
+        return os.path.join(self.path, f"{reservation_id}.html")
+
+    def reservation_ids(self) -> List[str]:
+        return sorted(entry.name[:-len('.html')] for entry in os.scandir(self.path) if entry.name.endswith('.html'))
+
+    def versions(self, executor: ThreadPoolExecutor) -> Dict[str, str]:
+        """reservation id -> 'size:mtime_ns', stat'ed on the pool in batches."""
+        stat_batch = lambda batch: [os.stat(self.file_path(reservation_id)) for reservation_id in batch]
+        versions = {}
+        batches = list(batched(self.reservation_ids(), STAT_BATCH_SIZE))
+        for batch, stats in zip(batches, executor.map(stat_batch, batches)):
+            for reservation_id, stat in zip(batch, stats):
+                versions[reservation_id] = f"{stat.st_size}:{stat.st_mtime_ns}"
+        return versions
+
+    def read(self, reservation_id: str) -> Optional[str]:
+        if not os.path.exists(self.file_path(reservation_id)):
+            return None
+        with open(self.file_path(reservation_id), 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def read_many(self, reservation_ids: Iterable[str], executor: ThreadPoolExecutor) -> Iterator[Tuple[str, str]]:
+        """Yields (reservation id, html) in the order given, read ahead on the pool a batch at a time."""
+        for batch in batched(reservation_ids, READ_BATCH_SIZE):
+            yield from zip(batch, executor.map(self.read, batch))
+
+    def close(self) -> None:
+        pass
+
+class BookingBlobStore:
+    """
+    Content-addressed store of saved booking HTML.
+
+    Each distinct page is compressed once (zstd, or gzip without the zstandard package) and appended
+    to a packed segment file under segments/, so identical tables are stored once and 100k bookings
+    take a few dozen files instead of 100k. index.sqlite3 maps reservation ids to content hashes (with
+    the page URL and save time) and hashes to their segment, offset and length. Every writer appends
+    to a segment of its own, so several dump processes can save into one store. A folder of legacy
+    <reservation id>.html files is imported when the store is first created there.
+
+    Pages are normalized before saving (normalize_booking_html) unless normalize is False; URL and
+    reservation id comments in front of older saved tables move into the index.
+    """
+    def __init__(self, path: str, codec: Optional[str] = None, segment_bytes: int = SEGMENT_BYTES, normalize: bool = True):
+        if codec is not None and codec not in CODECS:
+            raise ValueError(f"Unsupported booking store codec: {codec}")
+        self.path = path
+        self.codec = codec or default_codec()
+        self.segment_bytes = segment_bytes
+        self.normalize = normalize
+        self.logger = get_logger(self.__class__.__name__)
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.local = threading.local()
+        self.segment_file = None
+        self.segment_number = 0
+        os.makedirs(os.path.join(path, "segments"), exist_ok=True)
+        index_path = os.path.join(path, INDEX_FILENAME)
+        is_new = not os.path.exists(index_path)
+
+        self.connection = sqlite3.connect(index_path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                hash TEXT PRIMARY KEY,
+                codec TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                segment INTEGER NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL
+            )
+        """)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS bookings (
+                reservation_id TEXT PRIMARY KEY,
+                hash TEXT NOT NULL,
+                url TEXT,
+                saved_at REAL NOT NULL
+            )
+        """)
+        self.connection.commit()
+
+        if is_new and any(entry.name.endswith('.html') for entry in os.scandir(path)):
+            count = self.import_folder(path)
+            self.logger.info(f"Imported {count} saved bookings from {path}; the .html files there are no longer read and can be removed")
+
+    def segment_path(self, number: int) -> str:
+        return os.path.join(self.path, "segments", f"segment-{number:06d}.dat")
+
+    def claim_segment(self) -> None:
+        """Starts a new segment file for this writer; creating it exclusively keeps other writers off it."""
+        if self.segment_file:
+            self.segment_file.close()
+        numbers = [int(name[len("segment-"):-len(".dat")]) for name in os.listdir(os.path.join(self.path, "segments"))
+                   if name.startswith("segment-") and name.endswith(".dat")]
+        number = max(numbers, default=0) + 1
+        while True:
+            try:
+                self.segment_file = open(self.segment_path(number), 'xb')
+                break
+            except FileExistsError:
+                number += 1
+        self.segment_number = number
+
+    def compress(self, data: bytes) -> bytes:
+        if self.codec == "gzip":
+            return gzip.compress(data)
+        # zstd compressors are not thread safe, so each thread keeps its own
+        if not hasattr(self.local, "compressor"):
+            import zstandard
+            self.local.compressor = zstandard.ZstdCompressor(level=9)
+        return self.local.compressor.compress(data)
+
+    def decompress(self, data: bytes, codec: str) -> bytes:
+        if codec == "gzip":
+            return gzip.decompress(data)
+        if not hasattr(self.local, "decompressor"):
+            try:
+                import zstandard
+            except ImportError:
+                raise ImportError("This booking store holds zstd blobs, which need the zstandard package: pip install zstandard")
+            self.local.decompressor = zstandard.ZstdDecompressor()
+        return self.local.decompressor.decompress(data)
+
+    def has_blob(self, digest: str) -> bool:
+        with self.lock:
+            return self.connection.execute("SELECT 1 FROM blobs WHERE hash = ?", (digest,)).fetchone() is not None
+
+    def append_blob(self, digest: str, data: bytes) -> None:
+        compressed = self.compress(data)
+        with self.write_lock:
+            if self.segment_file is None or self.segment_file.tell() >= self.segment_bytes:
+                self.claim_segment()
+            offset = self.segment_file.tell()
+            self.segment_file.write(compressed)
+            # On disk before the index points at it; a crash in between only leaves unreferenced bytes
+            self.segment_file.flush()
+            with self.lock:
+                with self.connection:
+                    self.connection.execute(
+                        "INSERT OR IGNORE INTO blobs (hash, codec, size, segment, offset, length) VALUES (?, ?, ?, ?, ?, ?)",
+                        (digest, self.codec, len(data), self.segment_number, offset, len(compressed))
+                    )
+
+    def put(self, reservation_id: str, html: str, url: Optional[str] = None, saved_at: Optional[float] = None) -> str:
+        """Saves a booking page, storing its content only if no booking has it yet. Returns the content hash."""
+        if self.normalize:
+            metadata, html = split_metadata_comments(html)
+            url = url or metadata.get("url")
+            html = normalize_booking_html(html)
+        data = html.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        if not self.has_blob(digest):
+            self.append_blob(digest, data)
+        with self.lock:
+            with self.connection:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO bookings (reservation_id, hash, url, saved_at) VALUES (?, ?, ?, ?)",
+                    (reservation_id, digest, url, saved_at or time.time())
+                )
+        return digest
+
+    def import_folder(self, folder: str) -> int:
+        """Copies legacy <reservation id>.html files into the store, keeping their mtimes as save times."""
+        source = BookingFolder(folder)
+        count = 0
+        for reservation_id in source.reservation_ids():
+            self.put(reservation_id, source.read(reservation_id), saved_at=os.path.getmtime(source.file_path(reservation_id)))
+            count += 1
+        return count
+
+    def normalize_all(self) -> int:
+        """Re-saves stored bookings in normalized form, keeping their URLs and save times. Returns how many changed."""
+        count = 0
+        for reservation_id in self.reservation_ids():
+            record = self.record(reservation_id)
+            html = self.read(reservation_id)
+            if self.put(reservation_id, html, url=record.url, saved_at=record.saved_at) != record.hash:
+                count += 1
+        return count
+
+    def reservation_ids(self) -> List[str]:
+        with self.lock:
+            return [row[0] for row in self.connection.execute("SELECT reservation_id FROM bookings ORDER BY reservation_id")]
+
+    def versions(self, executor: Optional[ThreadPoolExecutor] = None) -> Dict[str, str]:
+        """reservation id -> content hash, straight from the index."""
+        with self.lock:
+            return dict(self.connection.execute("SELECT reservation_id, hash FROM bookings").fetchall())
+
+    def record(self, reservation_id: str) -> Optional[BookingRecord]:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT reservation_id, hash, url, saved_at FROM bookings WHERE reservation_id = ?", (reservation_id,)
+            ).fetchone()
+        return BookingRecord(*row) if row else None
+
+    def locate(self, reservation_ids: List[str]) -> Dict[str, BlobLocation]:
+        placeholders = ", ".join("?" for _ in reservation_ids)
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT bookings.reservation_id, blobs.codec, blobs.segment, blobs.offset, blobs.length "
+                f"FROM bookings JOIN blobs ON blobs.hash = bookings.hash WHERE bookings.reservation_id IN ({placeholders})",
+                reservation_ids
+            ).fetchall()
+        return {row[0]: BlobLocation(*row[1:]) for row in rows}
+
+    def read_blob(self, location: BlobLocation) -> str:
+        with open(self.segment_path(location.segment), 'rb') as f:
+            f.seek(location.offset)
+            return self.decompress(f.read(location.length), location.codec).decode('utf-8')
+
+    def read(self, reservation_id: str) -> Optional[str]:
+        location = self.locate([reservation_id]).get(reservation_id)
+        return self.read_blob(location) if location else None
+
+    def read_many(self, reservation_ids: Iterable[str], executor: ThreadPoolExecutor) -> Iterator[Tuple[str, str]]:
+        """Yields (reservation id, html) in the order given, read and decompressed on the pool a batch at a time."""
+        for batch in batched(reservation_ids, READ_BATCH_SIZE):
+            locations = self.locate(batch)
+            batch = [reservation_id for reservation_id in batch if reservation_id in locations]
+            yield from zip(batch, executor.map(lambda reservation_id: self.read_blob(locations[reservation_id]), batch))
+
+    def compact(self) -> int:
+        """
+        Copies the blobs still referenced by a booking into fresh segments and deletes the old ones,
+        dropping content left behind by re-saved bookings. Run it while no dump is saving to the store.
+        Returns the number of bytes reclaimed.
+        """
+        with self.lock:
+            live = self.connection.execute(
+                "SELECT hash, codec, segment, offset, length FROM blobs WHERE hash IN (SELECT hash FROM bookings) ORDER BY segment, offset"
+            ).fetchall()
+        old_segments = [os.path.join(self.path, "segments", name) for name in os.listdir(os.path.join(self.path, "segments"))]
+        old_bytes = sum(os.path.getsize(path) for path in old_segments)
+
+        self.claim_segment()
+        moved = []
+        with self.write_lock:
+            for digest, codec, segment, offset, length in live:
+                with open(self.segment_path(segment), 'rb') as f:
+                    f.seek(offset)
+                    compressed = f.read(length)
+                if self.segment_file.tell() >= self.segment_bytes:
+                    self.claim_segment()
+                moved.append((self.segment_number, self.segment_file.tell(), digest))
+                self.segment_file.write(compressed)
+            self.segment_file.flush()
+            os.fsync(self.segment_file.fileno())
+            with self.lock:
+                with self.connection:
+                    self.connection.execute("DELETE FROM blobs WHERE hash NOT IN (SELECT hash FROM bookings)")
+                    self.connection.executemany("UPDATE blobs SET segment = ?, offset = ? WHERE hash = ?", moved)
+
+        kept = {self.segment_path(segment) for segment, _, _ in moved} | {self.segment_path(self.segment_number)}
+        for path in old_segments:
+            if path not in kept:
+                os.remove(path)
+        return old_bytes - sum(os.path.getsize(path) for path in kept if os.path.exists(path))
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            bookings = self.connection.execute("SELECT COUNT(*) FROM bookings").fetchone()[0]
+            blobs, stored_bytes = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM blobs").fetchone()
+            html_bytes = self.connection.execute(
+                "SELECT COALESCE(SUM(blobs.size), 0) FROM bookings JOIN blobs ON blobs.hash = bookings.hash"
+            ).fetchone()[0]
+        return {"bookings": bookings, "blobs": blobs, "html_bytes": html_bytes, "stored_bytes": stored_bytes}
+
+    def close(self) -> None:
+        with self.write_lock:
+            if self.segment_file:
+                self.segment_file.close()
+                self.segment_file = None
+        with self.lock:
+            self.connection.close()
+
+def open_bookings(path: str, create: bool = False) -> Union[BookingBlobStore, BookingFolder]:
+    """
+    Opens saved bookings for reading: the blob store if path holds one (or create is set, which also
+    imports any legacy files there), otherwise the legacy flat folder of .html files.
+    """
+    if create or os.path.exists(os.path.join(path, INDEX_FILENAME)):
+        return BookingBlobStore(path)
+    return BookingFolder(path)
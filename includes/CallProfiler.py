@@ -0,0 +1,156 @@
+import bisect
+import inspect
+import threading
+import time
+from functools import wraps
+from typing import Any, Dict, List, Optional, Tuple
+from includes.constants import RMS_XPaths
+from includes.decorators import add_retry_listener, remove_retry_listener, retry_counters
+from includes.logging_config import get_logger
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS = [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+# SeleniumHelper methods that never touch the browser, or return a context manager whose body is not theirs to time
+UNPROFILED_METHODS = {"sanitize_text", "script_timeout"}
+RETRY_KEYWORDS = {"max_attempts", "retry_interval"}
+LOCATOR_NAMES = {value: name for name, value in vars(RMS_XPaths).items() if isinstance(value, str) and not name.startswith("_")}
+
+def locator_name(value: Any) -> str:
+    """The RMS_XPaths constant name for a locator value, otherwise the (shortened) locator itself."""
+    if isinstance(value, (tuple, list)) and len(value) == 2:
+        value = value[1]
+    if not isinstance(value, str):
+        return f"<{type(value).__name__}>"
+    if value in LOCATOR_NAMES:
+        return LOCATOR_NAMES[value]
+    return value if len(value) <= 60 else value[:57] + "..."
+
+class CallStats:
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.total = 0.0
+        self.slowest = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def add(self, elapsed: float, failed: bool) -> None:
+        self.calls += 1
+        self.total += elapsed
+        self.slowest = max(self.slowest, elapsed)
+        self.histogram[bisect.bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+        if failed:
+            self.failures += 1
+
+    def quantile(self, fraction: float) -> float:
+        """Upper bound of the histogram bucket holding the given quantile."""
+        target = fraction * self.calls
+        seen = 0
+        for index, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= target:
+                return LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else self.slowest
+        return self.slowest
+
+class CallProfiler:
+    """
+    Opt-in timing of SeleniumHelper calls, keyed by method and locator (the RMS_XPaths constant name
+    where there is one). Records call counts, a latency histogram, @retry retries and failures
+    (calls that raised). Times are inclusive: wait_and_click also counts the wait_for_clickable_element
+    call it makes. Enabled with --profile; BaseAutomation.run logs report() at the end of the run.
+    """
+    def __init__(self):
+        self.logger = get_logger(self.__class__.__name__)
+        self.lock = threading.Lock()
+        self.stats: Dict[Tuple[str, str], CallStats] = {}
+        self.local = threading.local()
+        self.signatures: Dict[str, inspect.Signature] = {}
+        add_retry_listener(self.on_retry)
+
+    def close(self) -> None:
+        remove_retry_listener(self.on_retry)
+
+    def instrument(self, helper: Any) -> Any:
+        """Wraps the public methods of a SeleniumHelper instance in place. Returns the helper."""
+        for name, method in inspect.getmembers(type(helper), inspect.isfunction):
+            if name.startswith("_") or name in UNPROFILED_METHODS:
+                continue
+            self.signatures[name] = inspect.signature(method)
+            setattr(helper, name, self.wrap(name, getattr(helper, name)))
+        return helper
+
+    def wrap(self, name: str, method):
+        @wraps(method)
+        def profiled(*args, **kwargs):
+            key = (name, self.locator(name, args, kwargs))
+            stack = self.call_stack()
+            stack.append(key)
+            start = time.perf_counter()
+            failed = True
+            try:
+                result = method(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                elapsed = time.perf_counter() - start
+                stack.pop()
+                with self.lock:
+                    self.stats.setdefault(key, CallStats()).add(elapsed, failed)
+        return profiled
+
+    def call_stack(self) -> List[Tuple[str, str]]:
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    def locator(self, name: str, args: tuple, kwargs: dict) -> str:
+        # @retry settings are not parameters of the method itself
+        kwargs = {key: value for key, value in kwargs.items() if not key.startswith("_retry_") and key not in RETRY_KEYWORDS}
+        try:
+            # Bound methods: skip 'self' in the signature
+            arguments = self.signatures[name].bind_partial(None, *args, **kwargs).arguments
+        except TypeError:
+            return ""
+        for parameter in ("value", "class_name", "container_locator"):
+            if parameter in arguments:
+                return locator_name(arguments[parameter])
+        if "spec" in arguments:
+            return f"{len(arguments['spec'])} fields"
+        return ""
+
+    def on_retry(self, function_name: str, error: Exception) -> None:
+        stack = self.call_stack()
+        if not stack:
+            return
+        key = stack[-1]
+        with self.lock:
+            self.stats.setdefault(key, CallStats()).retries += 1
+
+    def report(self, limit: Optional[int] = 30) -> List[str]:
+        with self.lock:
+            entries = sorted(self.stats.items(), key=lambda item: -item[1].total)
+        lines = [f"{'method':<28} {'locator':<40} {'calls':>6} {'total s':>8} {'mean s':>7} {'p50<=':>6} {'p95<=':>6} {'max s':>6} {'retries':>7} {'failed':>6}"]
+        for (method, locator), stats in entries[:limit]:
+            lines.append(
+                f"{method:<28} {locator:<40} {stats.calls:>6} {stats.total:>8.2f} {stats.total / stats.calls:>7.3f} "
+                f"{stats.quantile(0.5):>6.2f} {stats.quantile(0.95):>6.2f} {stats.slowest:>6.2f} {stats.retries:>7} {stats.failures:>6}"
+            )
+        if limit and len(entries) > limit:
+            lines.append(f"... {len(entries) - limit} more")
+
+        counters = sorted(retry_counters().items(), key=lambda item: -item[1]["retries"])
+        if any(counts["retries"] or counts["out_of_budget"] or counts["not_retried"] for _, counts in counters):
+            lines.append(f"{'@retry function':<40} {'calls':>6} {'retries':>7} {'recovered':>9} {'exhausted':>9} {'budget':>6} {'fatal':>5}")
+            for name, counts in counters:
+                lines.append(
+                    f"{name:<40} {counts['calls']:>6} {counts['retries']:>7} {counts['recovered']:>9} "
+                    f"{counts['exhausted']:>9} {counts['out_of_budget']:>6} {counts['not_retried']:>5}"
+                )
+        return lines
+
+    def log_report(self) -> None:
+        if not self.stats:
+            return
+        self.logger.info("SeleniumHelper calls by total time (inclusive of nested calls):")
+        for line in self.report():
+            self.logger.info(line)
@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import deque
+from typing import Deque, Optional
+from includes.logging_config import get_logger
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+class CircuitOpenError(Exception):
+    """The circuit stayed open longer than its give_up_after limit."""
+
+class CircuitBreaker:
+    """
+    Slows an automation down while the server is failing, instead of retrying into it at full speed.
+
+    Closed: work runs normally and failures (e.g. RMS server error modals) are counted. When
+    failure_threshold of them fall within window seconds the circuit opens: acquire() blocks for a
+    backoff that starts at base_backoff. After it, the circuit is half-open and lets a single probe
+    item through; a success closes it again, a failure reopens it with the backoff doubled (up to
+    max_backoff). Shared by all workers of an automation. acquire() raises CircuitOpenError once the
+    circuit has been open for give_up_after seconds without recovering.
+    """
+    def __init__(self, name: str, failure_threshold: int = 3, window: float = 60, base_backoff: float = 15,
+                 max_backoff: float = 300, give_up_after: float = 1800, probe_timeout: float = 120):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.window = window
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.give_up_after = give_up_after
+        self.probe_timeout = probe_timeout
+        self.logger = get_logger(self.__class__.__name__)
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.failures: Deque[float] = deque()
+        self.backoff = base_backoff
+        self.open_until = 0.0
+        self.opened_at: Optional[float] = None
+        self.probe_started: Optional[float] = None
+        self.times_opened = 0
+        self.total_failures = 0
+        self.open_seconds = 0.0
+
+    def acquire(self) -> None:
+        """Call before each work item: returns at once while closed, otherwise waits until the item may run."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if self.state == CLOSED:
+                    return
+                if self.opened_at is not None and now - self.opened_at > self.give_up_after:
+                    raise CircuitOpenError(f"{self.name}: still failing after {self.give_up_after / 60:.0f} minutes")
+                if self.state == OPEN and now >= self.open_until:
+                    self.state = HALF_OPEN
+                    self.probe_started = None
+                if self.state == HALF_OPEN and (self.probe_started is None or now - self.probe_started > self.probe_timeout):
+                    self.probe_started = now
+                    self.logger.info(f"{self.name}: probing with one item")
+                    return
+                pause = self.open_until - now if self.state == OPEN else 1.0
+            time.sleep(min(max(pause, 0.1), 5))
+
+    def record_failure(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            self.total_failures += 1
+            if self.state == HALF_OPEN:
+                self.backoff = min(self.backoff * 2, self.max_backoff)
+                self.open(now, "probe failed")
+                return
+            if self.state == OPEN:
+                return
+            self.failures.append(now)
+            while self.failures and now - self.failures[0] > self.window:
+                self.failures.popleft()
+            if len(self.failures) >= self.failure_threshold:
+                self.open(now, f"{len(self.failures)} failures in {self.window:g}s")
+
+    def record_success(self) -> None:
+        with self.lock:
+            if self.state != HALF_OPEN:
+                return
+            self.state = CLOSED
+            self.failures.clear()
+            self.backoff = self.base_backoff
+            self.open_seconds += time.monotonic() - self.opened_at
+            self.logger.info(f"{self.name}: recovered after {time.monotonic() - self.opened_at:.0f}s, resuming")
+            self.opened_at = None
+
+    def open(self, now: float, reason: str) -> None:
+        if self.opened_at is None:
+            self.opened_at = now
+            self.times_opened += 1
+        self.state = OPEN
+        self.open_until = now + self.backoff
+        self.logger.warning(f"{self.name}: {reason}, pausing for {self.backoff:.0f}s")
+
+    def summary(self) -> str:
+        with self.lock:
+            open_seconds = self.open_seconds + (time.monotonic() - self.opened_at if self.opened_at is not None else 0)
+            return (f"{self.name}: {self.total_failures} failures, opened {self.times_opened} times, "
+                    f"{open_seconds:.0f}s paused, now {self.state}")
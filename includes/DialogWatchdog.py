@@ -0,0 +1,93 @@
+import json
+from collections import Counter
+from typing import Dict, List
+from selenium.common.exceptions import WebDriverException
+from includes.logging_config import get_logger
+
+# Dialogs the watchdog tracks, by name: present while an element matches the CSS selector
+DIALOGS = {
+    "rms_server_error": ".ResStatusWarnings",
+    "newbook_locked_session": "#locked_session_dialog",
+}
+
+# Installs window.__dialogWatchdog once per page: a MutationObserver keeps track of which dialogs are
+# present and appends {dialog, shown, at} entries to a bounded event log whenever one appears or goes
+_WATCHDOG_JS = """
+(function (dialogs) {
+    if (window.__dialogWatchdog) {
+        return;
+    }
+    var watchdog = {present: {}, events: []};
+    watchdog.check = function () {
+        for (var name in dialogs) {
+            var present = document.querySelector(dialogs[name]) !== null;
+            if (present !== !!watchdog.present[name]) {
+                watchdog.present[name] = present;
+                watchdog.events.push({dialog: name, shown: present, at: Date.now()});
+                if (watchdog.events.length > 100) {
+                    watchdog.events.shift();
+                }
+            }
+        }
+    };
+    window.__dialogWatchdog = watchdog;
+    watchdog.check();
+    new MutationObserver(watchdog.check).observe(document, {childList: true, subtree: true});
+})(__DIALOGS__);
+"""
+
+_READ_JS = """
+var watchdog = window.__dialogWatchdog;
+return watchdog ? !!watchdog.present[arguments[0]] : null;
+"""
+
+_DRAIN_EVENTS_JS = """
+var watchdog = window.__dialogWatchdog;
+return watchdog ? watchdog.events.splice(0) : [];
+"""
+
+class DialogWatchdog:
+    """
+    Page-side tracking of interrupting dialogs (RMS server errors, the Newbook locked session prompt),
+    so that checking for one is a single script call instead of an element lookup or a timed wait.
+
+    On Chrome the watchdog is registered to run at the start of every page the browser loads. On
+    pages that do not have it yet (loaded before registration, other tabs, other browsers) the
+    first check installs it.
+    """
+    def __init__(self, driver, dialogs: Dict[str, str] = DIALOGS):
+        self.driver = driver
+        self.source = _WATCHDOG_JS.replace("__DIALOGS__", json.dumps(dialogs))
+        self.registered = False
+        # Appearances per dialog, among the events taken so far
+        self.appearances: Counter = Counter()
+        self.logger = get_logger(self.__class__.__name__)
+
+    def register(self) -> None:
+        self.registered = True
+        try:
+            self.driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": self.source})
+        except (AttributeError, WebDriverException) as e:
+            self.logger.debug(f"Dialog watchdog not registered for new pages, installing per page: {str(e)}")
+
+    def showing(self, dialog: str) -> bool:
+        """Whether the named dialog is currently in the page."""
+        if not self.registered:
+            self.register()
+        present = self.driver.execute_script(_READ_JS, dialog)
+        if present is None:
+            present = self.driver.execute_script(self.source + _READ_JS, dialog)
+        return bool(present)
+
+    def events(self) -> List[Dict]:
+        """Takes the dialog appearances and disappearances logged on the current page since the last call."""
+        events = self.driver.execute_script(_DRAIN_EVENTS_JS) or []
+        self.appearances.update(event["dialog"] for event in events if event["shown"])
+        return events
+
+    def shown_since_last_check(self, dialog: str) -> bool:
+        """Whether the named dialog appeared on the current page since events were last taken, even if it has gone again."""
+        return any(event["dialog"] == dialog and event["shown"] for event in self.events())
+
+    def summary(self) -> str:
+        return ", ".join(f"{dialog} shown {count} times" for dialog, count in sorted(self.appearances.items()))
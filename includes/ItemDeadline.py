@@ -0,0 +1,72 @@
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+from selenium.common.exceptions import TimeoutException
+
+class ItemDeadlineExceeded(TimeoutException):
+    """A work item ran out of its --item-timeout budget."""
+
+class ItemDeadline:
+    """
+    Time budget of the work item being processed. Waits clamp their timeouts to it (clamp_timeout),
+    so no layer's own timeout, retry loop or sleep can hold one item past it.
+    """
+    def __init__(self, item: str, seconds: float):
+        self.item = item
+        self.seconds = seconds
+        self.deadline = time.monotonic() + seconds
+        # Set once a wait had to be shortened, i.e. the item's outcome may be incomplete
+        self.cut_short = False
+
+    def time_left(self) -> float:
+        return max(self.deadline - time.monotonic(), 0)
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.deadline
+
+    def clamp(self, timeout: float) -> float:
+        left = self.time_left()
+        if left <= 0:
+            self.cut_short = True
+            raise ItemDeadlineExceeded(f"Item {self.item} exceeded its {self.seconds:g}s budget")
+        if timeout > left:
+            self.cut_short = True
+            return left
+        return timeout
+
+_current: contextvars.ContextVar[Optional[ItemDeadline]] = contextvars.ContextVar("item_deadline", default=None)
+
+def current_deadline() -> Optional[ItemDeadline]:
+    return _current.get()
+
+def clamp_timeout(timeout: float) -> float:
+    """timeout, shortened to what is left of the current item's budget. Raises ItemDeadlineExceeded once it is spent."""
+    deadline = _current.get()
+    if deadline is None or not timeout or timeout <= 0:
+        return timeout
+    return deadline.clamp(timeout)
+
+def sleep_within_deadline(seconds: float) -> None:
+    """time.sleep that never sleeps past the current item's deadline."""
+    deadline = _current.get()
+    time.sleep(min(seconds, deadline.time_left()) if deadline else seconds)
+
+@contextmanager
+def item_deadline(item: str, seconds: Optional[float]) -> Iterator[Optional[ItemDeadline]]:
+    """
+    Runs the body under a budget of seconds (no budget if None). Raises ItemDeadlineExceeded at the end
+    if the budget ran out and cut a wait short, since the body may then have carried on with partial
+    results rather than raising itself.
+    """
+    if not seconds:
+        yield None
+        return
+    deadline = ItemDeadline(item, seconds)
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+    if deadline.cut_short and deadline.expired():
+        raise ItemDeadlineExceeded(f"Item {item} exceeded its {seconds:g}s budget")
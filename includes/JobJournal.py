@@ -0,0 +1,163 @@
+import csv
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from includes.logging_config import get_logger
+from includes.constants import JOB_JOURNAL_PATH
+
+PENDING = "pending"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+
+class JobJournal:
+    """
+    Durable record of the work items of one job (reservation IDs, site numbers, grid rows...) in SQLite.
+
+    Each item is pending, in_flight, done or failed, with its attempt count and timing. Statuses are
+    mirrored in memory so lookups while resuming are O(1); every transition is committed immediately.
+    Items still in_flight when a run died are recovered on the next open.
+    """
+    def __init__(self, job: str, path: str = JOB_JOURNAL_PATH):
+        self.job = job
+        self.path = path
+        self.logger = get_logger(self.__class__.__name__)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job TEXT NOT NULL,
+                item TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                started_at REAL,
+                finished_at REAL,
+                elapsed REAL,
+                error TEXT,
+                PRIMARY KEY (job, item)
+            )
+        """)
+        self.statuses: Dict[str, str] = dict(
+            self.connection.execute("SELECT item, status FROM jobs WHERE job = ?", (job,)).fetchall()
+        )
+
+    def register(self, items: Iterable[str]) -> int:
+        """Adds items not seen before as pending, in input order. Returns how many were new."""
+        new_items = []
+        for item in items:
+            item = str(item)
+            if item not in self.statuses:
+                self.statuses[item] = PENDING
+                new_items.append(item)
+        if new_items:
+            with self.lock:
+                seq = self.connection.execute("SELECT COALESCE(MAX(seq), -1) + 1 FROM jobs WHERE job = ?", (self.job,)).fetchone()[0]
+                with self.connection:
+                    self.connection.executemany(
+                        "INSERT OR IGNORE INTO jobs (job, item, seq, status) VALUES (?, ?, ?, ?)",
+                        [(self.job, item, seq + offset, PENDING) for offset, item in enumerate(new_items)]
+                    )
+        return len(new_items)
+
+    def recover(self, is_recorded: Optional[Callable[[str], bool]] = None) -> List[str]:
+        """
+        Resolves items left in_flight by an interrupted run: done if is_recorded(item) finds the
+        item's output already written, pending otherwise. Returns the items put back to pending.
+        """
+        interrupted = [item for item, status in self.statuses.items() if status == IN_FLIGHT]
+        requeued = []
+        for item in interrupted:
+            if is_recorded and is_recorded(item):
+                self.set_status(item, DONE, finished=True)
+            else:
+                self.set_status(item, PENDING)
+                requeued.append(item)
+        if interrupted:
+            self.logger.info(f"Recovered {len(interrupted)} interrupted items ({len(requeued)} requeued)")
+        return requeued
+
+    def status(self, item: str) -> Optional[str]:
+        return self.statuses.get(str(item))
+
+    def should_process(self, item: str, retry_failed: bool = False) -> bool:
+        status = self.statuses.get(str(item), PENDING)
+        return status in (PENDING, IN_FLIGHT) or (retry_failed and status == FAILED)
+
+    def remaining(self, items: Iterable[str], retry_failed: bool = False) -> Iterator[str]:
+        for item in items:
+            if self.should_process(item, retry_failed):
+                yield item
+
+    def has_progress(self) -> bool:
+        return any(status != PENDING for status in self.statuses.values())
+
+    def begin(self, item: str) -> None:
+        item = str(item)
+        with self.lock:
+            self.statuses[item] = IN_FLIGHT
+            with self.connection:
+                self.connection.execute(
+                    "INSERT INTO jobs (job, item, seq, status, attempts, started_at) "
+                    "VALUES (?, ?, (SELECT COALESCE(MAX(seq), -1) + 1 FROM jobs WHERE job = ?), ?, 1, ?) "
+                    "ON CONFLICT (job, item) DO UPDATE SET status = excluded.status, attempts = attempts + 1, "
+                    "started_at = excluded.started_at, finished_at = NULL, elapsed = NULL, error = NULL",
+                    (self.job, item, self.job, IN_FLIGHT, time.time())
+                )
+
+    def complete(self, item: str) -> None:
+        self.set_status(str(item), DONE, finished=True)
+
+    def fail(self, item: str, error: str) -> None:
+        self.set_status(str(item), FAILED, finished=True, error=error)
+
+    def set_status(self, item: str, status: str, finished: bool = False, error: Optional[str] = None) -> None:
+        with self.lock:
+            self.statuses[item] = status
+            finished_at = time.time() if finished else None
+            with self.connection:
+                self.connection.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ?, elapsed = ? - started_at, error = ? WHERE job = ? AND item = ?",
+                    (status, finished_at, finished_at, error, self.job, item)
+                )
+
+    def summary(self) -> Dict[str, int]:
+        counts = {PENDING: 0, IN_FLIGHT: 0, DONE: 0, FAILED: 0}
+        for status in self.statuses.values():
+            counts[status] += 1
+        return counts
+
+    def failures(self) -> List[Tuple[str, int, Optional[str]]]:
+        with self.lock:
+            return self.connection.execute(
+                "SELECT item, attempts, error FROM jobs WHERE job = ? AND status = ? ORDER BY seq", (self.job, FAILED)
+            ).fetchall()
+
+    def reset(self) -> None:
+        with self.lock:
+            with self.connection:
+                self.connection.execute("DELETE FROM jobs WHERE job = ?", (self.job,))
+            self.statuses.clear()
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+
+def csv_recorded_items(csv_path: str, column: int = 0) -> Callable[[str], bool]:
+    """Returns an is_recorded check for JobJournal.recover that looks items up in a column of an output CSV, read on first use."""
+    recorded: Optional[set] = None
+
+    def is_recorded(item: str) -> bool:
+        nonlocal recorded
+        if recorded is None:
+            recorded = set()
+            if os.path.exists(csv_path):
+                with open(csv_path, 'r', newline='', encoding='utf-8') as f:
+                    recorded = {row[column] for row in csv.reader(f) if len(row) > column}
+        return item in recorded
+
+    return is_recorded
@@ -0,0 +1,109 @@
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional
+from urllib.parse import urlsplit
+import urllib3
+from includes.billing_parser import extract_billing_table_html
+from includes.logging_config import get_logger
+from includes.constants import DEFAULT_TIMEOUT, NB_RESERVATION_URL, NB_LOGIN_URL
+
+class SessionExpiredError(Exception):
+    """Raised when Newbook answers with the login page or the locked session dialog instead of a booking."""
+
+class BookingFetchResult(NamedTuple):
+    reservation_id: str
+    table_html: Optional[str]
+    error: Optional[str] = None
+
+class NewbookHttpFetcher:
+    """
+    Fetches Newbook booking pages over plain HTTP with the cookies of a browser session.
+
+    reauthenticate is called (once at a time, across all threads) when the session expires and
+    must return a fresh list of Selenium-style cookie dicts.
+    """
+    def __init__(self, cookies: List[Dict], user_agent: Optional[str] = None, base_url: str = NB_RESERVATION_URL,
+                 max_connections: int = 8, timeout: float = DEFAULT_TIMEOUT,
+                 reauthenticate: Optional[Callable[[], List[Dict]]] = None):
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.reauthenticate = reauthenticate
+        self.logger = get_logger(self.__class__.__name__)
+        self.pool = urllib3.PoolManager(
+            maxsize=max_connections, block=True,
+            timeout=urllib3.Timeout(total=timeout),
+            retries=urllib3.Retry(total=2, connect=2, read=2, redirect=0, backoff_factor=0.5, raise_on_redirect=False),
+        )
+        self.user_agent = user_agent
+        self.auth_lock = threading.Lock()
+        self.session_generation = 0
+        self.set_cookies(cookies)
+
+    def set_cookies(self, cookies: List[Dict]) -> None:
+        self.cookie_header = "; ".join(f"{cookie['name']}={cookie['value']}" for cookie in cookies)
+        self.session_generation += 1
+
+    def headers(self) -> Dict[str, str]:
+        headers = {"Cookie": self.cookie_header, "Accept": "text/html"}
+        if self.user_agent:
+            headers["User-Agent"] = self.user_agent
+        return headers
+
+    def fetch_booking_page(self, reservation_id: str) -> str:
+        response = self.pool.request("GET", f"{self.base_url}{reservation_id}", headers=self.headers(), redirect=False)
+        if 300 <= response.status < 400:
+            location = response.headers.get("Location", "")
+            if self.is_login_url(location):
+                raise SessionExpiredError(f"Redirected to login page: {location}")
+            raise urllib3.exceptions.HTTPError(f"Unexpected redirect to {location}")
+        if response.status != 200:
+            raise urllib3.exceptions.HTTPError(f"HTTP {response.status} for reservation {reservation_id}")
+
+        charset = re.search(r"charset=([\w-]+)", response.headers.get("Content-Type", ""))
+        page_html = response.data.decode(charset.group(1) if charset else "utf-8", errors="replace")
+        if 'id="locked_session_dialog"' in page_html or 'id="login_code"' in page_html:
+            raise SessionExpiredError("Locked session dialog or login form returned")
+        return page_html
+
+    def is_login_url(self, url: str) -> bool:
+        return bool(url) and urlsplit(url).netloc == urlsplit(NB_LOGIN_URL).netloc
+
+    def fetch_booking(self, reservation_id: str) -> BookingFetchResult:
+        generation = self.session_generation
+        try:
+            page_html = self.fetch_booking_page(reservation_id)
+        except SessionExpiredError as e:
+            self.logger.warning(f"Session expired while fetching reservation {reservation_id}: {str(e)}")
+            self.renew_session(generation)
+            page_html = self.fetch_booking_page(reservation_id)
+        return BookingFetchResult(reservation_id, extract_billing_table_html(page_html))
+
+    def renew_session(self, failed_generation: int) -> None:
+        if not self.reauthenticate:
+            raise SessionExpiredError("Session expired and no re-authentication is configured")
+        with self.auth_lock:
+            # Another thread may already have renewed the session while this one waited
+            if self.session_generation != failed_generation:
+                return
+            self.logger.info("Re-authenticating Newbook session")
+            self.set_cookies(self.reauthenticate())
+
+    def fetch_many(self, reservation_ids: Iterable[str], on_start: Optional[Callable[[str], None]] = None) -> Iterator[BookingFetchResult]:
+        """
+        Fetches bookings concurrently over the connection pool and yields results in input order.
+        on_start is called from the fetching thread just before each booking is requested.
+        """
+        def fetch(reservation_id: str) -> BookingFetchResult:
+            try:
+                if on_start:
+                    on_start(reservation_id)
+                return self.fetch_booking(reservation_id)
+            except Exception as e:
+                return BookingFetchResult(reservation_id, None, str(e))
+
+        with ThreadPoolExecutor(max_workers=self.max_connections, thread_name_prefix="NewbookFetch") as executor:
+            yield from executor.map(fetch, reservation_ids)
+
+    def close(self) -> None:
+        self.pool.clear()
@@ -0,0 +1,326 @@
+import csv
+import glob
+import gzip
+import io
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Set, Union
+from includes.logging_config import get_logger
+
+COMPRESSION_EXTENSIONS = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+def _import_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("zstd compression needs the zstandard package: pip install zstandard")
+    return zstandard
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet output needs the pyarrow package: pip install pyarrow")
+    return pyarrow
+
+def open_text_stream(path: str, mode: str, compression: Optional[str] = None):
+    """Opens a (possibly compressed) text file for reading ('r') or appending ('a')."""
+    if compression == "gzip":
+        return gzip.open(path, mode + "t", encoding="utf-8", newline="")
+    if compression == "zstd":
+        zstandard = _import_zstandard()
+        raw = open(path, mode + "b")
+        if mode == "a":
+            stream = zstandard.ZstdCompressor().stream_writer(raw, closefd=True)
+        else:
+            stream = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        return io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    return open(path, mode, encoding="utf-8", newline="")
+
+class OutputSink:
+    """
+    Buffered record writer. Rows are kept in memory and written in batches, when batch_size rows
+    are buffered or flush_interval seconds have passed since the last write to disk, and on close.
+    Processing loops call maybe_flush between items, so rows do not sit in the buffer past
+    flush_interval while no new row arrives.
+
+    Output goes to stem + extension (+ compression extension). With rotate_bytes, parts are started
+    as stem.0001.ext, stem.0002.ext... once the current one reaches that size.
+    on_flushed callbacks passed to write run after the row has been written out, so callers can
+    record progress (e.g. in the job journal) only for rows that are actually on disk.
+    Nothing is opened until the first flush, so existing output can still be read back or reset.
+    """
+    extension = ""
+    supports_append = True
+    supports_compression = True
+
+    def __init__(self, stem: str, fields: List[str], key_field: Optional[str] = None, compression: Optional[str] = None,
+                 batch_size: int = 500, flush_interval: float = 5.0, rotate_bytes: Optional[int] = None):
+        if compression not in COMPRESSION_EXTENSIONS:
+            raise ValueError(f"Unsupported compression: {compression}")
+        self.stem = stem
+        self.fields = fields
+        self.key_field = key_field
+        self.compression = compression if self.supports_compression else None
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rotate_bytes = rotate_bytes
+        self.logger = get_logger(self.__class__.__name__)
+        self.lock = threading.Lock()
+        self.buffer: List[Dict[str, Any]] = []
+        self.callbacks: List[Callable[[], None]] = []
+        self.last_flush = time.monotonic()
+        self.rows_written = 0
+        self.part_open = False
+
+        parts = self.existing_parts()
+        self.part_number = self.part_number_of(parts[-1]) if parts else 0
+        if parts and not self.supports_append:
+            self.part_number += 1
+        self.path = self.part_path(self.part_number)
+
+    @property
+    def suffix(self) -> str:
+        return self.extension + COMPRESSION_EXTENSIONS[self.compression]
+
+    def part_path(self, number: int) -> str:
+        return f"{self.stem}{self.suffix}" if number == 0 else f"{self.stem}.{number:04d}{self.suffix}"
+
+    def part_number_of(self, path: str) -> int:
+        match = re.search(r"\.(\d{4})" + re.escape(self.suffix) + "$", path)
+        return int(match.group(1)) if match else 0
+
+    def existing_parts(self) -> List[str]:
+        parts = glob.glob(glob.escape(self.stem) + ".[0-9][0-9][0-9][0-9]" + glob.escape(self.suffix))
+        if os.path.exists(self.part_path(0)):
+            parts.append(self.part_path(0))
+        return sorted(parts, key=self.part_number_of)
+
+    def write(self, row: Union[Dict[str, Any], Sequence[Any]], on_flushed: Optional[Callable[[], None]] = None) -> None:
+        if not isinstance(row, dict):
+            row = dict(zip(self.fields, row))
+        with self.lock:
+            self.buffer.append(row)
+            if on_flushed:
+                self.callbacks.append(on_flushed)
+            due = len(self.buffer) >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def maybe_flush(self) -> None:
+        """Writes buffered rows out if flush_interval has passed since the last write to disk."""
+        with self.lock:
+            due = bool(self.buffer) and time.monotonic() - self.last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        with self.lock:
+            rows, self.buffer = self.buffer, []
+            callbacks, self.callbacks = self.callbacks, []
+            if rows:
+                if not self.part_open:
+                    self.open_part(self.path)
+                    self.part_open = True
+                self.write_rows(rows)
+                self.rows_written += len(rows)
+                if self.rotate_bytes and self.part_size() >= self.rotate_bytes:
+                    self.rotate()
+            self.last_flush = time.monotonic()
+        for callback in callbacks:
+            callback()
+
+    def rotate(self) -> None:
+        self.close_part()
+        self.part_open = False
+        self.part_number += 1
+        self.path = self.part_path(self.part_number)
+        self.logger.info(f"Rotating output to {self.path}")
+
+    def reset(self) -> None:
+        """Discards buffered rows and removes every part written so far."""
+        with self.lock:
+            self.buffer, self.callbacks = [], []
+            if self.part_open:
+                self.close_part()
+                self.part_open = False
+            for path in self.existing_parts():
+                os.remove(path)
+            self.part_number = 0
+            self.path = self.part_path(0)
+
+    def part_size(self) -> int:
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def close(self) -> None:
+        self.flush()
+        with self.lock:
+            if self.part_open:
+                self.close_part()
+                self.part_open = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def read_rows(self) -> Iterator[Dict[str, Any]]:
+        """Reads back every row of every part already on disk."""
+        for path in self.existing_parts():
+            yield from self.read_part(path)
+
+    def written_keys(self, accept: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Set[str]:
+        """Keys of the rows already on disk, limited to the rows accept returns True for if given."""
+        return {str(row[self.key_field]) for row in self.read_rows()
+                if row.get(self.key_field) is not None and (accept is None or accept(row))}
+
+    def recorded_check(self, accept: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Callable[[str], bool]:
+        """is_recorded check for JobJournal.recover; existing output is only read if it is actually needed."""
+        keys: Optional[Set[str]] = None
+
+        def is_recorded(item: str) -> bool:
+            nonlocal keys
+            if keys is None:
+                keys = self.written_keys(accept)
+            return item in keys
+
+        return is_recorded
+
+    # Format specific
+    def open_part(self, path: str) -> None:
+        raise NotImplementedError
+
+    def write_rows(self, rows: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    def close_part(self) -> None:
+        raise NotImplementedError
+
+    def read_part(self, path: str) -> Iterator[Dict[str, Any]]:
+        raise NotImplementedError
+
+class CsvSink(OutputSink):
+    extension = ".csv"
+
+    def open_part(self, path: str) -> None:
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.stream = open_text_stream(path, "a", self.compression)
+        self.writer = csv.DictWriter(self.stream, fieldnames=self.fields, extrasaction='ignore')
+        if is_new:
+            self.writer.writeheader()
+
+    def write_rows(self, rows: List[Dict[str, Any]]) -> None:
+        self.writer.writerows(rows)
+        self.stream.flush()
+
+    def close_part(self) -> None:
+        self.stream.close()
+
+    def read_part(self, path: str) -> Iterator[Dict[str, Any]]:
+        with open_text_stream(path, "r", self.compression) as stream:
+            yield from csv.DictReader(stream)
+
+class JsonlSink(OutputSink):
+    extension = ".jsonl"
+
+    def open_part(self, path: str) -> None:
+        self.stream = open_text_stream(path, "a", self.compression)
+
+    def write_rows(self, rows: List[Dict[str, Any]]) -> None:
+        self.stream.write("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows))
+        self.stream.flush()
+
+    def close_part(self) -> None:
+        self.stream.close()
+
+    def read_part(self, path: str) -> Iterator[Dict[str, Any]]:
+        with open_text_stream(path, "r", self.compression) as stream:
+            for line in stream:
+                if line.strip():
+                    yield json.loads(line)
+
+class ParquetSink(OutputSink):
+    """Columnar output; every flush becomes a row group. Parquet files cannot be appended to, so a resumed run starts a new part."""
+    extension = ".parquet"
+    supports_append = False
+    supports_compression = False
+
+    def __init__(self, stem: str, fields: List[str], key_field: Optional[str] = None, compression: Optional[str] = None, **kwargs):
+        self.pyarrow = _import_pyarrow()
+        self.codec = compression or "snappy"
+        self.schema = self.pyarrow.schema([(field, self.pyarrow.string()) for field in fields])
+        super().__init__(stem, fields, key_field, compression, **kwargs)
+
+    def open_part(self, path: str) -> None:
+        self.parquet_writer = self.pyarrow.parquet.ParquetWriter(path, self.schema, compression=self.codec)
+
+    def write_rows(self, rows: List[Dict[str, Any]]) -> None:
+        columns = {field: [None if row.get(field) is None else str(row.get(field)) for row in rows] for field in self.fields}
+        self.parquet_writer.write_table(self.pyarrow.table(columns, schema=self.schema))
+
+    def close_part(self) -> None:
+        self.parquet_writer.close()
+
+    def read_part(self, path: str) -> Iterator[Dict[str, Any]]:
+        if self.part_open and path == self.path:
+            return  # Still being written; the footer only exists once it is closed
+        yield from self.pyarrow.parquet.read_table(path).to_pylist()
+
+class SqliteSink(OutputSink):
+    """Rows go to a 'records' table; with key_field set, a repeated key replaces the earlier row."""
+    extension = ".sqlite3"
+    supports_compression = False
+
+    def open_part(self, path: str) -> None:
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        columns = ", ".join(f'"{field}" TEXT' + (" PRIMARY KEY" if field == self.key_field else "") for field in self.fields)
+        self.connection.execute(f"CREATE TABLE IF NOT EXISTS records ({columns})")
+        self.connection.commit()
+
+    def write_rows(self, rows: List[Dict[str, Any]]) -> None:
+        columns = ", ".join(f'"{field}"' for field in self.fields)
+        placeholders = ", ".join("?" for _ in self.fields)
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO records ({columns}) VALUES ({placeholders})",
+                [[row.get(field) for field in self.fields] for row in rows]
+            )
+
+    def close_part(self) -> None:
+        self.connection.close()
+
+    def read_part(self, path: str) -> Iterator[Dict[str, Any]]:
+        connection = sqlite3.connect(path)
+        connection.row_factory = sqlite3.Row
+        try:
+            for row in connection.execute("SELECT * FROM records"):
+                yield dict(row)
+        finally:
+            connection.close()
+
+SINK_FORMATS = {"csv": CsvSink, "jsonl": JsonlSink, "parquet": ParquetSink, "sqlite": SqliteSink}
+
+class SinkConfig(NamedTuple):
+    """Output settings chosen on the command line (see argument_parser_utility.add_sink_arguments)."""
+    format: str = "csv"
+    compression: Optional[str] = None
+    rotate_mb: Optional[float] = None
+    batch_size: int = 500
+    flush_interval: float = 5.0
+
+    @classmethod
+    def from_args(cls, args) -> "SinkConfig":
+        return cls(args.sink, args.compress, args.rotate_mb, args.flush_rows, args.flush_seconds)
+
+    def open(self, stem: str, fields: List[str], key_field: Optional[str] = None) -> OutputSink:
+        rotate_bytes = int(self.rotate_mb * 1024 * 1024) if self.rotate_mb else None
+        return SINK_FORMATS[self.format](stem, fields, key_field, self.compression, batch_size=self.batch_size,
+                                         flush_interval=self.flush_interval, rotate_bytes=rotate_bytes)
@@ -0,0 +1,166 @@
+import copy
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from includes.logging_config import get_logger
+from includes.constants import DEFAULT_TIMEOUT
+from includes.ItemDeadline import clamp_timeout
+
+# True once the document has loaded and neither jQuery nor AngularJS has a request in flight
+PAGE_IDLE_JS = """
+if (document.readyState !== 'complete') {
+    return false;
+}
+if (window.jQuery && window.jQuery.active > 0) {
+    return false;
+}
+try {
+    if (window.angular) {
+        var injector = window.angular.element(document.body).injector();
+        if (injector && injector.get('$http').pendingRequests.length > 0) {
+            return false;
+        }
+    }
+} catch (e) {}
+return true;
+"""
+
+def page_idle(driver) -> bool:
+    return bool(driver.execute_script(PAGE_IDLE_JS))
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+class ActionStats:
+    def __init__(self, sample_size: int):
+        self.latencies: Deque[float] = deque(maxlen=sample_size)
+        self.count = 0
+        self.expired = 0
+        self.waited = 0.0
+
+class Pacer:
+    """
+    Condition-based pacing for named UI actions, in place of fixed sleeps.
+
+    wait() polls a completion condition (a callable taking the driver, like the ones WebDriverWait
+    and expected_conditions use) and raises TimeoutException if it never holds. settle() is for
+    conditions that are only a good sign, such as a grid refreshing after a click: it gives up
+    quietly after a budget that starts at the old fixed sleep and, once an action has min_samples
+    observations, shrinks to the given percentile of its observed latencies (with headroom).
+    A settle that runs out counts its budget as a sample, so the budget grows back when it is too
+    tight. Time spent in both is totalled per action so report() can show waiting against working.
+    Worker browsers share one Pacer's statistics through for_driver().
+    """
+    def __init__(self, driver, poll_interval: float = 0.1, percentile: float = 0.95, headroom: float = 1.5,
+                 min_samples: int = 5, sample_size: int = 200):
+        self.driver = driver
+        self.poll_interval = poll_interval
+        self.percentile = percentile
+        self.headroom = headroom
+        self.min_samples = min_samples
+        self.sample_size = sample_size
+        self.logger = get_logger(self.__class__.__name__)
+        self.lock = threading.Lock()
+        self.actions: Dict[str, ActionStats] = {}
+        self.started = time.monotonic()
+        self.browsers = [driver]
+
+    def for_driver(self, driver) -> 'Pacer':
+        """A pacer for another browser that learns from and reports into this one's statistics."""
+        pacer = copy.copy(self)
+        pacer.driver = driver
+        with self.lock:
+            self.browsers.append(driver)
+        return pacer
+
+    def stats(self, action: str) -> ActionStats:
+        if action not in self.actions:
+            self.actions[action] = ActionStats(self.sample_size)
+        return self.actions[action]
+
+    def budget(self, action: str, fallback: float) -> float:
+        """How long settle() waits for action: the fallback until enough latencies are known, then their percentile."""
+        with self.lock:
+            latencies = list(self.stats(action).latencies)
+        if len(latencies) < self.min_samples:
+            return fallback
+        return min(fallback, max(percentile(latencies, self.percentile) * self.headroom, self.poll_interval))
+
+    def poll(self, condition: Callable[[Any], Any], timeout: float, quiet: float = 0) -> Any:
+        """Returns the first truthy condition result (held for quiet seconds if set), or None at the timeout."""
+        deadline = time.monotonic() + clamp_timeout(timeout)
+        held_since = None
+        while True:
+            try:
+                result = condition(self.driver)
+            except WebDriverException:
+                # Elements missing or replaced, or a script run mid-navigation: not there yet
+                result = None
+            now = time.monotonic()
+            if not result:
+                held_since = None
+            elif quiet <= 0 or (held_since is not None and now - held_since >= quiet):
+                return result
+            elif held_since is None:
+                held_since = now
+            if now >= deadline:
+                return None
+            time.sleep(min(self.poll_interval, max(deadline - now, 0)))
+
+    def record(self, action: str, elapsed: float, satisfied: bool) -> None:
+        with self.lock:
+            stats = self.stats(action)
+            stats.count += 1
+            stats.waited += elapsed
+            stats.latencies.append(elapsed)
+            if not satisfied:
+                stats.expired += 1
+
+    def wait(self, action: str, condition: Callable[[Any], Any], timeout: float = DEFAULT_TIMEOUT, quiet: float = 0) -> Any:
+        start = time.monotonic()
+        result = self.poll(condition, timeout, quiet)
+        elapsed = time.monotonic() - start
+        self.record(action, elapsed, result is not None)
+        if result is None:
+            raise TimeoutException(f"{action} did not complete within {timeout} seconds")
+        return result
+
+    def settle(self, action: str, condition: Callable[[Any], Any], fallback: float, quiet: float = 0) -> Any:
+        budget = self.budget(action, fallback)
+        start = time.monotonic()
+        result = self.poll(condition, budget, quiet)
+        elapsed = time.monotonic() - start
+        self.record(action, elapsed, result is not None)
+        if result is None:
+            self.logger.debug(f"{action} not confirmed after {budget:.1f}s, continuing")
+        return result
+
+    def report(self) -> List[str]:
+        with self.lock:
+            actions = sorted(self.actions.items(), key=lambda item: -item[1].waited)
+            waited = sum(stats.waited for _, stats in actions)
+            lines = []
+            for action, stats in actions:
+                latencies = list(stats.latencies)
+                lines.append(
+                    f"{action}: {stats.count} waits, {stats.waited:.1f}s total, "
+                    f"p50 {percentile(latencies, 0.5):.2f}s, p{self.percentile * 100:.0f} {percentile(latencies, self.percentile):.2f}s, "
+                    f"{stats.expired} unconfirmed"
+                )
+        # Each browser waits on its own, so waiting is weighed against wall time summed over browsers
+        wall = time.monotonic() - self.started
+        browser_time = wall * len(self.browsers)
+        share = waited / browser_time if browser_time else 0
+        lines.insert(0, f"Pacing: {wall:.1f}s wall time over {len(self.browsers)} browser(s), "
+                        f"{waited:.1f}s waiting ({share:.0%}), {browser_time - waited:.1f}s working")
+        return lines
+
+    def log_report(self) -> None:
+        if not self.actions:
+            return
+        for line in self.report():
+            self.logger.info(line)
@@ -0,0 +1,128 @@
+import csv
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from includes.logging_config import get_logger
+
+class ReservationStore:
+    """
+    Keyed SQLite store of gathered reservation data, one row per reservation and one TEXT column per field.
+
+    Rows are upserted as soon as a reservation is processed; the CSV the scripts hand out is produced
+    by export_csv. New fields are added as columns on open, so older stores keep working.
+    """
+    def __init__(self, path: str, fields: List[str], key_field: str = "ReservationId"):
+        self.path = path
+        self.fields = fields
+        self.key_field = key_field
+        self.logger = get_logger(self.__class__.__name__)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(f'CREATE TABLE IF NOT EXISTS reservations ("{key_field}" TEXT PRIMARY KEY)')
+
+        existing_columns = {row["name"] for row in self.connection.execute("PRAGMA table_info(reservations)")}
+        for field in fields:
+            if field not in existing_columns:
+                self.connection.execute(f'ALTER TABLE reservations ADD COLUMN "{field}" TEXT NOT NULL DEFAULT \'\'')
+                self.logger.info(f"Added field {field} to the reservation store")
+        self.connection.commit()
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM reservations").fetchone()[0]
+
+    def upsert(self, row: Dict[str, str]) -> None:
+        values = [row.get(field) or "" for field in self.fields]
+        if not values[self.fields.index(self.key_field)]:
+            raise ValueError(f"Cannot store a row without {self.key_field}")
+        self.upsert_many([values])
+
+    def upsert_many(self, rows: Iterable[List[str]]) -> None:
+        columns = ", ".join(f'"{field}"' for field in self.fields)
+        placeholders = ", ".join("?" for _ in self.fields)
+        updates = ", ".join(f'"{field}" = excluded."{field}"' for field in self.fields if field != self.key_field)
+        with self.lock:
+            with self.connection:
+                self.connection.executemany(
+                    f'INSERT INTO reservations ({columns}) VALUES ({placeholders}) '
+                    f'ON CONFLICT ("{self.key_field}") DO UPDATE SET {updates}',
+                    rows
+                )
+
+    def get(self, reservation_id: str) -> Optional[Dict[str, str]]:
+        with self.lock:
+            row = self.connection.execute(f'SELECT * FROM reservations WHERE "{self.key_field}" = ?', (reservation_id,)).fetchone()
+        return {field: row[field] for field in self.fields} if row else None
+
+    def find_incomplete(self, reservation_ids: Iterable[str]) -> List[Tuple[str, Optional[Dict[str, str]]]]:
+        """
+        Returns (reservation id, stored row or None) for every given reservation that is not stored yet
+        or has an empty field, in the order given.
+        """
+        with self.lock:
+            self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (position INTEGER PRIMARY KEY, reservation_id TEXT)")
+            self.connection.execute("DELETE FROM wanted")
+            self.connection.executemany("INSERT INTO wanted (reservation_id) VALUES (?)", ((reservation_id,) for reservation_id in reservation_ids))
+            empty_checks = " OR ".join(f"reservations.\"{field}\" = ''" for field in self.fields)
+            rows = self.connection.execute(
+                f'SELECT wanted.reservation_id AS wanted_id, reservations.* FROM wanted '
+                f'LEFT JOIN reservations ON reservations."{self.key_field}" = wanted.reservation_id '
+                f'WHERE reservations."{self.key_field}" IS NULL OR {empty_checks} '
+                f'GROUP BY wanted.reservation_id ORDER BY MIN(wanted.position)'
+            ).fetchall()
+            self.connection.execute("DELETE FROM wanted")
+            self.connection.commit()
+
+        return [
+            (row["wanted_id"], {field: row[field] for field in self.fields} if row[self.key_field] is not None else None)
+            for row in rows
+        ]
+
+    def import_csv(self, csv_path: str, batch_size: int = 5000) -> int:
+        """Loads rows from a CSV export (any column order, missing columns left empty). Later rows win."""
+        count = 0
+        with open(csv_path, 'r', newline='', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            batch = []
+            for row in reader:
+                if not row.get(self.key_field):
+                    continue
+                batch.append([row.get(field) or "" for field in self.fields])
+                if len(batch) >= batch_size:
+                    self.upsert_many(batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                self.upsert_many(batch)
+                count += len(batch)
+        return count
+
+    def rows(self) -> Iterator[Dict[str, str]]:
+        columns = ", ".join(f'"{field}"' for field in self.fields)
+        with self.lock:
+            cursor = self.connection.execute(f"SELECT {columns} FROM reservations ORDER BY rowid")
+            rows = cursor.fetchmany(1000)
+            while rows:
+                for row in rows:
+                    yield {field: row[field] for field in self.fields}
+                rows = cursor.fetchmany(1000)
+
+    def export_csv(self, csv_path: str) -> int:
+        temp_path = f"{csv_path}.tmp"
+        count = 0
+        with open(temp_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=self.fields)
+            writer.writeheader()
+            for row in self.rows():
+                writer.writerow(row)
+                count += 1
+        os.replace(temp_path, csv_path)
+        return count
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,83 @@
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from includes.billing_parser import extract_billing_table_html, parse_billing_table
+
+TERM_PATTERN = re.compile(r"[a-z0-9]+")
+LEADING_COMMENTS = re.compile(r"\s*(?:<!--.*?-->\s*)*", re.DOTALL)
+AMOUNT_PATTERN = re.compile(r"(-)?\$?\s*([\d,]*\.?\d+)\s*(DR|CR)?", re.IGNORECASE)
+
+def parse_amount(value: str) -> Optional[float]:
+    """Parses billing amounts like '$1,272.00 DR'. Credits (CR) come out negative."""
+    match = AMOUNT_PATTERN.search(value)
+    if not match:
+        return None
+    amount = float(match.group(2).replace(",", ""))
+    if match.group(1) or (match.group(3) or "").upper() == "CR":
+        amount = -amount
+    return amount
+
+def billing_table_html(html: str) -> str:
+    # Saved bookings are normally the table itself (after the URL/ID comments); only full pages need locating
+    if html.startswith("<table", LEADING_COMMENTS.match(html).end()):
+        return html
+    return extract_billing_table_html(html) or html
+
+def natural_key(text: str) -> List:
+    return [(0, int(part), "") if part.isdigit() else (1, 0, part) for part in re.findall(r"\d+|\D+", text)]
+
+def delta_encode(numbers: List[int]) -> List[int]:
+    return [number - previous for previous, number in zip([0] + numbers, numbers)]
+
+class SearchFields(NamedTuple):
+    terms: List[str]
+    balance: Optional[float]
+
+def extract_search_fields(reservation_id: str, html: str) -> SearchFields:
+    table = parse_billing_table(billing_table_html(html))
+    terms = set(TERM_PATTERN.findall(reservation_id.lower()))
+    for line in table.lines + ([table.footer] if table.footer else []):
+        terms.update(TERM_PATTERN.findall(line.key.lower()))
+    balance = parse_amount(table.footer.value) if table.footer else None
+    return SearchFields(sorted(terms), balance)
+
+class SearchIndexBuilder:
+    """
+    Collects searchable fields from booking billing tables while the viewer is built.
+
+    Terms (the reservation id and lowercased words of the billing line and footer keys) map to
+    delta-encoded lists of document numbers. Numeric fields (the footer balance, credits negative)
+    are kept as value-sorted (value, document) columns so the viewer can answer range filters with
+    a binary search. Document numbers index into 'ids'.
+    """
+    def __init__(self):
+        self.ids: List[str] = []
+        self.postings: Dict[str, List[int]] = {}
+        self.ranges: Dict[str, List[Tuple[float, int]]] = {"balance": []}
+
+    def add(self, reservation_id: str, html: str) -> None:
+        self.add_fields(reservation_id, extract_search_fields(reservation_id, html))
+
+    def add_fields(self, reservation_id: str, fields: SearchFields) -> None:
+        """Adds a booking from fields extracted earlier, e.g. kept in a BookingManifest."""
+        document = len(self.ids)
+        self.ids.append(reservation_id)
+        for term in fields.terms:
+            self.postings.setdefault(term, []).append(document)
+        if fields.balance is not None:
+            self.ranges["balance"].append((fields.balance, document))
+
+    def to_dict(self) -> dict:
+        # Documents are renumbered in reservation id order, so the viewer can list matches sorted by number
+        order = sorted(range(len(self.ids)), key=lambda document: natural_key(self.ids[document]))
+        renumber = {document: position for position, document in enumerate(order)}
+        terms = sorted(self.postings)
+        ranges = {}
+        for field, entries in self.ranges.items():
+            entries = sorted((value, renumber[document]) for value, document in entries)
+            ranges[field] = {"values": [value for value, _ in entries], "docs": [document for _, document in entries]}
+        return {
+            "ids": [self.ids[document] for document in order],
+            "terms": terms,
+            "postings": [delta_encode(sorted(renumber[document] for document in self.postings[term])) for term in terms],
+            "ranges": ranges,
+        }
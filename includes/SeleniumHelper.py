@@ -5,30 +5,191 @@ from selenium.webdriver.support.ui import Select
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, ElementClickInterceptedException
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, ElementClickInterceptedException, WebDriverException
 from selenium.webdriver.remote.webelement import WebElement
-from typing import Optional
+from typing import Optional, Dict, List, NamedTuple, Callable, Union, Tuple, Any, TypeVar, Iterator
 import time
 import re
-from includes.decorators import retry
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from includes.decorators import retry, retry_time_left
+from includes.Pacer import Pacer, page_idle
+from includes.DialogWatchdog import DialogWatchdog
+from includes.ItemDeadline import clamp_timeout
 from includes.logging_config import get_logger
 from includes.constants import DEFAULT_TIMEOUT
 
+# Resolves a (by, value) locator to a single element inside the page. Shared by the
+# script-side helpers below so that one execute_script call can look up many elements.
+LOCATE_JS = """
+function locate(by, value, root) {
+    root = root || document;
+    switch (by) {
+        case 'xpath':
+            return document.evaluate(value, root, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+        case 'id':
+            return document.getElementById(value);
+        case 'css selector':
+            return root.querySelector(value);
+        case 'class name':
+            return root.getElementsByClassName(value)[0] || null;
+        case 'name':
+            return root.querySelector('[name="' + value + '"]');
+        case 'tag name':
+            return root.getElementsByTagName(value)[0] || null;
+    }
+    return null;
+}
+"""
+
+_EXTRACT_FIELDS_JS = LOCATE_JS + """
+var specs = arguments[0];
+var result = {};
+for (var i = 0; i < specs.length; i++) {
+    var spec = specs[i];
+    var element = null;
+    try {
+        element = locate(spec[1], spec[2]);
+    } catch (e) {
+        element = null;
+    }
+    if (!element) {
+        result[spec[0]] = null;
+    } else if (spec[3] === 'value') {
+        var value = element.value;
+        result[spec[0]] = (value === undefined || value === null) ? element.getAttribute('value') : String(value);
+    } else {
+        result[spec[0]] = element.innerText;
+    }
+}
+return result;
+"""
+
+_SNAPSHOT_GRID_JS = LOCATE_JS + """
+var container = arguments[0];
+if (Array.isArray(container)) {
+    container = locate(container[0], container[1]);
+}
+if (!container) {
+    return null;
+}
+var rowXpath = arguments[1];
+var cellXpath = arguments[2];
+var columns = arguments[3];
+var required = columns ? Math.max.apply(null, columns) + 1 : 0;
+var rows = document.evaluate(rowXpath, container, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+var result = [];
+for (var i = 0; i < rows.snapshotLength; i++) {
+    var row = rows.snapshotItem(i);
+    var cells = document.evaluate(cellXpath, row, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    if (cells.snapshotLength < required) {
+        continue;
+    }
+    var texts = [];
+    for (var j = 0; j < cells.snapshotLength; j++) {
+        texts.push(cells.snapshotItem(j).innerText);
+    }
+    if (columns) {
+        texts = columns.map(function(index) { return texts[index]; });
+    }
+    var key = row.getAttribute('data-snapshot-key');
+    if (!key) {
+        window.__snapshotRowSeq = (window.__snapshotRowSeq || 0) + 1;
+        key = String(window.__snapshotRowSeq);
+        row.setAttribute('data-snapshot-key', key);
+    }
+    result.push([key, texts]);
+}
+return [container, result];
+"""
+
+_COOKIE_FIELDS = ("name", "value", "path", "domain", "secure", "httpOnly", "expiry", "sameSite")
+
+_READ_STORAGE_JS = """
+function dump(storage) {
+    var result = {};
+    for (var i = 0; i < storage.length; i++) {
+        var key = storage.key(i);
+        result[key] = storage.getItem(key);
+    }
+    return result;
+}
+return [dump(window.localStorage), dump(window.sessionStorage)];
+"""
+
+_WRITE_STORAGE_JS = """
+var local = arguments[0] || {};
+var session = arguments[1] || {};
+Object.keys(local).forEach(function(key) { window.localStorage.setItem(key, local[key]); });
+Object.keys(session).forEach(function(key) { window.sessionStorage.setItem(key, session[key]); });
+"""
+
+T = TypeVar("T")
+
+GRID_ROW_XPATH = './/div[contains(@class, "GridLiteRow")]'
+GRID_COLUMN_XPATH = './/div[contains(@class, "GridLiteColumn")]'
+
+class GridRow(NamedTuple):
+    """
+    One row of a SeleniumHelper.snapshot_grid result.
+
+    key: stable key stamped onto the row element, used by SeleniumHelper.get_row_element
+    cells: cell texts, in the order of the requested columns
+    occurrence: 1 for the first row of the snapshot with this content, 2 for the next identical one...
+    """
+    key: str
+    cells: List[str]
+    occurrence: int = 1
+
+    def content(self) -> str:
+        return " | ".join(cell.strip() for cell in self.cells)
+
+    def identity(self) -> str:
+        """Content-based identity that survives re-renders, unlike key, and tells identical rows apart. Used to journal grid rows."""
+        content = self.content()
+        return content if self.occurrence == 1 else f"{content} #{self.occurrence}"
+
+class FieldSpec(NamedTuple):
+    """
+    Declarative description of a single field read by SeleniumHelper.extract_fields.
+
+    by/value: Selenium locator for the element
+    source: "text" for the element's visible text, "value" for its value attribute
+    transform: name of a registered transform (e.g. "sanitize") or a callable applied to the raw string
+    """
+    by: str
+    value: str
+    source: str = "text"
+    transform: Union[str, Callable[[str], str], None] = "sanitize"
+
 class SeleniumHelper:
-    def __init__(self, driver: webdriver.Chrome):
+    def __init__(self, driver: webdriver.Chrome, pacer: Optional[Pacer] = None):
         self.driver = driver
         self.logger = get_logger(__name__)
+        self.pacer = pacer.for_driver(driver) if pacer else Pacer(driver)
+        self.dialogs = DialogWatchdog(driver)
+        # Elements found by find_cached, by (by, value) locator; emptied when a new page loads
+        self.element_cache: Dict[Tuple[str, str], WebElement] = {}
+
+    def _clamp(self, timeout: float) -> float:
+        # Bounded by the deadline of the work item in progress and by the budget of the @retry call around it
+        timeout = clamp_timeout(timeout)
+        left = retry_time_left()
+        return timeout if left is None or not timeout else min(timeout, left)
+
+    def _wait(self, timeout: float) -> WebDriverWait:
+        return WebDriverWait(self.driver, self._clamp(timeout))
 
     @retry((TimeoutException, NoSuchElementException, StaleElementReferenceException))
     def wait_for_element(self, by: By, value: str, timeout: int = DEFAULT_TIMEOUT, 
                          _retry_tries: int = 3, _retry_delay: int = 1, _retry_backoff: int = 2) -> Optional[WebElement]:
-        return WebDriverWait(self.driver, timeout).until(
+        return self._wait(timeout).until(
             EC.presence_of_element_located((by, value))
         )
 
     @retry((TimeoutException, NoSuchElementException, StaleElementReferenceException))
     def wait_for_clickable_element(self, by: By, value: str, timeout: int = DEFAULT_TIMEOUT) -> Optional[WebElement]:
-        return WebDriverWait(self.driver, timeout).until(
+        return self._wait(timeout).until(
             EC.element_to_be_clickable((by, value))
         )
 
@@ -49,7 +210,7 @@ class SeleniumHelper:
     
     def is_element_visible(self, by: By, value: str, timeout: int = 0) -> bool:
         try:
-            element = WebDriverWait(self.driver, timeout).until(
+            element = self._wait(timeout).until(
                 EC.visibility_of_element_located((by, value))
             )
             return element.is_displayed()
@@ -60,26 +221,37 @@ class SeleniumHelper:
 
     @retry((TimeoutException, NoSuchElementException, StaleElementReferenceException))
     def wait_for_visibility(self, by: By, value: str, timeout: int = DEFAULT_TIMEOUT) -> Optional[WebElement]:
-        return WebDriverWait(self.driver, timeout).until(
+        return self._wait(timeout).until(
             EC.visibility_of_element_located((by, value))
         )
 
     @retry((TimeoutException, NoSuchElementException, StaleElementReferenceException))
     def wait_for_invisibility(self, by: By, value: str, timeout: int = DEFAULT_TIMEOUT) -> bool:
-        return WebDriverWait(self.driver, timeout).until(
+        return self._wait(timeout).until(
             EC.invisibility_of_element_located((by, value))
         )
     
+    @contextmanager
+    def script_timeout(self, seconds: float) -> Iterator[None]:
+        """Runs the body with the async script timeout set to seconds (cut to the item deadline), then restores the previous timeout."""
+        previous = self.driver.timeouts.script
+        self.driver.set_script_timeout(self._clamp(seconds))
+        try:
+            yield
+        finally:
+            self.driver.set_script_timeout(previous)
+
     def wait_for_page_load(self, timeout=30):
+        self.forget_elements()
         try:
-            WebDriverWait(self.driver, timeout).until(
+            self._wait(timeout).until(
                 lambda d: d.execute_script('return document.readyState') == 'complete'
             )
         except TimeoutException:
             self.logger.warning(f"Page load timed out after {timeout} seconds")
         
     def wait_until_stable(self, by: By, value: str, timeout: float = 10, poll_frequency: float = 0.5) -> Optional[WebElement]:
-        end_time = time.time() + timeout
+        end_time = time.time() + self._clamp(timeout)
         last_exception = None
         while time.time() < end_time:
             try:
@@ -95,7 +267,7 @@ class SeleniumHelper:
 
     def is_element_visible_by_dimensions(self, by: By, value: str, timeout: int = 5) -> bool:
         try:
-            element = WebDriverWait(self.driver, timeout).until(
+            element = self._wait(timeout).until(
                 EC.presence_of_element_located((by, value))
             )
             size = element.size
@@ -110,7 +282,7 @@ class SeleniumHelper:
                 dropdown = self.wait_for_element(by, value)
                 select = Select(dropdown)
                 select.select_by_visible_text(option_text)
-                time.sleep(3)  # Wait for page to update after selection
+                self.pacer.settle("select_from_dropdown", page_idle, fallback=3, quiet=0.3)
                 return
             except (NoSuchElementException, StaleElementReferenceException) as e:
                 if attempt < max_attempts - 1:
@@ -122,19 +294,19 @@ class SeleniumHelper:
     def wait_for_element_state(self, state: str, by: By, value: str, timeout: int = 10) -> Optional[WebElement]:
         try:
             if state == "clickable":
-                return WebDriverWait(self.driver, timeout).until(
+                return self._wait(timeout).until(
                     EC.element_to_be_clickable((by, value))
                 )
             elif state == "visible":
-                return WebDriverWait(self.driver, timeout).until(
+                return self._wait(timeout).until(
                     EC.visibility_of_element_located((by, value))
                 )
             elif state == "invisible":
-                return WebDriverWait(self.driver, timeout).until(
+                return self._wait(timeout).until(
                     EC.invisibility_of_element_located((by, value))
                 )
             elif state == "present":
-                return WebDriverWait(self.driver, timeout).until(
+                return self._wait(timeout).until(
                     EC.presence_of_element_located((by, value))
                 )
             else:
@@ -143,6 +315,29 @@ class SeleniumHelper:
             print(f"Timeout waiting for element to be {state}: {value}")
             return None
 
+    def find_cached(self, by: By, value: str, timeout: float = DEFAULT_TIMEOUT) -> WebElement:
+        """
+        The element at (by, value), looked up once per page and reused after that. The reference may
+        have gone stale since; with_cached handles that.
+        """
+        key = (by, value)
+        element = self.element_cache.get(key)
+        if element is None:
+            element = self._wait(timeout).until(EC.presence_of_element_located(key))
+            self.element_cache[key] = element
+        return element
+
+    def with_cached(self, by: By, value: str, action: Callable[[WebElement], T], timeout: float = DEFAULT_TIMEOUT) -> T:
+        """Runs action on the cached element at (by, value). If the element was re-rendered, it is looked up again and action rerun at once."""
+        try:
+            return action(self.find_cached(by, value, timeout))
+        except StaleElementReferenceException:
+            self.element_cache.pop((by, value), None)
+            return action(self.find_cached(by, value, timeout))
+
+    def forget_elements(self) -> None:
+        self.element_cache.clear()
+
     def is_element_present(self, by: By, value: str) -> bool:
         try:
             self.driver.find_element(by, value)
@@ -192,4 +387,116 @@ class SeleniumHelper:
     @retry((NoSuchElementException, StaleElementReferenceException))
     def get_element_value(self, by: By, value: str) -> str:
         element = self.wait_for_element(by, value)
-        return self.sanitize_text(element.get_attribute("value")) if element else ""
\ No newline at end of file
+        return self.sanitize_text(element.get_attribute("value")) if element else ""
+
+    def extract_fields(self, spec: Dict[str, FieldSpec], timeout: float = 0) -> Dict[str, Optional[str]]:
+        """
+        Reads every field in spec with a single execute_script round trip.
+
+        Fields whose element is not on the page are returned as None instead of raising.
+        When timeout is set, polls until at least one field is present or the timeout expires.
+        """
+        script_args = [[name, field.by, field.value, field.source] for name, field in spec.items()]
+
+        def run_script(driver):
+            values = driver.execute_script(_EXTRACT_FIELDS_JS, script_args)
+            return values if any(v is not None for v in values.values()) else False
+
+        try:
+            if timeout:
+                raw_values = self._wait(timeout).until(run_script)
+            else:
+                raw_values = self.driver.execute_script(_EXTRACT_FIELDS_JS, script_args)
+        except TimeoutException:
+            raw_values = {}
+
+        fields = {}
+        for name, field in spec.items():
+            raw_value = raw_values.get(name)
+            fields[name] = None if raw_value is None else self._apply_transform(field.transform, raw_value)
+        return fields
+
+    def _apply_transform(self, transform: Union[str, Callable[[str], str], None], text: str) -> str:
+        if transform is None:
+            return text
+        if callable(transform):
+            return transform(text)
+        if transform == "sanitize":
+            return self.sanitize_text(text)
+        if transform == "strip":
+            return text.strip()
+        raise ValueError(f"Unsupported field transform: {transform}")
+
+    def snapshot_grid(self, container_locator: Union[Tuple[str, str], WebElement], columns: Optional[List[int]] = None,
+                      row_xpath: str = GRID_ROW_XPATH, cell_xpath: str = GRID_COLUMN_XPATH,
+                      timeout: float = DEFAULT_TIMEOUT) -> List[GridRow]:
+        """
+        Reads every rendered row of a GridLite grid with a single execute_script call.
+
+        container_locator: (by, value) locator, whose element is cached for later snapshots, or an already located container element
+        columns: cell indexes to return; rows that do not have every requested column are skipped
+        Raises TimeoutException if the container does not appear within timeout.
+        """
+        locator = tuple(container_locator) if isinstance(container_locator, tuple) else None
+
+        def run_script(driver):
+            container = container_locator if locator is None else self.element_cache.get(locator, list(locator))
+            try:
+                found = driver.execute_script(_SNAPSHOT_GRID_JS, container, row_xpath, cell_xpath, columns)
+            except StaleElementReferenceException:
+                if locator is None:
+                    raise
+                # The cached container was re-rendered: look it up again straight away
+                self.element_cache.pop(locator, None)
+                found = driver.execute_script(_SNAPSHOT_GRID_JS, list(locator), row_xpath, cell_xpath, columns)
+            if found is None:
+                return False
+            if locator is not None:
+                self.element_cache[locator] = found[0]
+            # Wrapped so that an empty grid still ends the wait; only a missing container keeps polling
+            return (found[1],)
+
+        if timeout:
+            rows = self._wait(timeout).until(run_script, message=f"Grid container not found: {container_locator}")[0]
+        else:
+            result = run_script(self.driver)
+            rows = result[0] if result else []
+        snapshot = []
+        seen: Dict[str, int] = {}
+        for key, cells in rows:
+            row = GridRow(key, cells)
+            seen[row.content()] = seen.get(row.content(), 0) + 1
+            snapshot.append(row._replace(occurrence=seen[row.content()]))
+        return snapshot
+
+    def get_row_element(self, row: GridRow) -> WebElement:
+        """Turns a snapshot row back into a clickable element. Raises NoSuchElementException if it was re-rendered."""
+        return self.driver.find_element(By.CSS_SELECTOR, f'[data-snapshot-key="{row.key}"]')
+
+    def get_session_state(self) -> Dict[str, Any]:
+        """Captures the authenticated browser session: current URL, cookies and local/session storage."""
+        local_storage, session_storage = self.driver.execute_script(_READ_STORAGE_JS)
+        return {
+            "url": self.driver.current_url,
+            "cookies": self.driver.get_cookies(),
+            "local_storage": local_storage,
+            "session_storage": session_storage,
+        }
+
+    def restore_session_state(self, state: Dict[str, Any], url: Optional[str] = None) -> None:
+        """Loads a session captured by get_session_state into this driver and navigates to url (default: the captured URL)."""
+        target_url = url or state["url"]
+        parts = urlsplit(target_url)
+        # Cookies and storage can only be set for the origin currently loaded
+        self.driver.get(f"{parts.scheme}://{parts.netloc}/")
+
+        for cookie in state.get("cookies", []):
+            cookie = {key: value for key, value in cookie.items() if key in _COOKIE_FIELDS}
+            try:
+                self.driver.add_cookie(cookie)
+            except WebDriverException as e:
+                self.logger.debug(f"Skipping cookie {cookie.get('name')} for {parts.netloc}: {str(e)}")
+
+        self.driver.execute_script(_WRITE_STORAGE_JS, state.get("local_storage"), state.get("session_storage"))
+        self.driver.get(target_url)
+        self.forget_elements()
@@ -0,0 +1,85 @@
+import base64
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Any, Optional
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from includes.logging_config import get_logger
+from includes.constants import SESSION_CACHE_DIR, SESSION_CACHE_TTL
+
+SALT_SIZE = 16
+KDF_ITERATIONS = 200_000
+
+class SessionCache:
+    """
+    Encrypted on-disk cache of authenticated browser sessions, one file per tenant and user.
+
+    Entries hold the state captured by SeleniumHelper.get_session_state and are encrypted with
+    a key derived from the account credentials, so only the same username/password can read them.
+    """
+    def __init__(self, username: str, password: str, cache_dir: str = SESSION_CACHE_DIR, ttl: int = SESSION_CACHE_TTL):
+        self.username = username
+        self.password = password
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.logger = get_logger(self.__class__.__name__)
+
+    def path_for(self, tenant: str) -> str:
+        user_hash = hashlib.sha256(self.username.encode("utf-8")).hexdigest()[:12]
+        return os.path.join(self.cache_dir, f"{tenant}_{user_hash}.session")
+
+    def _fernet(self, salt: bytes) -> Fernet:
+        kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=KDF_ITERATIONS)
+        secret = f"{self.username}\0{self.password}".encode("utf-8")
+        return Fernet(base64.urlsafe_b64encode(kdf.derive(secret)))
+
+    def load(self, tenant: str) -> Optional[Dict[str, Any]]:
+        path = self.path_for(tenant)
+        if not os.path.exists(path):
+            return None
+
+        with open(path, "rb") as f:
+            blob = f.read()
+        try:
+            payload = self._fernet(blob[:SALT_SIZE]).decrypt(blob[SALT_SIZE:])
+            entry = json.loads(payload.decode("utf-8"))
+        except (InvalidToken, ValueError):
+            self.logger.warning(f"Session cache for {tenant} could not be decrypted. Discarding it.")
+            self.clear(tenant)
+            return None
+
+        if entry["expires_at"] <= time.time():
+            self.logger.info(f"Cached session for {tenant} expired. Discarding it.")
+            self.clear(tenant)
+            return None
+        return entry["state"]
+
+    def save(self, tenant: str, state: Dict[str, Any]) -> None:
+        saved_at = time.time()
+        entry = {"saved_at": saved_at, "expires_at": self.expiry_for(state, saved_at), "state": state}
+
+        salt = os.urandom(SALT_SIZE)
+        token = self._fernet(salt).encrypt(json.dumps(entry).encode("utf-8"))
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path_for(tenant)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(salt + token)
+        os.replace(temp_path, path)
+        self.logger.info(f"Saved session for {tenant} (expires {time.ctime(entry['expires_at'])})")
+
+    def clear(self, tenant: str) -> None:
+        path = self.path_for(tenant)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def expiry_for(self, state: Dict[str, Any], saved_at: float) -> float:
+        # Auth cookies are httpOnly; the earliest of their expiries bounds the session, otherwise the TTL does
+        expiry = saved_at + self.ttl
+        for cookie in state.get("cookies", []):
+            if cookie.get("httpOnly") and "expiry" in cookie:
+                expiry = min(expiry, float(cookie["expiry"]))
+        return expiry
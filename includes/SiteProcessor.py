@@ -3,22 +3,108 @@ from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from typing import Tuple, Optional, List
+from selenium.common.exceptions import TimeoutException
+from typing import Callable, Optional, List, Dict, NamedTuple, Iterable
 import time
 import re
-from includes.SeleniumHelper import SeleniumHelper
+from includes.SeleniumHelper import SeleniumHelper, LOCATE_JS
 from includes.AttributeManager import AttributeManager
 from includes.TaxManager import TaxManager
+from includes.JobJournal import JobJournal
+from includes.ItemDeadline import ItemDeadlineExceeded, item_deadline
 from includes.logging_config import get_logger
 from includes.constants import DEFAULT_TIMEOUT
 
+# Scrolls the virtualized Category grid from top to bottom inside the page and returns
+# [category text, scroll offset of the row] for every row rendered along the way.
+_HARVEST_SITES_JS = LOCATE_JS + """
+var container = locate('xpath', arguments[0]);
+var rowXpath = arguments[1];
+var cellXpath = arguments[2];
+var pause = arguments[3];
+var done = arguments[arguments.length - 1];
+if (!container) {
+    done(null);
+    return;
+}
+var seen = {};
+var entries = [];
+function collect() {
+    var containerTop = container.getBoundingClientRect().top;
+    var rows = document.evaluate(rowXpath, container, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    for (var i = 0; i < rows.snapshotLength; i++) {
+        var row = rows.snapshotItem(i);
+        var cell = document.evaluate(cellXpath, row, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+        if (!cell) {
+            continue;
+        }
+        var text = cell.innerText.trim();
+        if (!(text in seen)) {
+            seen[text] = true;
+            entries.push([text, Math.round(container.scrollTop + row.getBoundingClientRect().top - containerTop)]);
+        }
+    }
+}
+function step() {
+    collect();
+    if (container.scrollTop + container.clientHeight >= container.scrollHeight - 1) {
+        container.scrollTop = 0;
+        done(entries);
+        return;
+    }
+    container.scrollTop += Math.max(Math.floor(container.clientHeight / 2), 1);
+    setTimeout(step, pause);
+}
+container.scrollTop = 0;
+setTimeout(step, pause);
+"""
+
+# Scrolls the container straight to a harvested offset and returns the row whose category
+# text matches, waiting a few render ticks for the virtualized grid to draw it.
+_JUMP_TO_SITE_JS = """
+var container = arguments[0];
+var rowXpath = arguments[1];
+var cellXpath = arguments[2];
+var offset = arguments[3];
+var categoryText = arguments[4];
+var pause = arguments[5];
+var done = arguments[arguments.length - 1];
+container.scrollTop = Math.max(offset - Math.floor(container.clientHeight / 4), 0);
+var ticks = 0;
+function find() {
+    var rows = document.evaluate(rowXpath, container, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    for (var i = 0; i < rows.snapshotLength; i++) {
+        var row = rows.snapshotItem(i);
+        var cell = document.evaluate(cellXpath, row, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+        if (cell && cell.innerText.trim() === categoryText) {
+            done(row);
+            return;
+        }
+    }
+    if (++ticks > 20) {
+        done(null);
+        return;
+    }
+    setTimeout(find, pause);
+}
+find();
+"""
+
+SITE_ROW_XPATH = "./div[contains(@class, 'GridLiteRow')]"
+SITE_CATEGORY_XPATH = ".//div[contains(@class, 'GridLiteCell_Category')]"
+
+class SiteIndexEntry(NamedTuple):
+    site_number: int
+    category_text: str
+    scroll_offset: int
+
 class SiteProcessor:
     def __init__(self, selenium_helper: SeleniumHelper, attribute_manager: AttributeManager, tax_manager: TaxManager):
         self.selenium_helper = selenium_helper
         self.attribute_manager = attribute_manager
         self.tax_manager = tax_manager
         self.logger = get_logger(__name__)
+        self.site_index: Dict[int, SiteIndexEntry] = {}
 
     def extract_site_number(self, category_text: str) -> Optional[int]:
         match = re.search(r'\d+', category_text)
@@ -30,57 +116,102 @@ class SiteProcessor:
             self.logger.warning(f"No number found in: {category_text}")
             return None
 
-    def find_next_site(self, current_number: int, container_xpath: str, max_attempts: int = 40, lookahead: int = 30) -> Tuple[Optional[WebElement], Optional[int], Optional[str]]:
-        total_records = self.get_total_records()
-        self.logger.info(f"Total records: {total_records}")
-        processed_rows_count = 0
-
-        for attempt in range(max_attempts):
-            self.logger.info(f"Attempt {attempt + 1}/{max_attempts}")
-            try:
-                rows: List[WebElement] = self.selenium_helper.driver.find_elements(By.XPATH, f"{container_xpath}/div[contains(@class, 'GridLiteRow')]")
-                self.logger.info(f"Found {len(rows)} rows in this attempt")
-
-                for index, row in enumerate(rows):
-                    try:
-                        category_element = row.find_element(By.XPATH, ".//div[contains(@class, 'GridLiteCell_Category')]")
-                        category_text = category_element.text
-                        self.logger.info(f"Row {index + 1}: Category text: {category_text}")
-                        site_number = self.extract_site_number(category_text)
-                        self.logger.info(f"Extracted site number: {site_number}")
-                        
-                        if site_number and site_number > current_number and site_number <= current_number + lookahead:
-                            self.logger.info(f"Found next site: {site_number}")
-                            return row, site_number, category_text
-                    except NoSuchElementException:
-                        self.logger.warning(f"Row {index + 1}: No category element found")
-                        continue
+    def build_site_index(self, container_xpath: str, render_pause: float = 0.15, script_timeout: int = 600) -> Dict[int, SiteIndexEntry]:
+        """
+        Harvests the virtualized Category grid once into site number -> (category text, scroll offset).
+        The whole scroll-and-collect pass runs inside the page as a single async script.
+        """
+        driver = self.selenium_helper.driver
+        self.selenium_helper.wait_for_element(By.XPATH, container_xpath)
+        with self.selenium_helper.script_timeout(script_timeout):
+            harvested = driver.execute_async_script(_HARVEST_SITES_JS, container_xpath, SITE_ROW_XPATH, SITE_CATEGORY_XPATH, int(render_pause * 1000))
+        if harvested is None:
+            self.logger.error("Container element not found. Site index is empty.")
+            harvested = []
 
-                processed_rows_count += len(rows)
-                self.logger.info(f"Processed rows so far: {processed_rows_count}")
+        self.site_index = {}
+        for category_text, scroll_offset in harvested:
+            site_number = self.extract_site_number(category_text)
+            if site_number is None:
+                continue
+            if site_number in self.site_index:
+                self.logger.warning(f"Duplicate site number {site_number}: keeping '{self.site_index[site_number].category_text}', ignoring '{category_text}'")
+                continue
+            self.site_index[site_number] = SiteIndexEntry(site_number, category_text, scroll_offset)
 
-                container = self.selenium_helper.wait_for_element(By.XPATH, container_xpath)
-                if not container:
-                    self.logger.error("Container element not found. Exiting loop.")
-                    break
+        total_records = self.get_total_records()
+        self.logger.info(f"Indexed {len(self.site_index)} sites from {len(harvested)} rows (total records: {total_records})")
+        if len(harvested) < total_records:
+            self.logger.warning(f"Harvested {len(harvested)} rows but the grid reports {total_records} records")
+        return self.site_index
 
-                at_end = self.selenium_helper.is_at_bottom(container)
-                self.logger.info(f"At end of container: {at_end}")
-                self.logger.info(f"Next site number {current_number + 1} not found. Attempt {attempt + 1}. Scrolling...")
-                self.selenium_helper.scroll_element(container, container.size['height'] // 2, at_end)
+    def select_sites(self, start_number: int = 1, sites: Optional[Iterable[int]] = None) -> List[SiteIndexEntry]:
+        selected = set(sites) if sites is not None else None
+        entries = [entry for number, entry in sorted(self.site_index.items())
+                   if number >= start_number and (selected is None or number in selected)]
+        if selected is not None:
+            not_found = sorted(selected - set(self.site_index))
+            if not_found:
+                self.logger.warning(f"Requested sites not found in the grid: {not_found}")
+        return entries
 
-                if processed_rows_count >= total_records:
-                    self.logger.info(f"Processed {processed_rows_count} rows, which is equal to or exceeds the total records: {total_records}.")
-                    break
+    def scroll_to_site(self, entry: SiteIndexEntry, container_xpath: str, render_pause: float = 0.05,
+                       script_timeout: float = 10) -> Optional[WebElement]:
+        try:
+            # The container is looked up once and reused for every site
+            with self.selenium_helper.script_timeout(script_timeout):
+                row = self.selenium_helper.with_cached(
+                    By.XPATH, container_xpath,
+                    lambda container: self.selenium_helper.driver.execute_async_script(
+                        _JUMP_TO_SITE_JS, container, SITE_ROW_XPATH, SITE_CATEGORY_XPATH,
+                        entry.scroll_offset, entry.category_text, int(render_pause * 1000)
+                    )
+                )
+        except TimeoutException as e:
+            # The container did not appear, or the jump script ran past its timeout
+            self.logger.error(f"Could not scroll to site {entry.site_number}: {str(e)}")
+            return None
+        if row is None:
+            self.logger.warning(f"Site {entry.site_number} ('{entry.category_text}') not rendered at offset {entry.scroll_offset}")
+        return row
 
-                time.sleep(0.5)
+    def process_sites(self, entries: Iterable[SiteIndexEntry], container_xpath: str,
+                      process_site: Callable[[WebElement, SiteIndexEntry], bool],
+                      journal: Optional[JobJournal] = None, retry_failed: bool = False, item_timeout: Optional[float] = None) -> None:
+        """
+        Scrolls to each site and runs process_site on its row, skipping and recording sites through the job journal,
+        in which the caller has registered them (BaseAutomation.open_journal).
+        A site that runs over item_timeout seconds, scrolling included, is failed and the next one started.
+        """
+        for entry in entries:
+            if journal and not journal.should_process(entry.site_number, retry_failed):
+                continue
+            if journal:
+                journal.begin(entry.site_number)
 
+            try:
+                with item_deadline(str(entry.site_number), item_timeout):
+                    row = self.scroll_to_site(entry, container_xpath)
+                    if not row:
+                        self.logger.warning(f"Skipping site number {entry.site_number}: row could not be located.")
+                        if journal:
+                            journal.fail(entry.site_number, "Row could not be located")
+                        continue
+                    processed = process_site(row, entry)
+            except ItemDeadlineExceeded as e:
+                self.logger.error(str(e))
+                if journal:
+                    journal.fail(entry.site_number, str(e))
+                continue
             except Exception as e:
-                self.logger.error(f"Error finding next site: {str(e)}")
-                time.sleep(0.5)
-
-        self.logger.warning("No more sites found. Returning None.")
-        return None, None, None
+                if journal:
+                    journal.fail(entry.site_number, str(e))
+                raise
+            if journal:
+                if processed:
+                    journal.complete(entry.site_number)
+                else:
+                    journal.fail(entry.site_number, "Site could not be processed")
 
     def get_total_records(self) -> int:
         total_records_element = self.selenium_helper.wait_for_element(By.XPATH, "//*[@id='MainWindow']/div/div[1]/div[1]/label/span")
@@ -103,13 +234,13 @@ class SiteProcessor:
         self.logger.error(f"Failed to switch to {tab_name} tab after {max_attempts} attempts.")
         return False
 
-    def process_site_attrs(self, row: WebElement, site_number: int, attributes_to_add: List[str], attributes_to_remove: List[str]) -> None:
+    def process_site_attrs(self, row: WebElement, site_number: int, attributes_to_add: List[str], attributes_to_remove: List[str]) -> bool:
         ActionChains(self.selenium_helper.driver).double_click(row).perform()
         self.logger.info(f"Processing site number {site_number}")
         
         if not self.switch_to_tab("Attributes"):
             self.logger.warning(f"Skipping site number {site_number} due to failure in switching to Attributes tab.")
-            return
+            return False
 
         add_base_xpath = "/html/body/div[15]/div/div/div/div/div[2]/div[2]/div[3]/div/div/div/div/div/div/div[1]/div/div[2]/div/div/div[2]/div"
         remove_base_xpath = "/html/body/div[15]/div/div/div/div/div[2]/div[2]/div[3]/div/div/div/div/div/div/div[2]/div/div[2]/div/div/div[2]/div"
@@ -131,14 +262,15 @@ class SiteProcessor:
             self.logger.warning(f"Modal did not close for site number {site_number}. Attempting to continue...")
 
         time.sleep(0.5)
+        return True
 
-    def process_site_taxes(self, row: WebElement, site_number: int, site_name: str, taxes_to_add: List[str], taxes_to_remove: List[str]) -> None:
+    def process_site_taxes(self, row: WebElement, site_number: int, site_name: str, taxes_to_add: List[str], taxes_to_remove: List[str]) -> bool:
         ActionChains(self.selenium_helper.driver).double_click(row).perform()
         self.logger.info(f"Processing site number {site_number}")
         
         if not self.switch_to_tab("Accounting"):
             self.logger.warning(f"Skipping site number {site_number} due to failure in switching to Accounting tab.")
-            return
+            return False
 
         add_base_xpath = "/html/body/div[15]/div/div/div/div/div[2]/div[2]/div[1]/div/div/div[2]/div/div/div[1]/div/div[2]/div/div/div[2]/div"
         remove_base_xpath = "/html/body/div[15]/div/div/div/div/div[2]/div[2]/div[1]/div/div/div[2]/div/div/div[2]/div[1]/div/div[2]/div/div/div/div[2]/div"
@@ -159,4 +291,5 @@ class SiteProcessor:
         except TimeoutException:
             self.logger.warning(f"Modal did not close for site number {site_number}. Attempting to continue...")
 
-        time.sleep(0.5)
\ No newline at end of file
+        time.sleep(0.5)
+        return True
\ No newline at end of file
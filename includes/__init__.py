@@ -5,8 +5,15 @@ from . import decorators
 from . import logging_config
 from .AttributeManager import AttributeManager
 from .PropertyManager import PropertyManager
-from .SeleniumHelper import SeleniumHelper
+from .SeleniumHelper import SeleniumHelper, FieldSpec
 from .SiteProcessor import SiteProcessor
 from .TaxManager import TaxManager
 from .BaseManager import BaseManager
-from .BaseAutomation import BaseAutomation
\ No newline at end of file
+from .BaseAutomation import BaseAutomation
+from .SessionCache import SessionCache
+from .JobJournal import JobJournal
+from .ReservationStore import ReservationStore
+from .OutputSink import OutputSink, SinkConfig
+from .SearchIndex import SearchIndexBuilder
+from .BookingManifest import BookingManifest
+from .BookingStore import BookingBlobStore, BookingFolder, open_bookings
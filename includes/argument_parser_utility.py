@@ -1,4 +1,6 @@
 import argparse
+from typing import Set
+from includes.constants import JOB_JOURNAL_PATH
 
 class RawTextArgumentDefaultsHelpFormatter(argparse.RawTextHelpFormatter, argparse.ArgumentDefaultsHelpFormatter):
     pass
@@ -12,9 +14,48 @@ def create_base_parser(description: str) -> argparse.ArgumentParser:
     parser.add_argument("username", help="Your Newbook username")
     parser.add_argument("password", help="Your Newbook password", action=PasswordAction)
     parser.add_argument("--debug", action="store_true", help="Runs in debug mode")
+    parser.add_argument("--fresh-login", action="store_true", help="Ignore any cached session and log in (with 2FA) again")
+    parser.add_argument("--journal", default=JOB_JOURNAL_PATH, help="SQLite job journal used to resume interrupted runs")
+    parser.add_argument("--restart", action="store_true", help="Forget this job's journal and process every item again")
+    parser.add_argument("--retry-failed", action="store_true", help="Also process items the journal recorded as failed")
+    parser.add_argument("--item-timeout", type=float, default=None,
+                        help="Seconds one work item (reservation, site, row) may take before it is failed and the run moves on")
+    parser.add_argument("--profile", action="store_true", help="Time every browser call by method and locator and log a report at the end")
     return parser
 
+def parse_site_selection(value: str) -> Set[int]:
+    """Parses a site selection such as "10-50,72" into the set of selected site numbers."""
+    sites = set()
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            if "-" in part:
+                low, high = (int(bound) for bound in part.split("-", 1))
+                if low > high:
+                    raise argparse.ArgumentTypeError(f"Invalid site range: {part}")
+                sites.update(range(low, high + 1))
+            else:
+                sites.add(int(part))
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Invalid site selection: {part}")
+    if not sites:
+        raise argparse.ArgumentTypeError("Site selection is empty")
+    return sites
+
 def add_property_arguments(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
     parser.add_argument("property", help="The property to automate, must match dropdown exactly")
     parser.add_argument("--start", type=int, default=1, help="Starting site number (default: 1)")
-    return parser
\ No newline at end of file
+    parser.add_argument("--sites", type=parse_site_selection, default=None, help="Only process these sites, e.g. 10-50,72")
+    return parser
+
+def add_sink_arguments(parser: argparse.ArgumentParser, default_batch_size: int = 500) -> argparse.ArgumentParser:
+    parser.add_argument("--sink", choices=["csv", "jsonl", "parquet", "sqlite"], default="csv",
+                        help="Output format (parquet needs pyarrow)")
+    parser.add_argument("--compress", choices=["gzip", "zstd"], default=None,
+                        help="Compress csv/jsonl output (zstd needs zstandard; parquet uses it as its codec)")
+    parser.add_argument("--rotate-mb", type=float, default=None, help="Start a new output part once the current one reaches this size")
+    parser.add_argument("--flush-rows", type=int, default=default_batch_size, help="Rows buffered before they are written out")
+    parser.add_argument("--flush-seconds", type=float, default=5.0, help="Longest time rows stay buffered")
+    return parser
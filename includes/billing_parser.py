@@ -0,0 +1,156 @@
+import re
+from html.parser import HTMLParser
+from typing import List, NamedTuple, Optional
+
+BILLING_HEADER_TEXT = "Booking Billing"
+
+class BillingLine(NamedTuple):
+    key: str
+    value: str
+
+class BillingTable(NamedTuple):
+    lines: List[BillingLine]
+    footer: Optional[BillingLine]
+
+    def to_billing_info(self) -> str:
+        """Formats the table the way the dump CSVs store it: 'key:value | key:value | footer_key:footer_value'."""
+        billing_info = [f"{line.key}:{line.value}" for line in self.lines]
+        if self.footer:
+            billing_info.append(f"{self.footer.key}:{self.footer.value}")
+        return " | ".join(billing_info)
+
+TABLE_NOT_FOUND = "Table not found"
+
+def is_failure_info(billing_info: str) -> bool:
+    """Whether a BillingInfo value is a failure placeholder that older dump runs wrote to their output."""
+    return billing_info == TABLE_NOT_FOUND or billing_info.startswith("Error: ")
+
+# Stands in for <br> while a cell's text is collected, so it is not collapsed with source whitespace
+LINE_BREAK = "\ue000"
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+def cell_text(text: str) -> str:
+    """Whitespace-normalized cell text that keeps <br> line breaks, as Selenium's .text does."""
+    return "\n".join(normalize_text(line) for line in text.split(LINE_BREAK)).strip()
+
+class _BillingTableLocator(HTMLParser):
+    """Finds the source span of the <table> whose header contains 'Booking Billing'."""
+    def __init__(self, html: str):
+        super().__init__(convert_charrefs=True)
+        self.html = html
+        self.line_offsets = [0]
+        for match in re.finditer("\n", html):
+            self.line_offsets.append(match.end())
+        self.table_starts: List[int] = []
+        self.in_th = False
+        self.th_text: List[str] = []
+        self.matched_depth: Optional[int] = None
+        self.span: Optional[tuple] = None
+
+    def source_offset(self) -> int:
+        line, column = self.getpos()
+        return self.line_offsets[line - 1] + column
+
+    def handle_starttag(self, tag, attrs):
+        if self.span:
+            return
+        if tag == "table":
+            self.table_starts.append(self.source_offset())
+        elif tag == "th" and self.table_starts:
+            self.in_th = True
+            self.th_text = []
+
+    def handle_data(self, data):
+        if self.in_th:
+            self.th_text.append(data)
+
+    def handle_endtag(self, tag):
+        if self.span:
+            return
+        if tag == "th" and self.in_th:
+            self.in_th = False
+            if self.matched_depth is None and BILLING_HEADER_TEXT in "".join(self.th_text):
+                self.matched_depth = len(self.table_starts)
+        elif tag == "table" and self.table_starts:
+            start = self.table_starts.pop()
+            if self.matched_depth is not None and len(self.table_starts) + 1 == self.matched_depth:
+                end = self.html.find(">", self.source_offset()) + 1
+                self.span = (start, end)
+
+def extract_billing_table_html(page_html: str) -> Optional[str]:
+    """Returns the outerHTML of the Booking Billing table from a full booking page, or None if it is absent."""
+    if BILLING_HEADER_TEXT not in page_html:
+        return None
+    locator = _BillingTableLocator(page_html)
+    locator.feed(page_html)
+    locator.close()
+    if not locator.span:
+        return None
+    start, end = locator.span
+    return page_html[start:end]
+
+class _BillingTableParser(HTMLParser):
+    """Collects the cell texts of the tbody and tfoot rows of a billing table."""
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.section = None
+        self.table_depth = 0
+        self.body_rows: List[List[str]] = []
+        self.footer_rows: List[List[str]] = []
+        self.current_row: Optional[List[str]] = None
+        self.current_cell: Optional[List[str]] = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "table":
+            self.table_depth += 1
+        if self.table_depth != 1:
+            return
+        if tag in ("thead", "tbody", "tfoot"):
+            self.section = tag
+        elif tag == "tr":
+            self.current_row = []
+        elif tag in ("td", "th") and self.current_row is not None:
+            self.current_cell = []
+        elif tag == "br" and self.current_cell is not None:
+            self.current_cell.append(LINE_BREAK)
+
+    def handle_data(self, data):
+        if self.current_cell is not None:
+            self.current_cell.append(data)
+
+    def handle_endtag(self, tag):
+        if tag == "table":
+            self.table_depth -= 1
+            return
+        if self.table_depth != 1:
+            return
+        if tag in ("td", "th") and self.current_cell is not None:
+            if tag == "td":
+                self.current_row.append(cell_text("".join(self.current_cell)))
+            self.current_cell = None
+        elif tag == "tr" and self.current_row is not None:
+            if self.section == "tbody":
+                self.body_rows.append(self.current_row)
+            elif self.section == "tfoot":
+                self.footer_rows.append(self.current_row)
+            self.current_row = None
+        elif tag in ("thead", "tbody", "tfoot"):
+            self.section = None
+
+def parse_billing_table(table_html: str) -> BillingTable:
+    """
+    Parses the Booking Billing table outerHTML.
+
+    Every tbody row with at least three cells becomes a line keyed by its second cell with the
+    third cell as value; the first two cells of the tfoot become the footer line.
+    """
+    parser = _BillingTableParser()
+    parser.feed(table_html)
+    parser.close()
+
+    lines = [BillingLine(cells[1], cells[2]) for cells in parser.body_rows if len(cells) >= 3]
+    footer_cells = [cell for row in parser.footer_rows for cell in row]
+    footer = BillingLine(footer_cells[0], footer_cells[1]) if len(footer_cells) >= 2 else None
+    return BillingTable(lines, footer)
@@ -61,6 +61,7 @@ class RMS_XPaths:
     INCORRECT_ENTRY_ROW = ".//div[contains(@class, 'GridLiteRow') and contains(., 'Incorrect Entry')]"
     VOID_TRANSACTION_BUTTON = ".//a[contains(@class, 'btn-default') and .//span[text()='Void Transaction']]"
     PROCESS_REFUND_BUTTON = ".//a[contains(@class, 'btn-default') and .//span[text()='Process']]"
+    GUEST_BILL_ROWS_CONTAINER = "//div[contains(@class, 'AccountsDataGrid')]//div[contains(@class, 'GridLiteRowsContainer')]"
     GUEST_BILL_LINK = '//*[@id="AcctRows"]/div/div[1]/div[25]/label/a'
     CLOSE_GUEST_BILL_MODAL = '//*[@id="AccountsButtonsRow"]/a[13]'
 
@@ -71,6 +72,15 @@ class NB_XPaths:
 # Timeouts
 DEFAULT_TIMEOUT = 10
 LONG_TIMEOUT = 20
+# Longest a @retry call may spend on attempts and backoff, nested @retry calls included
+RETRY_BUDGET = 2 * DEFAULT_TIMEOUT
+
+# Session cache
+SESSION_CACHE_DIR = ".session_cache"
+SESSION_CACHE_TTL = 8 * 60 * 60
+
+# Job journal
+JOB_JOURNAL_PATH = "job_journal.sqlite3"
 
 # Retry settings
 MAX_RETRIES = 3
@@ -1,46 +1,168 @@
+import contextvars
+import random
+import threading
 import time
 from functools import wraps
-from typing import Any, Callable, Type, Union
+from typing import Any, Callable, Dict, List, Optional, Type, Union
+from selenium.common.exceptions import (
+    InvalidArgumentException, InvalidSelectorException, InvalidSessionIdException, NoSuchWindowException
+)
+from includes.constants import RETRY_BUDGET
+from includes.ItemDeadline import ItemDeadlineExceeded, current_deadline
 from includes.logging_config import get_logger
 
 logger = get_logger(__name__)
 
-def retry(exceptions: Union[Type[Exception], tuple[Type[Exception], ...]], 
-          tries: int = 3, 
-          delay: int = 1, 
-          backoff: int = 2, 
-          logger: Any = None):
+# Errors no amount of retrying fixes: retry() re-raises them at once even when they match its exceptions
+NON_RETRYABLE_EXCEPTIONS = (
+    InvalidSelectorException, InvalidArgumentException, InvalidSessionIdException, NoSuchWindowException, ItemDeadlineExceeded
+)
+
+# Deadline (time.monotonic()) of the outermost @retry call running in this context, None outside of one
+_retry_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("retry_deadline", default=None)
+
+# Exceptions retried by the @retry calls enclosing the current one
+_retried_exceptions: contextvars.ContextVar[tuple] = contextvars.ContextVar("retried_exceptions", default=())
+
+# Called as listener(function name, exception) whenever a @retry function is about to retry
+retry_listeners: List[Callable[[str, Exception], None]] = []
+
+def add_retry_listener(listener: Callable[[str, Exception], None]) -> None:
+    retry_listeners.append(listener)
+
+def remove_retry_listener(listener: Callable[[str, Exception], None]) -> None:
+    if listener in retry_listeners:
+        retry_listeners.remove(listener)
+
+class RetryCounters:
+    """
+    Per-function outcome counts of @retry calls.
+
+    calls: calls that ran their own attempts; retries: attempts after the first; recovered: calls that succeeded
+    after retrying; exhausted: calls that ran out of tries; out_of_budget: calls stopped by the deadline;
+    not_retried: calls that raised an exception classified as not worth retrying
+    """
+    def __init__(self):
+        self.calls = 0
+        self.retries = 0
+        self.recovered = 0
+        self.exhausted = 0
+        self.out_of_budget = 0
+        self.not_retried = 0
+
+_counters: Dict[str, RetryCounters] = {}
+_counters_lock = threading.Lock()
+
+def _count(name: str, **increments: int) -> None:
+    with _counters_lock:
+        counters = _counters.setdefault(name, RetryCounters())
+        for field, increment in increments.items():
+            setattr(counters, field, getattr(counters, field) + increment)
+
+def retry_counters() -> Dict[str, Dict[str, int]]:
+    """Snapshot of the RetryCounters of every @retry function called so far, keyed by qualified name."""
+    with _counters_lock:
+        return {name: dict(vars(counters)) for name, counters in _counters.items()}
+
+def retry_time_left() -> Optional[float]:
+    """Seconds left before the deadline of the @retry call in progress, or None outside of one."""
+    deadline = _retry_deadline.get()
+    return None if deadline is None else max(deadline - time.monotonic(), 0)
+
+def retry(exceptions: Union[Type[Exception], tuple[Type[Exception], ...]],
+          tries: int = 3,
+          delay: int = 1,
+          backoff: int = 2,
+          logger: Any = None,
+          budget: float = RETRY_BUDGET,
+          jitter: float = 0.5,
+          give_up_on: tuple[Type[Exception], ...] = NON_RETRYABLE_EXCEPTIONS):
     """
-    Retry decorator with exponential backoff.
-    
+    Retry decorator with a time budget and jittered exponential backoff.
+
+    The outermost @retry call sets a deadline that every @retry call nested inside it shares. A nested
+    call whose exceptions are all retried by an enclosing call makes a single attempt and leaves
+    retrying to it, so a retried method calling another retried method does not multiply attempts.
+    Otherwise the nested call makes its own tries, as errors only it retries would not be retried at
+    all. No retry starts, and no backoff sleeps, past the deadline, which is also capped by the work
+    item's deadline (see ItemDeadline).
+    SeleniumHelper cuts the waits made during an attempt to retry_time_left(), so attempts end
+    by the deadline as well.
+
     Args:
     exceptions: Exception or tuple of exceptions to catch
     tries: Number of times to try (not retry) before giving up
     delay: Initial delay between retries in seconds
     backoff: Backoff multiplier e.g. value of 2 will double the delay each retry
     logger: Logger to use. If None, print.
+    budget: Seconds the call, retries and sleeps included, may take before giving up
+    jitter: Fraction of each delay that is randomized, so parallel workers do not retry in step
+    give_up_on: Exceptions re-raised at once even if they match exceptions
+
+    Per call, _retry_tries, _retry_delay, _retry_backoff, _retry_budget and _retry_exceptions override
+    the decorator's settings. The older max_attempts and retry_interval keywords are read as
+    _retry_tries and _retry_delay.
     """
     def deco_retry(f):
+        name = f.__qualname__
+
         @wraps(f)
         def f_retry(*args, **kwargs):
             # Extract retry-specific kwargs
-            mtries = kwargs.pop('_retry_tries', tries)
-            mdelay = kwargs.pop('_retry_delay', delay)
+            mtries = kwargs.pop('_retry_tries', kwargs.pop('max_attempts', tries))
+            mdelay = kwargs.pop('_retry_delay', kwargs.pop('retry_interval', delay))
             mbackoff = kwargs.pop('_retry_backoff', backoff)
+            mbudget = kwargs.pop('_retry_budget', budget)
             _exceptions = kwargs.pop('_retry_exceptions', exceptions)
-            
-            while mtries > 1:
-                try:
-                    return f(*args, **kwargs)
-                except _exceptions as e:
-                    msg = f"{str(e)}, Retrying in {mdelay} seconds..."
-                    if logger:
-                        logger.warning(msg)
-                    else:
-                        print(msg)
-                    time.sleep(mdelay)
-                    mtries -= 1
-                    mdelay *= mbackoff
-            return f(*args, **kwargs)
+
+            if not isinstance(_exceptions, tuple):
+                _exceptions = (_exceptions,)
+            retried = _retried_exceptions.get()
+            if all(issubclass(exception, retried) for exception in _exceptions):
+                # Nested in @retry calls that already retry everything this one would
+                return f(*args, **kwargs)
+
+            deadline = _retry_deadline.get()
+            if deadline is None:
+                deadline = time.monotonic() + mbudget
+                item = current_deadline()
+                if item:
+                    deadline = min(deadline, item.deadline)
+            token = _retry_deadline.set(deadline)
+            retried_token = _retried_exceptions.set(retried + _exceptions)
+            _count(name, calls=1)
+            attempt = 1
+            try:
+                while True:
+                    try:
+                        result = f(*args, **kwargs)
+                        if attempt > 1:
+                            _count(name, recovered=1)
+                        return result
+                    except give_up_on:
+                        _count(name, not_retried=1)
+                        raise
+                    except _exceptions as e:
+                        if attempt >= mtries:
+                            _count(name, exhausted=1)
+                            raise
+                        wait = mdelay * (1 - jitter * random.random())
+                        if time.monotonic() + wait >= deadline:
+                            _count(name, out_of_budget=1)
+                            raise
+                        for listener in list(retry_listeners):
+                            listener(f.__name__, e)
+                        msg = f"{str(e)}, Retrying in {wait:.1f} seconds..."
+                        if logger:
+                            logger.warning(msg)
+                        else:
+                            print(msg)
+                        _count(name, retries=1)
+                        time.sleep(wait)
+                        attempt += 1
+                        mdelay *= mbackoff
+            finally:
+                _retried_exceptions.reset(retried_token)
+                _retry_deadline.reset(token)
         return f_retry
-    return deco_retry
\ No newline at end of file
+    return deco_retry
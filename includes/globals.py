@@ -5,22 +5,33 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import Select
 from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException
 import time
+from typing import Optional
 from includes.constants import RMS_LOGIN_URL, RMS_CLIENT_ID, RMS_XPaths, DEFAULT_TIMEOUT, NB_LOGIN_URL, NB_CO_LOGIN_CODE, NB_CR_LOGIN_CODE
 from includes.logging_config import get_logger
+from includes.Pacer import Pacer, page_idle
 
 logger = get_logger(__name__)
 
-def wait_for_dropdown_and_select(driver, option_text, max_attempts=5, wait_time=2):
+HAS_OPTION_JS = """
+var text = arguments[1];
+return Array.prototype.some.call(arguments[0].options, function(option) { return option.text.trim() === text; });
+"""
+
+def wait_for_dropdown_and_select(driver, option_text, max_attempts=5, wait_time=2, pacer: Optional[Pacer] = None, settle_fallback=3):
+    pacer = pacer or Pacer(driver)
+
+    def dropdown_with_option(d):
+        # The select renders before its options are filled in
+        dropdown = d.find_element(By.XPATH, "//select[contains(@class, 'ng-valid')]")
+        return dropdown if d.execute_script(HAS_OPTION_JS, dropdown, option_text) else None
+
     for attempt in range(max_attempts):
         try:
-            time.sleep(1)
-            dropdown = WebDriverWait(driver, DEFAULT_TIMEOUT).until(
-                EC.presence_of_element_located((By.XPATH, "//select[contains(@class, 'ng-valid')]"))
-            )
+            dropdown = pacer.wait("property_dropdown", dropdown_with_option)
             select = Select(dropdown)
             select.select_by_visible_text(option_text)
             logger.info(f"Selected '{option_text}' from dropdown.")
-            time.sleep(3)  # Wait for page to update after selection
+            pacer.settle("select_property", page_idle, fallback=settle_fallback, quiet=0.3)
             return
         except (NoSuchElementException, StaleElementReferenceException) as e:
             if attempt < max_attempts - 1:
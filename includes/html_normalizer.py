@@ -0,0 +1,110 @@
+import re
+from html import escape
+from html.parser import HTMLParser
+from typing import Dict, List, Tuple
+
+KEPT_TAGS = {"table", "thead", "tbody", "tfoot", "tr", "th", "td", "span", "div", "p", "b", "strong", "em", "br"}
+DROPPED_TAGS = {"i", "img", "svg", "script", "style", "input", "colgroup", "col"}
+VOID_TAGS = {"br", "img", "input", "col", "hr", "meta", "link", "wbr"}
+STRUCTURAL_TAGS = {"table", "thead", "tbody", "tfoot", "tr"}
+KEPT_ATTRIBUTES = {"class", "colspan", "rowspan"}
+WHITESPACE = re.compile(r"[ \t\n\r\f]+")
+METADATA_COMMENT = re.compile(r"\s*<!--\s*(URL|Reservation ID):\s*(.*?)\s*-->")
+
+def split_metadata_comments(html: str) -> Tuple[Dict[str, str], str]:
+    """
+    Splits off the '<!-- URL: ... -->' / '<!-- Reservation ID: ... -->' comments older threaded dumps
+    put in front of the table. Returns ({'url': ..., 'reservation_id': ...}, rest of the html).
+    """
+    metadata = {}
+    position = 0
+    match = METADATA_COMMENT.match(html, position)
+    while match:
+        metadata["url" if match.group(1) == "URL" else "reservation_id"] = match.group(2)
+        position = match.end()
+        match = METADATA_COMMENT.match(html, position)
+    return metadata, html[position:].lstrip() if metadata else html
+
+class _BookingHtmlNormalizer(HTMLParser):
+    """Re-emits booking table markup with only the elements, attributes and text the viewer and parsers use."""
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.output: List[str] = []
+        self.open_tags: List[str] = []
+        self.skip_depth = 0
+        # Text since the last emitted tag; dropped and unwrapped tags do not end it, so whitespace
+        # on both sides of them collapses together and a second pass changes nothing
+        self.text: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if self.skip_depth:
+            if tag not in VOID_TAGS:
+                self.skip_depth += 1
+            return
+        if tag in DROPPED_TAGS:
+            if tag not in VOID_TAGS:
+                self.skip_depth = 1
+            return
+        if tag not in KEPT_TAGS:
+            return  # Unwrapped: links, buttons, labels... keep only their content
+
+        attributes = []
+        for name, value in attrs:
+            if name not in KEPT_ATTRIBUTES or value is None:
+                continue
+            value = WHITESPACE.sub(" ", value).strip()
+            if value and not (name in ("colspan", "rowspan") and value == "1"):
+                attributes.append(f' {name}="{escape(value)}"')
+        self.flush_text()
+        self.output.append(f"<{tag}{''.join(attributes)}>")
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and not self.skip_depth and self.open_tags and self.open_tags[-1] == tag:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if self.skip_depth:
+            if tag not in VOID_TAGS:
+                self.skip_depth -= 1
+            return
+        if tag not in KEPT_TAGS or tag in VOID_TAGS or tag not in self.open_tags:
+            return
+        self.flush_text()
+        # Close anything the source left open inside this element, as a browser would
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            self.output.append(f"</{open_tag}>")
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.text.append(data)
+
+    def flush_text(self):
+        text = WHITESPACE.sub(" ", "".join(self.text))
+        self.text = []
+        if not text or (text == " " and (not self.open_tags or self.open_tags[-1] in STRUCTURAL_TAGS)):
+            return
+        self.output.append(escape(text, quote=False))
+
+    def result(self) -> str:
+        """Finishes parsing and returns the normalized markup, closing any elements left open."""
+        self.close()
+        self.flush_text()
+        while self.open_tags:
+            self.output.append(f"</{self.open_tags.pop()}>")
+        return "".join(self.output)
+
+def normalize_booking_html(html: str) -> str:
+    """
+    Minifies a saved booking table: drops icons, scripts and inline styles, unwraps links, keeps only
+    class/colspan/rowspan attributes and collapses whitespace. Cell texts, and so parse_billing_table
+    results, are unchanged.
+    """
+    normalizer = _BookingHtmlNormalizer()
+    normalizer.feed(html)
+    return normalizer.result()
@@ -1,81 +1,261 @@
 import csv
-import os
-from typing import List, Dict
+import random
+import threading
+from typing import List, Dict, Iterator, Optional, Tuple
+from urllib.parse import urlsplit
 from selenium.webdriver.common.by import By
-from selenium.webdriver.remote.webelement import WebElement
 from selenium.common.exceptions import TimeoutException, WebDriverException
 from includes.logging_config import setup_logging
-from includes.constants import DEFAULT_TIMEOUT, NB_RESERVATION_URL
+from includes.constants import DEFAULT_TIMEOUT, NB_RESERVATION_URL, NB_LOGIN_URL
+from includes.billing_parser import TABLE_NOT_FOUND, is_failure_info, parse_billing_table
+from includes.NewbookHttpFetcher import NewbookHttpFetcher, BookingFetchResult, SessionExpiredError
+from includes.AsyncPipeline import AsyncPipeline
+from includes.Pacer import page_idle
+from includes.OutputSink import OutputSink, SinkConfig
+from includes.BookingStore import BookingBlobStore
+from includes import globals
 from includes.BaseAutomation import BaseAutomation
-from includes.argument_parser_utility import create_base_parser
+from includes.argument_parser_utility import create_base_parser, add_sink_arguments
 
 class NewbookResDump(BaseAutomation):
-    def __init__(self, username: str, password: str, data: List[str], start_reservation_id: str = None, debug: bool = False):
+    def __init__(self, username: str, password: str, data: List[str], start_reservation_id: str = None, debug: bool = False,
+                 fetch_mode: str = "selenium", base_url: str = NB_RESERVATION_URL, http_connections: int = 8, shadow_sample: int = 20,
+                 rate_per_host: Optional[float] = None, ordered: bool = True, sink_config: SinkConfig = SinkConfig(),
+                 normalize_html: bool = True):
         super().__init__(username, password, debug)
         self.data = data
         self.start_reservation_id = start_reservation_id
-        self.output_csv = "newbook_co_res_dump.csv"
+        self.output_stem = "newbook_co_res_dump"
+        self.sink_config = sink_config
+        self.sink: Optional[OutputSink] = None
         self.bookings_folder = "bookings"
+        self.booking_store: Optional[BookingBlobStore] = None
+        self.normalize_html = normalize_html
+        self.fetch_mode = fetch_mode
+        self.base_url = base_url
+        self.http_connections = http_connections
+        self.shadow_sample = shadow_sample
+        self.rate_per_host = rate_per_host
+        self.ordered = ordered
+        self.http_fetcher: Optional[NewbookHttpFetcher] = None
+        # Set once the HTTP session can only be renewed by an interactive login, which fetch threads cannot do
+        self.http_login_error: Optional[str] = None
 
     def setup(self):
         super().setup()
-        if not os.path.exists(self.bookings_folder):
-            os.makedirs(self.bookings_folder)
+        self.booking_store = BookingBlobStore(self.bookings_folder, normalize=self.normalize_html)
 
-        if self.start_reservation_id and os.path.exists(self.output_csv):
+        self.sink = self.sink_config.open(self.output_stem, ["ReservationID", "BillingInfo"], key_field="ReservationID")
+        output_path = self.sink.part_path(0)
+        self.open_journal(f"{self.__class__.__name__}:{output_path}", self.data, self.sink.recorded_check(lambda row: not is_failure_info(str(row["BillingInfo"]))))
+        if self.start_reservation_id and self.sink.existing_parts():
             self.logger.info(f"Resuming from reservation ID: {self.start_reservation_id}")
+        elif self.journal.has_progress() and self.sink.existing_parts():
+            self.logger.info(f"Resuming {output_path} from the job journal")
         else:
-            with open(self.output_csv, 'w', newline='') as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow(["ReservationID", "BillingInfo"])
+            self.sink.reset()
 
     def perform_automation(self):
-        self.process_reservations()
+        try:
+            if self.fetch_mode == "http":
+                self.process_reservations_http()
+            elif self.fetch_mode == "async":
+                self.process_reservations_async()
+            else:
+                self.process_reservations()
+        finally:
+            self.sink.close()
+            self.booking_store.close()
 
-    def process_reservations(self):
+    def reservations_to_process(self) -> Iterator[str]:
         start_processing = self.start_reservation_id is None
         for reservation_id in self.data:
             if self.start_reservation_id and reservation_id == self.start_reservation_id:
                 start_processing = True
             
             if start_processing:
-                self.logger.info(f"Processing reservation: {reservation_id}")
-                url = f"{NB_RESERVATION_URL}{reservation_id}"
-                
-                try:
-                    self.selenium_helper.driver.get(url)
-                    self.selenium_helper.wait_for_page_load()
-                    self.handle_locked_session_dialog()
-                    
-                    table = self.find_booking_billing_table()
-                    if table:
-                        billing_info = self.extract_billing_info(table)
-                        self.write_to_csv(reservation_id, billing_info)
-                        self.save_table_html(table, reservation_id)
-                    else:
-                        self.logger.warning(f"Booking billing table not found for reservation: {reservation_id}")
-                        self.write_to_csv(reservation_id, "Table not found")
-                except WebDriverException as e:
-                    self.logger.error(f"WebDriver error for reservation {reservation_id}: {str(e)}")
-                    self.write_to_csv(reservation_id, f"Error: {str(e)}")
-                except Exception as e:
-                    self.logger.error(f"Error processing reservation {reservation_id}: {str(e)}")
-                    self.write_to_csv(reservation_id, f"Error: {str(e)}")
+                if self.should_process(reservation_id):
+                    yield reservation_id
             else:
                 self.logger.info(f"Skipping reservation: {reservation_id}")
 
+    def process_reservations(self):
+        reservation_ids = list(self.reservations_to_process())
+        shadow_ids = set()
+        if self.fetch_mode == "shadow":
+            self.http_fetcher = self.create_http_fetcher()
+            shadow_ids = set(random.Random(0).sample(reservation_ids, min(self.shadow_sample, len(reservation_ids))))
+        shadow_stats = {"compared": 0, "matched": 0}
+
+        try:
+            for reservation_id in reservation_ids:
+                billing_info = self.process_reservation(reservation_id)
+                if reservation_id in shadow_ids:
+                    self.compare_with_http(reservation_id, billing_info, shadow_stats)
+                self.sink.maybe_flush()
+        finally:
+            if self.http_fetcher:
+                self.http_fetcher.close()
+
+        if shadow_ids:
+            self.logger.info(f"Shadow comparison: {shadow_stats['matched']} of {shadow_stats['compared']} sampled bookings matched the HTTP fetcher")
+
+    def process_reservation(self, reservation_id: str) -> str:
+        self.logger.info(f"Processing reservation: {reservation_id}")
+        url = f"{NB_RESERVATION_URL}{reservation_id}"
+        self.journal.begin(reservation_id)
+        
+        try:
+            with self.item_deadline(reservation_id):
+                self.selenium_helper.driver.get(url)
+                self.selenium_helper.wait_for_page_load()
+                self.handle_locked_session_dialog()
+
+                table = self.find_booking_billing_table()
+                table_html = table.get_attribute('outerHTML') if table else None
+            if table_html:
+                billing_info = self.extract_billing_info(table_html)
+                self.write_table_html(table_html, reservation_id)
+                self.record_result(reservation_id, billing_info)
+            else:
+                self.logger.warning(f"Booking billing table not found for reservation: {reservation_id}")
+                billing_info = TABLE_NOT_FOUND
+                self.record_result(reservation_id, billing_info, error=billing_info)
+        except WebDriverException as e:
+            self.logger.error(f"WebDriver error for reservation {reservation_id}: {str(e)}")
+            billing_info = f"Error: {str(e)}"
+            self.record_result(reservation_id, billing_info, error=str(e))
+        except Exception as e:
+            self.logger.error(f"Error processing reservation {reservation_id}: {str(e)}")
+            billing_info = f"Error: {str(e)}"
+            self.record_result(reservation_id, billing_info, error=str(e))
+        return billing_info
+
+    def create_http_fetcher(self) -> NewbookHttpFetcher:
+        user_agent = self.driver.execute_script("return navigator.userAgent;")
+        return NewbookHttpFetcher(self.driver.get_cookies(), user_agent=user_agent, base_url=self.base_url,
+                                  max_connections=self.http_connections, reauthenticate=self.reauthenticate_http_session)
+
+    def reauthenticate_http_session(self) -> List[Dict]:
+        if self.http_login_error:
+            raise SessionExpiredError(self.http_login_error)
+        self.driver.get(NB_RESERVATION_URL)
+        self.selenium_helper.wait_for_page_load()
+        if self.driver.current_url.startswith(NB_LOGIN_URL):
+            if threading.current_thread() is not threading.main_thread():
+                # The 2FA login waits for the operator at the console, which a fetch thread must not do
+                self.http_login_error = ("Newbook needs a new login with 2FA, which cannot be prompted for while fetching. "
+                                         "Run the script again to log in; --retry-failed picks up the bookings this run could not fetch.")
+                self.logger.error(self.http_login_error)
+                raise SessionExpiredError(self.http_login_error)
+            globals.NB_login_with_2fa_and_wait(self.driver, self.username, self.password)
+        else:
+            self.handle_locked_session_dialog()
+        return self.driver.get_cookies()
+
+    def process_reservations_http(self):
+        self.http_fetcher = self.create_http_fetcher()
+        try:
+            for result in self.http_fetcher.fetch_many(self.reservations_to_process(), on_start=self.journal.begin):
+                self.record_http_result(result)
+                self.sink.maybe_flush()
+        finally:
+            self.http_fetcher.close()
+
+    def record_http_result(self, result: BookingFetchResult) -> str:
+        reservation_id = result.reservation_id
+        if result.error:
+            self.logger.error(f"Error fetching reservation {reservation_id}: {result.error}")
+            billing_info = f"Error: {result.error}"
+            self.record_result(reservation_id, billing_info, error=result.error)
+        elif result.table_html is None:
+            self.logger.warning(f"Booking billing table not found for reservation: {reservation_id}")
+            billing_info = TABLE_NOT_FOUND
+            self.record_result(reservation_id, billing_info, error=billing_info)
+        else:
+            billing_info = self.extract_billing_info(result.table_html)
+            self.write_table_html(result.table_html, reservation_id)
+            self.record_result(reservation_id, billing_info)
+        return billing_info
+
+    def process_reservations_async(self):
+        self.http_fetcher = self.create_http_fetcher()
+        host = urlsplit(self.base_url).netloc
+        pipeline = AsyncPipeline(
+            fetch=self.fetch_booking_journaled,
+            parse=self.parse_fetched_booking,
+            sink=self.record_pipeline_result,
+            concurrency=self.http_connections,
+            rate_per_host=self.rate_per_host,
+            host_of=lambda reservation_id: host,
+            ordered=self.ordered,
+        )
+        try:
+            pipeline.run(self.reservations_to_process())
+        finally:
+            self.http_fetcher.close()
+
+    def fetch_booking_journaled(self, reservation_id: str) -> BookingFetchResult:
+        self.journal.begin(reservation_id)
+        return self.http_fetcher.fetch_booking(reservation_id)
+
+    def parse_fetched_booking(self, reservation_id: str, result: BookingFetchResult) -> Tuple[Optional[str], str]:
+        if result.table_html is None:
+            return None, TABLE_NOT_FOUND
+        return result.table_html, self.extract_billing_info(result.table_html)
+
+    def record_pipeline_result(self, reservation_id: str, parsed: Optional[Tuple[Optional[str], str]], error: Optional[str]):
+        if error is not None:
+            self.logger.error(f"Error fetching reservation {reservation_id}: {error}")
+            self.record_result(reservation_id, f"Error: {error}", error=error)
+        else:
+            table_html, billing_info = parsed
+            if table_html is None:
+                self.logger.warning(f"Booking billing table not found for reservation: {reservation_id}")
+                self.record_result(reservation_id, billing_info, error=billing_info)
+            else:
+                self.write_table_html(table_html, reservation_id)
+                self.record_result(reservation_id, billing_info)
+        self.sink.maybe_flush()
+
+    def compare_with_http(self, reservation_id: str, billing_info: str, shadow_stats: Dict[str, int]):
+        try:
+            result = self.http_fetcher.fetch_booking(reservation_id)
+            http_info = self.extract_billing_info(result.table_html) if result.table_html else TABLE_NOT_FOUND
+        except Exception as e:
+            http_info = f"Error: {str(e)}"
+
+        shadow_stats["compared"] += 1
+        if http_info == billing_info:
+            shadow_stats["matched"] += 1
+        else:
+            self.logger.warning(f"Shadow mismatch for reservation {reservation_id}:\n  selenium: {billing_info}\n  http:     {http_info}")
+
     def handle_locked_session_dialog(self):
+        dialogs = self.selenium_helper.dialogs
+        # The dialog can be added by the page's own requests after the document has loaded, so wait for those
+        # to finish (or the dialog to show), within a budget learned from earlier bookings
+        self.selenium_helper.pacer.settle(
+            "locked_session_check",
+            lambda driver: dialogs.showing("newbook_locked_session") or page_idle(driver),
+            fallback=1
+        )
+        shown = dialogs.shown_since_last_check("newbook_locked_session")
+        if not dialogs.showing("newbook_locked_session"):
+            if shown:
+                self.logger.info("Locked session dialog closed before it could be handled.")
+            return
+        self.logger.info("Locked session dialog detected. Handling...")
+        step = "entering the password"
         try:
-            dialog = self.selenium_helper.wait_for_element(By.ID, "locked_session_dialog", timeout=1, _retry_tries=1, _retry_delay=0)
-            if dialog:
-                self.logger.info("Locked session dialog detected. Handling...")
-                self.selenium_helper.wait_for_element(By.ID, "password").send_keys(self.password)
-                self.selenium_helper.wait_and_click(By.CLASS_NAME, "confirm_button")
-                self.selenium_helper.wait_for_invisibility(By.ID, "locked_session_dialog")
-                self.logger.info("Locked session dialog handled successfully.")
+            self.selenium_helper.wait_for_element(By.ID, "password").send_keys(self.password)
+            step = "clicking the confirm button"
+            self.selenium_helper.wait_and_click(By.CLASS_NAME, "confirm_button")
+            step = "waiting for the dialog to close"
+            self.selenium_helper.wait_for_invisibility(By.ID, "locked_session_dialog")
+            self.logger.info("Locked session dialog handled successfully.")
         except TimeoutException:
-            # Dialog not found, no action needed
-            pass
+            self.logger.warning(f"Locked session dialog: timed out {step}.")
 
     def find_booking_billing_table(self):
         try:
@@ -88,34 +268,20 @@ class NewbookResDump(BaseAutomation):
             self.logger.error(f"Error finding booking billing table: {str(e)}")
             return None
 
-    def extract_billing_info(self, table: WebElement):
-        rows = table.find_elements(By.XPATH, ".//tbody/tr")
-        footer = table.find_elements(By.XPATH, ".//tfoot/tr/td")
-
-        billing_info = []
-        for row in rows:
-            cells = row.find_elements(By.TAG_NAME, "td")
-            if len(cells) >= 3:
-                key = cells[1].text.strip()
-                value = cells[2].text.strip()
-                billing_info.append(f"{key}:{value}")
-
-        if len(footer) >= 2:
-            billing_info.append(f"{footer[0].text.strip()}:{footer[1].text.strip()}")
-
-        return " | ".join(billing_info)
+    def extract_billing_info(self, table_html: str) -> str:
+        return parse_billing_table(table_html).to_billing_info()
 
-    def save_table_html(self, table, reservation_id):
-        html_content = table.get_attribute('outerHTML')
-        file_path = os.path.join(self.bookings_folder, f"{reservation_id}.html")
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(html_content)
+    def write_table_html(self, html_content: str, reservation_id: str):
+        self.booking_store.put(reservation_id, html_content, url=f"{self.base_url}{reservation_id}")
         self.logger.info(f"Saved HTML for reservation {reservation_id}")
 
-    def write_to_csv(self, reservation_id, billing_info):
-        with open(self.output_csv, 'a', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow([reservation_id, billing_info])
+    def record_result(self, reservation_id: str, billing_info: str, error: Optional[str] = None):
+        if error is not None:
+            # Failures only go to the journal, so retrying them later does not leave a second row for the reservation
+            self.journal.fail(reservation_id, error)
+            return
+        # Results only count as done once the sink has written them, so rows lost in a crash are redone
+        self.sink.write([reservation_id, billing_info], lambda: self.journal.complete(reservation_id))
 
 def load_reservation_ids(file_path: str) -> List[str]:
     with open(file_path, 'r') as f:
@@ -126,12 +292,29 @@ def main():
     parser = create_base_parser("Newbook Reservation Dump Automation Script")
     parser.add_argument("csv_file", help="Path to the CSV file containing reservation IDs")
     parser.add_argument("--start", help="Reservation ID to start processing from")
+    parser.add_argument("--fetch-mode", choices=["selenium", "http", "async", "shadow"], default="selenium",
+                        help="selenium: render every booking in Chrome\n"
+                             "http: log in with Chrome once, then fetch booking pages over HTTP\n"
+                             "async: like http, through an asyncio pipeline with rate limiting and retries\n"
+                             "shadow: selenium, and compare a sample of bookings against the HTTP fetcher")
+    parser.add_argument("--base-url", default=NB_RESERVATION_URL, help="Booking page URL prefix for the HTTP fetcher")
+    parser.add_argument("--connections", type=int, default=8, help="Concurrent HTTP connections for --fetch-mode http/async")
+    parser.add_argument("--rate", type=float, default=None, help="Maximum booking requests per second per host for --fetch-mode async")
+    parser.add_argument("--unordered", action="store_true", help="Write --fetch-mode async results as they finish instead of in input order")
+    parser.add_argument("--shadow-sample", type=int, default=20, help="Number of bookings compared in --fetch-mode shadow")
+    parser.add_argument("--raw-html", action="store_true", help="Save booking tables as fetched instead of normalized")
+    add_sink_arguments(parser)
     args = parser.parse_args()
 
     setup_logging("newbook_res_dump")
 
     reservation_ids = load_reservation_ids(args.csv_file)
-    automation = NewbookResDump(args.username, args.password, reservation_ids, args.start, args.debug)
+    automation = NewbookResDump(args.username, args.password, reservation_ids, args.start, args.debug,
+                                fetch_mode=args.fetch_mode, base_url=args.base_url,
+                                http_connections=args.connections, shadow_sample=args.shadow_sample,
+                                rate_per_host=args.rate, ordered=not args.unordered,
+                                sink_config=SinkConfig.from_args(args), normalize_html=not args.raw_html)
+    automation.apply_common_args(args)
     automation.run(isNewbook=True)
 
 if __name__ == "__main__":
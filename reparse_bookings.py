@@ -0,0 +1,82 @@
+import argparse
+import csv
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+from includes.billing_parser import is_failure_info, parse_billing_table
+from includes.BookingStore import open_bookings
+
+def reparse_bookings(bookings_folder: str, output_file: str, output_format: str = "csv") -> int:
+    """Rebuilds the dump output from saved bookings without a browser."""
+    bookings = open_bookings(bookings_folder)
+    count = 0
+
+    with open(output_file, 'w', newline='', encoding='utf-8') as f, ThreadPoolExecutor(max_workers=8) as executor:
+        writer = csv.writer(f) if output_format == "csv" else None
+        if writer:
+            writer.writerow(["ReservationID", "BillingInfo"])
+
+        for reservation_id, html in bookings.read_many(bookings.reservation_ids(), executor):
+            table = parse_billing_table(html)
+            count += 1
+
+            if writer:
+                writer.writerow([reservation_id, table.to_billing_info()])
+            else:
+                record = {
+                    "reservation_id": reservation_id,
+                    "lines": [line._asdict() for line in table.lines],
+                    "footer": table.footer._asdict() if table.footer else None,
+                }
+                f.write(json.dumps(record) + "\n")
+
+    bookings.close()
+    return count
+
+def compare_with_dump(bookings_folder: str, dump_file: str) -> Tuple[int, List[Tuple[str, str, str]]]:
+    """
+    Regression check of the parser: re-parses the saved bookings listed in a dump CSV written by
+    the browser scripts and compares their BillingInfo. Returns the number compared and the
+    mismatches as (reservation id, dump value, re-parsed value).
+    """
+    with open(dump_file, 'r', newline='', encoding='utf-8') as f:
+        expected = {row["ReservationID"]: row["BillingInfo"] for row in csv.DictReader(f)
+                    if not is_failure_info(row["BillingInfo"])}
+
+    bookings = open_bookings(bookings_folder)
+    compared = 0
+    mismatches = []
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        ids = [reservation_id for reservation_id in bookings.reservation_ids() if reservation_id in expected]
+        for reservation_id, html in bookings.read_many(ids, executor):
+            compared += 1
+            billing_info = parse_billing_table(html).to_billing_info()
+            if billing_info != expected[reservation_id]:
+                mismatches.append((reservation_id, expected[reservation_id], billing_info))
+    bookings.close()
+    return compared, mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-parse saved Newbook booking billing tables into a dump file")
+    parser.add_argument("--bookings", default="bookings", help="Saved bookings: a booking store or a legacy folder of <reservation id>.html files")
+    parser.add_argument("--output", default="newbook_res_reparsed.csv", help="Output file")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default="csv",
+                        help="csv: same ReservationID,BillingInfo rows as the dump scripts\n"
+                             "jsonl: one structured record per booking with its lines and footer")
+    parser.add_argument("--compare", metavar="DUMP_CSV",
+                        help="Instead of writing output, check that re-parsing gives the BillingInfo of an existing dump CSV")
+    args = parser.parse_args()
+
+    if args.compare:
+        compared, mismatches = compare_with_dump(args.bookings, args.compare)
+        for reservation_id, dumped, reparsed in mismatches[:20]:
+            print(f"{reservation_id}:\n  dump:     {dumped!r}\n  reparsed: {reparsed!r}")
+        print(f"Compared {compared} bookings: {len(mismatches)} mismatches")
+        sys.exit(1 if mismatches else 0)
+
+    count = reparse_bookings(args.bookings, args.output, args.format)
+    print(f"Re-parsed {count} bookings into {args.output}")
+
+if __name__ == "__main__":
+    main()
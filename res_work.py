@@ -1,17 +1,57 @@
+import copy
 import csv
+import glob
+import heapq
 import os
+import queue
 import re
+import threading
 import time
 from typing import List, Dict, Tuple, Optional
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, StaleElementReferenceException
 from selenium.webdriver.remote.webelement import WebElement
-from includes.SeleniumHelper import SeleniumHelper
+from selenium.webdriver.support import expected_conditions as EC
+from includes.SeleniumHelper import SeleniumHelper, FieldSpec, GridRow
 from includes.logging_config import setup_logging
 from includes.constants import DEFAULT_TIMEOUT, RMS_XPaths
-from includes.BaseAutomation import BaseAutomation
-from includes.argument_parser_utility import create_base_parser
+from includes.BaseAutomation import BaseAutomation, NO_ERROR_MODAL
+from includes.ReservationStore import ReservationStore
+from includes.ItemDeadline import ItemDeadlineExceeded, sleep_within_deadline
+from includes.OutputSink import OutputSink, SinkConfig
+from includes.argument_parser_utility import create_base_parser, add_sink_arguments
+
+# Where a reservation search landed: 'results' for the search results screen, 'reservation' once the
+# searched reservation itself is open, null while the page is still on its way
+_SEARCH_OUTCOME_JS = """
+var screen = document.getElementsByClassName('ReservationSearchScreen')[0];
+if (screen) {
+    var rect = screen.getBoundingClientRect();
+    if (rect.width > 0 && rect.height > 0 && rect.width != 100 && rect.height != 100) {
+        return 'results';
+    }
+}
+var input = document.evaluate("//*[@id='GridRow-Res_Id']/input", document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+return input && input.value == arguments[0] ? 'reservation' : null;
+"""
+
+SEARCH_RESULTS_CONTAINER = '//*[@id="MainWindow"]/div/div/div[2]/div[2]/div/div[2]/div/div/div[2]/div'
+
+# Journal reason for reservations whose data may be incomplete because RMS showed a server error
+SERVER_ERROR = "RMS server error"
+
+# Reservation screen fields read by ResWork.extract_reservation_data in a single round trip
+RESERVATION_FIELDS = {
+    "ArriveDate": FieldSpec(By.XPATH, '//*[@id="GridRow-Arrive"]/label', "text"),
+    "DepartDate": FieldSpec(By.XPATH, "//*[@id='GridRow-Depart']/label", "text"),
+    "ResStatus": FieldSpec(By.XPATH, "//*[@id='GridRow-Status']/input", "value"),
+    "LegacyResId": FieldSpec(By.XPATH, "//*[@id='GridRow-Spare10']/input", "value"),
+    "BaseRate": FieldSpec(By.XPATH, "//*[@id='GridRow-BaseTariff']/input", "value"),
+    "TotalRate": FieldSpec(By.XPATH, "//*[@id='GridRow-TotalTariff']/input", "value"),
+    "GuestBill": FieldSpec(By.XPATH, "//*[@id='GridRow-Acc_General']/input", "value"),
+    "ResNote": FieldSpec(By.ID, "ResNote", "value"),
+}
 
 class GuestBillManager:
     def __init__(self, selenium_helper: SeleniumHelper):
@@ -96,33 +136,38 @@ class GuestBillManager:
     def is_matching_fee(self, description: str, fee_to_remove: str) -> bool:
         return fee_to_remove.lower() in description.lower()
 
-    def get_grid_rows(self):
-        accounts_data_grid = self.selenium_helper.wait_for_element(By.CLASS_NAME, "AccountsDataGrid")
-        line_items = accounts_data_grid.find_element(By.XPATH, './/div[contains(@class, "GridLiteRowsContainer")]')
-        return line_items.find_elements(By.XPATH, './/div[contains(@class, "GridLiteRow")]')
+    def get_grid_rows(self, columns: Optional[List[int]] = None, timeout: float = DEFAULT_TIMEOUT) -> List[GridRow]:
+        return self.selenium_helper.snapshot_grid((By.XPATH, RMS_XPaths.GUEST_BILL_ROWS_CONTAINER), columns=columns, timeout=timeout)
     
+    def wait_for_grid_change(self, action: str, rows: List[GridRow], columns: List[int], fallback: float = 3):
+        """Waits for the guest bill grid to show a correction: rows added, removed or changed."""
+        before = [row.cells for row in rows]
+        self.selenium_helper.pacer.settle(
+            action,
+            lambda driver: [row.cells for row in self.get_grid_rows(columns=columns, timeout=0)] != before,
+            fallback=fallback, quiet=0.2
+        )
+
     def remove_smallest_journal(self):
-        rows = self.get_grid_rows()
+        rows = self.get_grid_rows(columns=[2, 4])
         journal_count = 0
-        smallest_journal: Optional[Tuple[WebElement, float, int]] = None
+        smallest_journal: Optional[Tuple[GridRow, float, int]] = None
 
         for row in rows:
             try:
-                columns = row.find_elements(By.XPATH, './/div[contains(@class, "GridLiteColumn")]')
-                if len(columns) >= 5:
-                    description = columns[2].text.strip()
-                    if "Journal Receipt" in description:
-                        journal_count += 1
-                        amount = float(columns[4].text.strip().replace('$', '').replace(',', ''))
-                        receipt_number = self.extract_receipt_number(description)
-                        if receipt_number and (smallest_journal is None or amount < smallest_journal[1]):
-                            smallest_journal = (row, amount, receipt_number)
+                description = row.cells[0].strip()
+                if "Journal Receipt" in description:
+                    journal_count += 1
+                    amount = float(row.cells[1].strip().replace('$', '').replace(',', ''))
+                    receipt_number = self.extract_receipt_number(description)
+                    if receipt_number and (smallest_journal is None or amount < smallest_journal[1]):
+                        smallest_journal = (row, amount, receipt_number)
             except Exception as e:
                 self.logger.error(f"Error processing a row: {str(e)}")
 
         if journal_count > 1 and smallest_journal:
-            self.refund_fee(smallest_journal[0], smallest_journal[2])
-            time.sleep(3)
+            self.refund_fee(self.selenium_helper.get_row_element(smallest_journal[0]), smallest_journal[2])
+            self.wait_for_grid_change("refund_journal", rows, [2, 4])
             self.logger.info(f'Finished refunding small journal with amount: ${smallest_journal[1]:.2f} and receipt number: {smallest_journal[2]}')
         else:
             self.logger.info('Finished processing, no small journal found or only one journal entry present')
@@ -136,23 +181,21 @@ class GuestBillManager:
     def remove_fees(self, fees_to_remove: List[str]):
         fees_removed = 0
         while fees_removed < len(fees_to_remove):
-            rows = self.get_grid_rows()
+            rows = self.get_grid_rows(columns=[2])
             fee_found = False
 
             for row in rows:
                 try:
-                    columns = row.find_elements(By.XPATH, './/div[contains(@class, "GridLiteColumn")]')
-                    if len(columns) >= 3:
-                        description = columns[2].text.strip()
-                        
-                        for fee in fees_to_remove:
-                            if self.is_matching_fee(description, fee):
-                                self.logger.info(f"Attempting to void fee: {description} (matched with '{fee}')")
-                                self.void_fee(row)
-                                time.sleep(3)
-                                fees_removed += 1
-                                fee_found = True
-                                break
+                    description = row.cells[0].strip()
+                    
+                    for fee in fees_to_remove:
+                        if self.is_matching_fee(description, fee):
+                            self.logger.info(f"Attempting to void fee: {description} (matched with '{fee}')")
+                            self.void_fee(self.selenium_helper.get_row_element(row))
+                            self.wait_for_grid_change("void_fee", rows, [2])
+                            fees_removed += 1
+                            fee_found = True
+                            break
 
                     if fee_found:
                         break
@@ -168,7 +211,7 @@ class GuestBillManager:
 class ResWork(BaseAutomation):
     def __init__(self, username: str, password: str, csv_file_path: str, start_reservation_id: str = None, 
                  has_headers: bool = False, update_mode: bool = False, remove_fees: bool = False, remove_journal: bool = False, 
-                 debug: bool = False):
+                 debug: bool = False, workers: int = 1, export_only: bool = False, sink_config: SinkConfig = SinkConfig()):
         super().__init__(username, password, debug)
         self.csv_file_path = csv_file_path
         self.start_reservation_id = start_reservation_id
@@ -177,19 +220,50 @@ class ResWork(BaseAutomation):
         self.remove_fees = remove_fees
         self.remove_journal = remove_journal
         self.csv_filename = "missing_reservation_data.csv"
+        self.output_stem = os.path.splitext(self.csv_filename)[0]
+        self.sink_config = sink_config
         self.csv_headers = ["ReservationId", "ResStatus", "ArriveDate", "DepartDate", "LegacyResId", "BaseRate", "TotalRate", "GuestBill", "ResNote", "ItemizedBill"]
-        self.temp_filename = "temp_reservation_data.csv"
+        self.store_path = f"{self.output_stem}.sqlite3"
+        self.store: Optional[ReservationStore] = None
         self.guest_bill_manager = None
+        self.workers = workers
+        self.export_only = export_only
+        self.shard_index_field = "InputIndex"
 
     def setup(self):
         super().setup()
         self.guest_bill_manager = GuestBillManager(self.selenium_helper)
 
     def perform_automation(self):
-        if self.update_mode:
-            self.update_missing_data(self.csv_file_path, self.start_reservation_id)
-        else:
-            self.process_reservations(self.csv_file_path, self.start_reservation_id, self.has_headers)
+        self.open_store()
+        try:
+            if self.update_mode:
+                self.update_missing_data(self.csv_file_path, self.start_reservation_id)
+            else:
+                self.process_reservations(self.csv_file_path, self.start_reservation_id, self.has_headers)
+        finally:
+            self.store.close()
+
+    def open_store(self):
+        """Opens the reservation store, seeding it from the output CSV the first time."""
+        self.store = ReservationStore(self.store_path, self.csv_headers)
+        if len(self.store) == 0 and os.path.isfile(self.csv_filename):
+            imported = self.store.import_csv(self.csv_filename)
+            self.logger.info(f"Imported {imported} rows from {self.csv_filename} into {self.store_path}")
+
+    def export_csv(self):
+        exported = self.store.export_csv(self.csv_filename)
+        self.logger.info(f"Exported {exported} reservations from {self.store_path} to {self.csv_filename}")
+
+    def run(self, isNewbook: bool = False):
+        if not self.export_only:
+            super().run(isNewbook)
+            return
+        self.open_store()
+        try:
+            self.export_csv()
+        finally:
+            self.store.close()
 
     def process_reservations(self, csv_file_path, start_reservation_id=None, has_headers=False):
         with open(csv_file_path, 'r') as csv_file:
@@ -199,74 +273,183 @@ class ResWork(BaseAutomation):
                 next(csv_reader)  # Skip the header row
             
             reservation_ids = list(csv_reader)
-            total_rows = len(reservation_ids)
 
-            start_processing = start_reservation_id is None
-            processed_count = 0
+        with self.sink_config.open(self.output_stem, self.csv_headers, "ReservationId") as output_sink:
+            # Rows finished by workers of an interrupted run are still in their shards
+            self.merge_shards(self.existing_shard_stems(), output_sink)
+            self.open_journal(f"{self.__class__.__name__}:{output_sink.part_path(0)}", (row[0] for row in reservation_ids),
+                              output_sink.recorded_check())
 
-            with open(self.csv_filename, 'a', newline='') as output_file:
-                writer = csv.DictWriter(output_file, fieldnames=self.csv_headers)
-                
-                if not os.path.isfile(self.csv_filename) or os.path.getsize(self.csv_filename) == 0:
-                    writer.writeheader()
+            if self.workers > 1:
+                self.process_reservations_parallel([row[0] for row in reservation_ids if self.should_process(row[0])],
+                                                   output_sink, start_reservation_id)
+            else:
+                self.process_reservations_sequential(reservation_ids, output_sink, start_reservation_id)
 
-                for index, row in enumerate(reservation_ids, start=1):
-                    reservation_id = row[0]  # Assuming reservation ID is in the first column
-                    
-                    if reservation_id == start_reservation_id:
-                        start_processing = True
-
-                    if start_processing:
-                        processed_count += 1
-                        print(f"Processing reservation {processed_count} of {total_rows}: {reservation_id}")
-                        try:
-                            self.process_single_reservation(reservation_id, writer)
-                        except Exception as e:
-                            print(f"Error processing reservation {reservation_id}: {str(e)}")
-                            print(f"Last successfully processed reservation: {reservation_id}")
-                            return  # Stop processing and exit
-
-    def identify_missing_data(self, input_csv_path: str) -> Dict[str, List[str]]:
-        input_reservations = set()
+    def process_reservations_sequential(self, reservation_ids: List[List[str]], output_sink: OutputSink, start_reservation_id: str = None):
+        start_processing = start_reservation_id is None
+        processed_count = 0
+        total_rows = len(reservation_ids)
+
+        for index, row in enumerate(reservation_ids, start=1):
+            reservation_id = row[0]  # Assuming reservation ID is in the first column
+            output_sink.maybe_flush()
+            
+            if reservation_id == start_reservation_id:
+                start_processing = True
+
+            if start_processing and self.should_process(reservation_id):
+                processed_count += 1
+                print(f"Processing reservation {processed_count} of {total_rows}: {reservation_id}")
+                self.circuit_breaker.acquire()
+                self.journal.begin(reservation_id)
+                try:
+                    with self.item_deadline(reservation_id):
+                        reservation_data = self.process_single_reservation(reservation_id)
+                    if self.check_and_dismiss_error_modal() != NO_ERROR_MODAL:
+                        self.journal.fail(reservation_id, SERVER_ERROR)
+                        continue
+                    self.circuit_breaker.record_success()
+                    self.write_outcome(output_sink, reservation_id, reservation_data)
+                except ItemDeadlineExceeded as e:
+                    # A stuck reservation is failed and skipped rather than stopping the run
+                    self.logger.error(str(e))
+                    self.journal.fail(reservation_id, str(e))
+                except Exception as e:
+                    self.journal.fail(reservation_id, str(e))
+                    print(f"Error processing reservation {reservation_id}: {str(e)}")
+                    print(f"Last successfully processed reservation: {reservation_id}")
+                    return  # Stop processing and exit
+
+    def process_reservations_parallel(self, reservation_ids: List[str], output_sink: OutputSink, start_reservation_id: str = None):
+        if start_reservation_id in reservation_ids:
+            reservation_ids = reservation_ids[reservation_ids.index(start_reservation_id):]
+
+        work_queue = queue.Queue()
+        for index, reservation_id in enumerate(reservation_ids):
+            work_queue.put((index, reservation_id))
+
+        session_state = self.selenium_helper.get_session_state()
+        shard_stems = self.shard_stems()
+        failures: List[str] = []
+
+        threads = [
+            threading.Thread(target=self.run_worker, name=f"ResWorkWorker-{number}",
+                             args=(number, shard_stems[number], session_state, work_queue, len(reservation_ids), failures))
+            for number in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.merge_shards(shard_stems, output_sink)
+        if failures:
+            self.logger.error(f"{len(failures)} reservations failed: {', '.join(failures)}")
+
+    def run_worker(self, number: int, shard_stem: str, session_state: Dict, work_queue: queue.Queue,
+                   total_rows: int, failures: List[str]):
+        driver = None
+        try:
+            driver = self.create_worker_driver(session_state)
+            # Each worker gets a shallow copy of the automation bound to its own browser
+            worker = copy.copy(self)
+            worker.driver = driver
+            worker.selenium_helper = self.create_selenium_helper(driver)
+            worker.guest_bill_manager = GuestBillManager(worker.selenium_helper)
+            self.logger.info(f"Worker {number} started")
+
+            with self.open_shard(shard_stem) as shard_sink:
+                shard_sink.reset()
+                while True:
+                    shard_sink.maybe_flush()
+                    try:
+                        index, reservation_id = work_queue.get_nowait()
+                    except queue.Empty:
+                        break
+
+                    print(f"Worker {number}: processing reservation {index + 1} of {total_rows}: {reservation_id}")
+                    self.circuit_breaker.acquire()
+                    self.journal.begin(reservation_id)
+                    try:
+                        with self.item_deadline(reservation_id):
+                            reservation_data = worker.process_single_reservation(reservation_id)
+                        if worker.check_and_dismiss_error_modal() != NO_ERROR_MODAL:
+                            self.journal.fail(reservation_id, SERVER_ERROR)
+                            failures.append(reservation_id)
+                            continue
+                        self.circuit_breaker.record_success()
+                        self.write_outcome(shard_sink, reservation_id, reservation_data, {self.shard_index_field: index})
+                    except Exception as e:
+                        self.logger.error(f"Worker {number}: error processing reservation {reservation_id}: {str(e)}")
+                        self.journal.fail(reservation_id, str(e))
+                        failures.append(reservation_id)
+        except Exception as e:
+            self.logger.error(f"Worker {number} stopped: {str(e)}")
+        finally:
+            if driver:
+                driver.quit()
+            self.logger.info(f"Worker {number} finished")
+
+    def shard_stems(self) -> List[str]:
+        return [f"{self.output_stem}.worker{number}" for number in range(self.workers)]
+
+    def existing_shard_stems(self) -> List[str]:
+        """Shards left on disk by the workers of an earlier run, whatever their number of parts."""
+        pattern = re.compile(re.escape(self.output_stem) + r"\.worker(\d+)\.")
+        matches = (pattern.match(path) for path in glob.glob(glob.escape(self.output_stem) + ".worker*"))
+        return [f"{self.output_stem}.worker{number}" for number in sorted({int(match.group(1)) for match in matches if match})]
+
+    def open_shard(self, shard_stem: str) -> OutputSink:
+        return self.sink_config.open(shard_stem, [self.shard_index_field] + self.csv_headers, "ReservationId")
+
+    def write_outcome(self, sink: OutputSink, reservation_id: str, reservation_data: Dict[str, str], extra_fields: Optional[Dict] = None):
+        if not reservation_data.get("ReservationId"):
+            self.record_outcome(reservation_id, reservation_data)
+            return
+        # Stored and journaled once the buffered row has reached the output file
+        sink.write({**(extra_fields or {}), **reservation_data}, lambda: self.record_outcome(reservation_id, reservation_data))
+
+    def record_outcome(self, reservation_id: str, reservation_data: Dict[str, str]):
+        if reservation_data.get("ReservationId"):
+            self.store.upsert(reservation_data)
+            self.journal.complete(reservation_id)
+        else:
+            self.journal.fail(reservation_id, "Reservation could not be loaded")
+
+    def merge_shards(self, shard_stems: List[str], output_sink: OutputSink):
+        """Appends worker shards to the output in input order. Each shard is already sorted by input index."""
+        shards = [shard for shard in (self.open_shard(stem) for stem in shard_stems) if shard.existing_parts()]
+        if not shards:
+            return
+        merged = heapq.merge(*(shard.read_rows() for shard in shards), key=lambda row: int(row[self.shard_index_field]))
+        merged_count = 0
+        for row in merged:
+            output_sink.write({field: row.get(field) for field in self.csv_headers})
+            merged_count += 1
+        # Closing the part completes it on disk (compressed streams included) before the shards are removed
+        # and the journal reads the output back; the next write reopens it for appending
+        output_sink.close()
+        for shard in shards:
+            shard.reset()
+        self.logger.info(f"Merged {merged_count} rows from {len(shards)} worker shards into {output_sink.path}")
+
+    def identify_missing_data(self, input_csv_path: str) -> List[Tuple[str, Optional[Dict[str, str]]]]:
         print(f"Reading input reservations from: {input_csv_path}")
         with open(input_csv_path, 'r') as input_file:
             input_reader = csv.reader(input_file)
             next(input_reader)  # Skip header
-            for row in input_reader:
-                input_reservations.add(row[0])  # Assuming reservation ID is in the first column
+            input_reservations = [row[0] for row in input_reader if row]  # Assuming reservation ID is in the first column
         print(f"Total input reservations: {len(input_reservations)}")
-        print(f"Sample of input reservations: {list(input_reservations)[:5]}")
-
-        missing_data = {}
-        processed_reservations = set()
-        print(f"Reading processed reservations from: {self.csv_filename}")
-        with open(self.csv_filename, 'r') as existing_file:
-            reader = csv.DictReader(existing_file)
-            existing_headers = reader.fieldnames
-            for row in reader:
-                reservation_id = row['ReservationId']
-                processed_reservations.add(reservation_id)
-                missing_fields = []
-                for field in self.csv_headers:
-                    if field not in existing_headers or not row.get(field, ''):
-                        missing_fields.append(field)
-                if reservation_id in input_reservations and missing_fields:
-                    missing_data[reservation_id] = missing_fields
-        print(f"Total processed reservations: {len(processed_reservations)}")
-        print(f"Sample of processed reservations: {list(processed_reservations)[:5]}")
-
-        # Check for reservations in input but not in processed
-        missing_reservations = input_reservations - processed_reservations
-        for reservation_id in missing_reservations:
-            missing_data[reservation_id] = self.csv_headers  # All fields are missing
-        print(f"Reservations in input but not in processed: {len(missing_reservations)}")
-        print(f"Sample of missing reservations: {list(missing_reservations)[:5]}")
+        print(f"Total stored reservations: {len(self.store)}")
 
+        missing_data = self.store.find_incomplete(input_reservations)
+        not_stored = sum(1 for _, row in missing_data if row is None)
+        print(f"Reservations in input but not stored: {not_stored}")
         print(f"Total missing or incomplete reservations: {len(missing_data)}")
         return missing_data
 
     def update_missing_data(self, input_csv_path: str, start_reservation_id: str = None):
-        self.update_csv_headers()
         missing_data = self.identify_missing_data(input_csv_path)
         total_to_update = len(missing_data)
         
@@ -280,69 +463,54 @@ class ResWork(BaseAutomation):
         }
         start_processing = start_reservation_id is None
 
-        with open(self.csv_filename, 'r') as existing_file, open(self.temp_filename, 'w', newline='') as temp_file:
-            reader = csv.DictReader(existing_file)
-            writer = csv.DictWriter(temp_file, fieldnames=self.csv_headers)
-            writer.writeheader()
+        for reservation_id, existing_row in missing_data:
+            if not self.should_process_reservation(reservation_id, start_reservation_id, start_processing):
+                continue
 
-            existing_reservations = {row['ReservationId']: row for row in reader if row['ReservationId']}
-
-            for reservation_id in missing_data:
-                if not self.should_process_reservation(reservation_id, start_reservation_id, start_processing):
-                    continue
-
-                start_processing = True
-                self.process_reservation(reservation_id, existing_reservations, writer, stats, total_to_update)
-
-            self.write_remaining_reservations(existing_reservations, missing_data, writer)
+            start_processing = True
+            self.process_reservation(reservation_id, existing_row, stats, total_to_update)
 
         self.log_update_stats(stats, total_to_update)
-        os.replace(self.temp_filename, self.csv_filename)
+        self.export_csv()
 
     def should_process_reservation(self, reservation_id: str, start_reservation_id: str, start_processing: bool) -> bool:
         if reservation_id == start_reservation_id:
             return True
         return start_processing
 
-    def process_reservation(self, reservation_id: str, existing_reservations: Dict[str, Dict[str, str]], 
-                            writer: csv.DictWriter, stats: Dict[str, int], total_to_update: int):
-        if reservation_id in existing_reservations:
-            self.update_existing_reservation(reservation_id, existing_reservations, writer, stats, total_to_update)
+    def process_reservation(self, reservation_id: str, existing_row: Optional[Dict[str, str]], stats: Dict[str, int], total_to_update: int):
+        if existing_row:
+            self.update_existing_reservation(reservation_id, existing_row, stats, total_to_update)
         else:
-            self.add_new_reservation(reservation_id, writer, stats, total_to_update)
+            self.add_new_reservation(reservation_id, stats, total_to_update)
 
-    def update_existing_reservation(self, reservation_id: str, existing_reservations: Dict[str, Dict[str, str]], 
-                                    writer: csv.DictWriter, stats: Dict[str, int], total_to_update: int):
-        row = existing_reservations[reservation_id]
+    def update_existing_reservation(self, reservation_id: str, row: Dict[str, str], stats: Dict[str, int], total_to_update: int):
         if row.get('ResStatus') == "Cancelled":
             self.logger.info(f"Skipping cancelled reservation: {reservation_id}")
             stats['skipped_count'] += 1
-            writer.writerow(self.clean_row_data(row))
             return
 
         stats['updated_count'] += 1
         self.logger.info(f"Updating existing reservation {stats['updated_count']} of {total_to_update}: {reservation_id}")
         try:
-            updated_row = self.process_single_reservation(reservation_id, None, row)
+            updated_row = self.process_single_reservation(reservation_id, row)
             cleaned_row = self.clean_row_data(updated_row)
             if any(cleaned_row.values()):
-                writer.writerow(cleaned_row)
+                self.store.upsert(cleaned_row)
             else:
                 self.logger.warning(f"Warning: Empty data for reservation {reservation_id}, keeping original data")
-                writer.writerow(self.clean_row_data(row))
         except Exception as e:
             self.logger.error(f"Error processing reservation {reservation_id}: {str(e)}")
-            writer.writerow(self.clean_row_data(row))
             stats['error_count'] += 1
 
-    def add_new_reservation(self, reservation_id: str, writer: csv.DictWriter, stats: Dict[str, int], total_to_update: int):
+    def add_new_reservation(self, reservation_id: str, stats: Dict[str, int], total_to_update: int):
         stats['added_count'] += 1
         self.logger.info(f"Adding new reservation {stats['added_count']} of {total_to_update}: {reservation_id}")
         try:
-            new_row = self.process_single_reservation(reservation_id, None)
+            new_row = self.process_single_reservation(reservation_id)
             cleaned_row = self.clean_row_data(new_row)
             if any(cleaned_row.values()):
-                writer.writerow(cleaned_row)
+                self.store.upsert(cleaned_row)
             else:
                 self.logger.warning(f"Warning: Empty data for new reservation {reservation_id}, skipping")
                 stats['error_count'] += 1
@@ -350,12 +518,6 @@ class ResWork(BaseAutomation):
             self.logger.error(f"Error processing new reservation {reservation_id}: {str(e)}")
             stats['error_count'] += 1
 
-    def write_remaining_reservations(self, existing_reservations: Dict[str, Dict[str, str]], 
-                                     missing_data: Dict[str, List[str]], writer: csv.DictWriter):
-        for reservation_id, row in existing_reservations.items():
-            if reservation_id not in missing_data:
-                writer.writerow(self.clean_row_data(row))
-
     def log_update_stats(self, stats: Dict[str, int], total_to_update: int):
         self.logger.info(f"Update completed. Updated {stats['updated_count']} reservations, "
                          f"added {stats['added_count']} new reservations, "
@@ -371,52 +533,13 @@ class ResWork(BaseAutomation):
                 cleaned_row[field] = ""
         return cleaned_row
 
-    def update_csv_headers(self):
-        temp_filename = 'temp_output.csv'
-        headers_updated = False
-
-        with open(self.csv_filename, 'r') as input_file, open(temp_filename, 'w', newline='') as output_file:
-            reader = csv.reader(input_file)
-            writer = csv.writer(output_file)
-
-            # Read existing headers
-            existing_headers = next(reader, None)
-
-            if existing_headers != self.csv_headers:
-                # Write new headers
-                writer.writerow(self.csv_headers)
-                headers_updated = True
-
-                # Create a mapping from old to new header positions
-                header_map = {header: i for i, header in enumerate(existing_headers)}
-
-                # Write data rows
-                for row in reader:
-                    new_row = [''] * len(self.csv_headers)
-                    for i, header in enumerate(self.csv_headers):
-                        if header in header_map:
-                            new_row[i] = row[header_map[header]]
-                    writer.writerow(new_row)
-            else:
-                # If headers are already up to date, just write everything as is
-                writer.writerow(existing_headers)
-                for row in reader:
-                    writer.writerow(row)
-
-        if headers_updated:
-            os.replace(temp_filename, self.csv_filename)
-            print("Updated CSV headers to include new fields.")
-        else:
-            os.remove(temp_filename)
-            print("CSV headers are already up to date.")
-
-    def process_single_reservation(self, reservation_id: str, writer: csv.DictWriter, existing_data: Dict[str, str] = None) -> Dict[str, str]:
+    def process_single_reservation(self, reservation_id: str, existing_data: Dict[str, str] = None) -> Dict[str, str]:
         if not self.search_and_load_reservation(reservation_id):
             return {field: "" for field in self.csv_headers}
 
         reservation_data = self.extract_reservation_data(reservation_id)
 
-        if not reservation_data:
+        if not any(reservation_data[field] for field in RESERVATION_FIELDS):
             time.sleep(2)
             reservation_data = self.extract_reservation_data(reservation_id)
         
@@ -426,20 +549,14 @@ class ResWork(BaseAutomation):
         if self.should_process_guest_bill(reservation_data):
             self.process_guest_bill(reservation_data)
 
-        cleaned_data = self.clean_reservation_data(reservation_data)
-
-        if writer:
-            self.write_reservation_data(writer, cleaned_data)
-
-        return cleaned_data
+        return self.clean_reservation_data(reservation_data)
 
-    def search_and_load_reservation(self, reservation_id: str, max_attempts: int = 3, wait_time: int = 2) -> bool:
+    def search_and_load_reservation(self, reservation_id: str, max_attempts: int = 3) -> bool:
         for attempt in range(max_attempts):
-            self.search_reservation(reservation_id)
-            time.sleep(wait_time)  # Wait for the page to load
+            outcome = self.search_reservation(reservation_id)
 
             # Check if we're on the search results page
-            if self.selenium_helper.is_element_visible_by_dimensions(By.CLASS_NAME, "ReservationSearchScreen", timeout=1):
+            if outcome == "results":
                 self.logger.info(f"Search results detected for ResID: {reservation_id}")
                 if self.handle_search_results(reservation_id):
                     return self.is_reservation_loaded(reservation_id)
@@ -477,23 +594,17 @@ class ResWork(BaseAutomation):
 
         return cleaned_data
 
-    def write_reservation_data(self, writer: csv.DictWriter, reservation_data: Dict[str, str]):
-        try:
-            writer.writerow(reservation_data)
-        except ValueError as e:
-            self.logger.error(f"Error writing row for reservation {reservation_data.get('ReservationId')}: {str(e)}")
-            self.logger.error(f"Reservation data: {reservation_data}")
-            raise
-
-    def search_reservation(self, reservation_id: str):
+    def search_reservation(self, reservation_id: str) -> Optional[str]:
         search_input = self.selenium_helper.wait_for_element(By.XPATH, RMS_XPaths.SEARCH_INPUT)
         if search_input:
             search_input.clear()
             search_input.send_keys(reservation_id)
             search_input.send_keys(Keys.RETURN)
-            time.sleep(4)
-        else:
-            self.logger.error("Failed to find search input")
+            return self.selenium_helper.pacer.settle(
+                "search_reservation", lambda driver: driver.execute_script(_SEARCH_OUTCOME_JS, reservation_id), fallback=6
+            )
+        self.logger.error("Failed to find search input")
+        return None
 
     def is_reservation_loaded(self, reservation_id: str, max_attempts: int = 3, wait_time: int = 2) -> bool:
         for attempt in range(max_attempts):
@@ -505,25 +616,21 @@ class ResWork(BaseAutomation):
                     return True
                 else:
                     self.logger.warning(f"Attempt {attempt + 1}: Expected reservation {reservation_id}, but found {loaded_res_id}")
-                    time.sleep(wait_time)
+                    sleep_within_deadline(wait_time)
             except Exception as e:
                 self.logger.warning(f"Attempt {attempt + 1}: Error checking reservation ID: {str(e)}")
-                time.sleep(wait_time)
+                sleep_within_deadline(wait_time)
         
         self.logger.error(f"Failed to load reservation {reservation_id} after {max_attempts} attempts")
         return False
 
     def handle_search_results(self, reservation_id: str) -> bool:
         try:
-            grid_container = self.selenium_helper.wait_until_stable(
-                By.XPATH, '//*[@id="MainWindow"]/div/div/div[2]/div[2]/div/div[2]/div/div/div[2]/div',
+            rows = self.selenium_helper.with_cached(
+                By.XPATH, SEARCH_RESULTS_CONTAINER,
+                lambda container: container.find_elements(By.XPATH, './/div[contains(@class, "GridLiteRow")]'),
                 timeout=20
             )
-            if not grid_container:
-                self.logger.error("Failed to find stable grid container")
-                return False
-
-            rows = grid_container.find_elements(By.XPATH, './/div[contains(@class, "GridLiteRow")]')
             self.logger.info(f"Found {len(rows)} rows in search results")
             
             for row in rows:
@@ -537,9 +644,14 @@ class ResWork(BaseAutomation):
                         self.logger.info(f"Found matching reservation: {reservation_id}")
                         # Click the anchor tag using wait_and_click
                         if self.selenium_helper.wait_and_click(By.XPATH, f"({anchor_xpath})[contains(text(), '{reservation_id}')]"):
-                            time.sleep(3)
                             # Wait for the reservation to load after clicking
-                            return self.selenium_helper.wait_for_element(By.CLASS_NAME, "res-screen-info-bar-resid", timeout=10) is not None
+                            self.selenium_helper.pacer.wait(
+                                "open_search_result",
+                                lambda driver: driver.find_elements(By.CLASS_NAME, "res-screen-info-bar-resid")
+                                and driver.execute_script(_SEARCH_OUTCOME_JS, reservation_id) == "reservation",
+                                timeout=13
+                            )
+                            return True
                         else:
                             self.logger.error(f"Failed to click reservation {reservation_id}")
                             return False
@@ -560,16 +672,14 @@ class ResWork(BaseAutomation):
             return False
 
     def extract_reservation_data(self, reservation_id):
+        fields = self.selenium_helper.extract_fields(RESERVATION_FIELDS, timeout=DEFAULT_TIMEOUT)
+        missing_fields = [name for name, value in fields.items() if value is None]
+        if missing_fields:
+            self.logger.warning(f"Fields not found for reservation {reservation_id}: {', '.join(missing_fields)}")
+
         data = {"ReservationId": reservation_id}
-        
-        data["ArriveDate"] = self.selenium_helper.get_element_text(By.XPATH, '//*[@id="GridRow-Arrive"]/label')
-        data["DepartDate"] = self.selenium_helper.get_element_text(By.XPATH, "//*[@id='GridRow-Depart']/label")
-        data["ResStatus"] = self.selenium_helper.get_element_value(By.XPATH, "//*[@id='GridRow-Status']/input")
-        data["LegacyResId"] = self.selenium_helper.get_element_value(By.XPATH, "//*[@id='GridRow-Spare10']/input")
-        data["BaseRate"] = self.selenium_helper.get_element_value(By.XPATH, "//*[@id='GridRow-BaseTariff']/input")
-        data["TotalRate"] = self.selenium_helper.get_element_value(By.XPATH, "//*[@id='GridRow-TotalTariff']/input")
-        data["GuestBill"] = self.selenium_helper.get_element_value(By.XPATH, "//*[@id='GridRow-Acc_General']/input")
-        data["ResNote"] = self.selenium_helper.get_element_value(By.ID, "ResNote")
+        for name, value in fields.items():
+            data[name] = value if value is not None else ""
         data["ItemizedBill"] = "" # gets populated in another function
         
         return data
@@ -579,10 +689,12 @@ class ResWork(BaseAutomation):
             guest_bill_link = self.selenium_helper.wait_for_element(By.XPATH, RMS_XPaths.GUEST_BILL_LINK)
             guest_bill_link.click()
             self.logger.info("Clicked on the guest bill link")
-            time.sleep(4)
 
-            accounts_data_grid = self.selenium_helper.wait_for_element(By.CLASS_NAME, "AccountsDataGrid")
+            self.selenium_helper.pacer.wait("open_guest_bill", EC.presence_of_element_located((By.CLASS_NAME, "AccountsDataGrid")))
             self.logger.info("Found the AccountsDataGrid")
+            self.selenium_helper.pacer.settle(
+                "load_guest_bill", lambda driver: self.guest_bill_manager.get_grid_rows(timeout=0), fallback=4
+            )
 
             if self.remove_fees:
                 self.guest_bill_manager.remove_fees(fees_to_remove)
@@ -590,7 +702,7 @@ class ResWork(BaseAutomation):
             if self.remove_journal:
                 self.guest_bill_manager.remove_smallest_journal()
 
-            itemized_bill = self.extract_itemized_bill(accounts_data_grid)
+            itemized_bill = self.extract_itemized_bill()
             reservation_data["ItemizedBill"] = itemized_bill
         except TimeoutException:
             self.logger.error("Timeout while trying to process guest bill")
@@ -601,26 +713,19 @@ class ResWork(BaseAutomation):
 
         self.close_guest_bill_modal()
 
-    def extract_itemized_bill(self, accounts_data_grid: WebElement):
-        line_items = accounts_data_grid.find_element(By.XPATH, './/div[contains(@class, "GridLiteRowsContainer")]')
-        rows = line_items.find_elements(By.XPATH, './/div[contains(@class, "GridLiteRow")]')
+    def extract_itemized_bill(self):
+        rows = self.guest_bill_manager.get_grid_rows(columns=[0, 2, 3, 4, 5])
         itemized_bill = []
 
         for index, row in enumerate(rows):
-            columns = row.find_elements(By.XPATH, './/div[contains(@class, "GridLiteColumn")]')
-            if len(columns) >= 6:
-                try:
-                    date = self.selenium_helper.sanitize_text(columns[0].text)
-                    description = self.selenium_helper.sanitize_text(columns[2].text)
-                    debit = self.selenium_helper.sanitize_text(columns[3].text)
-                    credit = self.selenium_helper.sanitize_text(columns[4].text)
-                    balance = self.selenium_helper.sanitize_text(columns[5].text)
-
-                    if date or description or debit or credit or balance:
-                        item = f"{date} | {description} | Debit: {debit} | Credit: {credit} | Balance: {balance}"
-                        itemized_bill.append(item)
-                except Exception as e:
-                    print(f"Error processing row {index + 1}: {str(e)}")
+            try:
+                date, description, debit, credit, balance = [self.selenium_helper.sanitize_text(cell) for cell in row.cells]
+
+                if date or description or debit or credit or balance:
+                    item = f"{date} | {description} | Debit: {debit} | Credit: {credit} | Balance: {balance}"
+                    itemized_bill.append(item)
+            except Exception as e:
+                print(f"Error processing row {index + 1}: {str(e)}")
 
         print(f"Processed {len(itemized_bill)} items for the itemized bill")
         return " || ".join(itemized_bill)
@@ -640,11 +745,16 @@ def main():
     parser.add_argument("--update", action="store_true", help="Update mode: process only missing data")
     parser.add_argument("--removefees", action="store_true", help="Remove specified fees from guest bills")
     parser.add_argument("--removejournal", action="store_true", help="Remove smallest journal from guest bill")
+    parser.add_argument("--workers", type=int, default=1, help="Number of browsers processing reservations in parallel")
+    parser.add_argument("--export", action="store_true", help="Only export the reservation store to the output CSV, without a browser")
+    add_sink_arguments(parser)
     args = parser.parse_args()
 
     setup_logging("res_work")
 
-    res_work = ResWork(args.username, args.password, args.csv_file, args.start, args.headers, args.update, args.removefees, args.removejournal, args.debug)
+    res_work = ResWork(args.username, args.password, args.csv_file, args.start, args.headers, args.update, args.removefees, args.removejournal, args.debug, args.workers, args.export,
+                      SinkConfig.from_args(args))
+    res_work.apply_common_args(args)
     res_work.run()
 
 if __name__ == "__main__":
@@ -0,0 +1,72 @@
+import argparse
+import re
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from includes.BookingStore import open_bookings
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head><title>Booking {reservation_id}</title></head>
+<body>
+<div id="booking_view">
+{table_html}
+</div>
+</body>
+</html>
+"""
+
+LOCKED_PAGE = """<!DOCTYPE html>
+<html>
+<body>
+<div id="locked_session_dialog"><input id="password" type="password"><button class="confirm_button">Unlock</button></div>
+</body>
+</html>
+"""
+
+def make_handler(bookings_folder: str, locked_every: int):
+    state = {"requests": 0}
+    bookings = open_bookings(bookings_folder)
+
+    class SavedBookingHandler(BaseHTTPRequestHandler):
+        """Serves saved bookings as /bookings_view/<id> pages, like Newbook does."""
+        def do_GET(self):
+            match = re.fullmatch(r"/bookings_view/(\w+)", self.path.split("?")[0])
+            if not match:
+                self.send_error(404)
+                return
+
+            state["requests"] += 1
+            if locked_every and state["requests"] % locked_every == 0:
+                self.send_page(LOCKED_PAGE)
+                return
+
+            table_html = bookings.read(match.group(1)) or ""
+            self.send_page(PAGE_TEMPLATE.format(reservation_id=match.group(1), table_html=table_html))
+
+        def send_page(self, page: str):
+            body = page.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return SavedBookingHandler
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for Newbook booking pages, serving saved booking HTML")
+    parser.add_argument("--bookings", default="bookings", help="Saved bookings: a booking store or a legacy folder of <reservation id>.html files")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    parser.add_argument("--locked-every", type=int, default=0, help="Answer every Nth request with the locked session dialog")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args.bookings, args.locked_every))
+    print(f"Serving {args.bookings} at http://127.0.0.1:{args.port}/bookings_view/ (use it as --base-url)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
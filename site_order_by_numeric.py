@@ -1,11 +1,13 @@
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.action_chains import ActionChains
-from selenium.webdriver.remote.webelement import WebElement
+from selenium.common.exceptions import TimeoutException
+from typing import List
 import time
 import re
 from includes.logging_config import setup_logging
 from includes.constants import DEFAULT_TIMEOUT, RMS_CATEGORY_URL, RMS_XPaths
 from includes.BaseAutomation import BaseAutomation
+from includes.SeleniumHelper import GridRow
 from includes.argument_parser_utility import create_base_parser
 
 class SiteOrderManager(BaseAutomation):
@@ -32,25 +34,28 @@ class SiteOrderManager(BaseAutomation):
         else:
             self.logger.error("Failed to open Display Order panel")
 
-    def get_site_rows(self):
-        container = self.selenium_helper.wait_for_element(By.XPATH, RMS_XPaths.CATEGORY_DISPLAY_ORDER, timeout=DEFAULT_TIMEOUT)
-        if container:
-            return container.find_elements(By.XPATH, './/div[contains(@class, "GridLiteRow")]')
-        else:
+    def get_site_rows(self) -> List[GridRow]:
+        try:
+            return self.selenium_helper.snapshot_grid(
+                (By.XPATH, RMS_XPaths.CATEGORY_DISPLAY_ORDER),
+                cell_xpath='.//div[contains(@class, "GridLiteCellContents")]', timeout=DEFAULT_TIMEOUT
+            )
+        except TimeoutException:
             self.logger.error("Failed to find site rows container")
             return []
 
-    def get_site_number(self, row: WebElement):
+    def get_site_number(self, row: GridRow):
         try:
-            cell_content = row.find_element(By.XPATH, './/div[contains(@class, "GridLiteCellContents")]').text
+            cell_content = row.cells[0]
             match = re.search(r'\d+', cell_content)
             return int(match.group()) if match else None
         except Exception as e:
             self.logger.error(f"Error extracting site number: {str(e)}")
             return None
 
-    def move_row_to_position(self, row, current_position, target_position):
-        ActionChains(self.driver).move_to_element(row).click().perform()
+    def move_row_to_position(self, row: GridRow, current_position, target_position):
+        row_element = self.selenium_helper.get_row_element(row)
+        ActionChains(self.driver).move_to_element(row_element).click().perform()
         
         moves = abs(target_position - current_position)
         direction = "up" if target_position < current_position else "down"
@@ -100,6 +105,7 @@ def main():
     setup_logging("site_order_by_numeric")
 
     site_order_manager = SiteOrderManager(args.username, args.password, args.debug)
+    site_order_manager.apply_common_args(args)
     site_order_manager.run()
 
 if __name__ == "__main__":
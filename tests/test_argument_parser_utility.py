@@ -0,0 +1,14 @@
+import argparse
+import pytest
+from includes.argument_parser_utility import parse_site_selection
+
+def test_ranges_and_single_sites():
+    assert parse_site_selection("10-12, 72") == {10, 11, 12, 72}
+
+def test_empty_parts_are_ignored():
+    assert parse_site_selection("5,,6,") == {5, 6}
+
+@pytest.mark.parametrize("value", ["", ",", "12-10", "a", "1-b"])
+def test_invalid_selections_are_rejected(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_site_selection(value)
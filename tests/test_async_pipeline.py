@@ -0,0 +1,39 @@
+import random
+import threading
+import time
+from includes.AsyncPipeline import AsyncPipeline
+
+def test_ordered_delivery_off_the_event_loop():
+    loop_thread = threading.get_ident()
+    parse_threads, sink_threads, delivered = set(), set(), []
+
+    def fetch(item):
+        time.sleep(random.random() / 100)
+        return item * 2
+
+    def parse(item, fetched):
+        parse_threads.add(threading.get_ident())
+        return fetched + 1
+
+    def sink(item, result, error):
+        sink_threads.add(threading.get_ident())
+        delivered.append((item, result, error))
+
+    stats = AsyncPipeline(fetch, parse, sink, concurrency=8).run(range(50))
+    assert delivered == [(item, item * 2 + 1, None) for item in range(50)]
+    assert stats["processed"] == 50
+    assert loop_thread not in parse_threads | sink_threads
+    assert len(sink_threads) == 1
+
+def test_failed_items_reach_the_sink_with_their_error():
+    def fetch(item):
+        if item == 3:
+            raise ValueError("broken")
+        return item
+
+    delivered = []
+    pipeline = AsyncPipeline(fetch, lambda item, fetched: fetched, lambda *args: delivered.append(args),
+                             concurrency=4, retries=1, base_delay=0, ordered=False)
+    stats = pipeline.run(range(5))
+    assert sorted(delivered, key=lambda entry: entry[0])[3] == (3, None, "broken")
+    assert (stats["processed"], stats["failed"], stats["retried"]) == (5, 1, 1)
@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from includes.BookingStore import BookingBlobStore, open_bookings
+
+TABLE = '<table><tr><th>Booking Billing</th></tr><tr><td style="x">Deposit <i class="icon"></i> $10.00</td></tr></table>'
+OTHER = "<table><tr><th>Booking Billing</th></tr><tr><td>Refund</td></tr></table>"
+
+@pytest.fixture
+def store(tmp_path):
+    store = BookingBlobStore(str(tmp_path / "bookings"), codec="gzip")
+    yield store
+    store.close()
+
+def test_identical_tables_are_stored_once(store):
+    first = store.put("1", TABLE, url="https://example.test/1")
+    second = store.put("2", TABLE, url="https://example.test/2")
+    store.put("3", OTHER)
+    assert first == second
+    assert store.stats()["bookings"] == 3
+    assert store.stats()["blobs"] == 2
+    assert store.record("2").url == "https://example.test/2"
+
+def test_tables_read_back_normalized(store):
+    store.put("1", TABLE)
+    assert store.read("1") == "<table><tr><th>Booking Billing</th></tr><tr><td>Deposit $10.00</td></tr></table>"
+    assert store.read("missing") is None
+
+def test_raw_tables_are_kept_as_given(tmp_path):
+    store = BookingBlobStore(str(tmp_path / "raw"), codec="gzip", normalize=False)
+    store.put("1", TABLE)
+    assert store.read("1") == TABLE
+    store.close()
+
+def test_read_many_keeps_order(store):
+    for reservation_id in ["3", "1", "2"]:
+        store.put(reservation_id, TABLE.replace("10.00", reservation_id))
+    with ThreadPoolExecutor(2) as executor:
+        assert [reservation_id for reservation_id, _ in store.read_many(["2", "3", "missing", "1"], executor)] == ["2", "3", "1"]
+
+def test_compact_drops_replaced_content(store):
+    store.put("1", TABLE)
+    store.put("1", OTHER)
+    assert store.stats()["blobs"] == 2
+    assert store.compact() > 0
+    assert store.stats()["blobs"] == 1
+    assert "Refund" in store.read("1")
+
+def test_legacy_folder_is_imported(tmp_path):
+    folder = tmp_path / "legacy"
+    folder.mkdir()
+    (folder / "42.html").write_text(f"<!-- URL: https://example.test/42 -->\n{OTHER}", encoding="utf-8")
+    store = open_bookings(str(folder), create=True)
+    assert store.reservation_ids() == ["42"]
+    assert store.read("42") == OTHER
+    store.close()
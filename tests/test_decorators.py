@@ -0,0 +1,85 @@
+import time
+import pytest
+from includes import decorators
+from includes.decorators import retry, retry_counters, retry_time_left
+from includes.ItemDeadline import ItemDeadlineExceeded
+
+class Flaky:
+    """Raises the given exceptions in turn, then returns 'ok'."""
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def call(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(decorators.time, "sleep", lambda seconds: None)
+
+def test_retries_until_success():
+    flaky = Flaky(KeyError(), KeyError())
+    assert retry(KeyError, tries=3, delay=0)(flaky.call)() == "ok"
+    assert flaky.calls == 3
+
+def test_gives_up_after_tries():
+    flaky = Flaky(KeyError(), KeyError(), KeyError())
+    with pytest.raises(KeyError):
+        retry(KeyError, tries=2, delay=0)(flaky.call)()
+    assert flaky.calls == 2
+
+def test_non_retryable_errors_are_raised_at_once():
+    flaky = Flaky(ItemDeadlineExceeded("stuck"))
+    with pytest.raises(ItemDeadlineExceeded):
+        retry(Exception, tries=3, delay=0)(flaky.call)()
+    assert flaky.calls == 1
+
+def test_no_retry_past_the_budget():
+    flaky = Flaky(KeyError(), KeyError())
+    with pytest.raises(KeyError):
+        retry(KeyError, tries=3, delay=5, jitter=0, budget=1)(flaky.call)()
+    assert flaky.calls == 1
+
+def test_nested_call_covered_by_outer_makes_one_attempt():
+    inner = Flaky(KeyError(), KeyError())
+    wrapped_inner = retry(KeyError, tries=3, delay=0)(inner.call)
+    outer = retry((KeyError, ValueError), tries=2, delay=0)(lambda: wrapped_inner())
+    with pytest.raises(KeyError):
+        outer()
+    assert inner.calls == 2  # one inner attempt per outer attempt, not 2 x 3
+
+def test_nested_call_keeps_its_tries_for_errors_the_outer_does_not_retry():
+    inner = Flaky(TimeoutError(), TimeoutError())
+    wrapped_inner = retry(TimeoutError, tries=3, delay=0)(inner.call)
+    outer = retry(KeyError, tries=3, delay=0)(lambda: wrapped_inner())
+    assert outer() == "ok"
+    assert inner.calls == 3
+
+def test_nested_calls_share_the_outer_deadline():
+    seen = []
+
+    @retry(TimeoutError, tries=3, delay=0, budget=100)
+    def inner():
+        seen.append(retry_time_left())
+
+    @retry(KeyError, tries=3, delay=0, budget=2)
+    def outer():
+        inner()
+
+    outer()
+    assert seen[0] <= 2
+    assert retry_time_left() is None
+
+def test_counters_record_outcomes():
+    @retry(KeyError, tries=2, delay=0)
+    def counted_flaky(flaky):
+        return flaky.call()
+
+    counted_flaky(Flaky(KeyError()))
+    with pytest.raises(KeyError):
+        counted_flaky(Flaky(KeyError(), KeyError()))
+    counters = retry_counters()[counted_flaky.__qualname__]
+    assert (counters["calls"], counters["retries"], counters["recovered"], counters["exhausted"]) == (2, 2, 1, 1)
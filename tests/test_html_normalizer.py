@@ -0,0 +1,40 @@
+import json
+import os
+import re
+import zipfile
+import pytest
+from includes.billing_parser import parse_billing_table
+from includes.html_normalizer import normalize_booking_html
+
+SAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "BookingViewer.zip")
+BOOKING_DATA = re.compile(r'const bookingData\s*=\s*(\{"\d+".*?\});\s*\n', re.S)
+
+def sample_bookings():
+    if not os.path.exists(SAMPLES):
+        return []
+    with zipfile.ZipFile(SAMPLES) as archive:
+        viewer = archive.read("co-booking-viewer.html").decode("utf-8")
+    return list(json.loads(BOOKING_DATA.search(viewer).group(1)).items())
+
+def test_whitespace_around_dropped_tags_collapses_once():
+    html = '<table><tr><td>Received <i class="icon"></i> <a href="#">payment</a>\n\t</td></tr></table>'
+    normalized = normalize_booking_html(html)
+    assert normalized == "<table><tr><td>Received payment </td></tr></table>"
+    assert normalize_booking_html(normalized) == normalized
+
+def test_unclosed_elements_are_closed():
+    assert normalize_booking_html("<table><tr><td>1 &amp; 2") == "<table><tr><td>1 &amp; 2</td></tr></table>"
+
+def test_sample_set_round_trip():
+    bookings = sample_bookings()
+    if not bookings:
+        pytest.skip("BookingViewer.zip not available")
+    not_idempotent, changed = [], []
+    for booking_id, html in bookings:
+        normalized = normalize_booking_html(html)
+        if normalize_booking_html(normalized) != normalized:
+            not_idempotent.append(booking_id)
+        if parse_billing_table(normalized).to_billing_info() != parse_billing_table(html).to_billing_info():
+            changed.append(booking_id)
+    assert not not_idempotent
+    assert not changed
@@ -0,0 +1,60 @@
+import pytest
+from includes.JobJournal import DONE, FAILED, PENDING, JobJournal, csv_recorded_items
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "journal.sqlite3")
+
+def interrupted_run(path):
+    journal = JobJournal("job", path)
+    journal.register(["a", "b", "c", "d"])
+    journal.begin("a")
+    journal.complete("a")
+    journal.begin("b")
+    journal.fail("b", "broken")
+    journal.begin("c")  # Still in flight when the run dies
+    journal.close()
+
+def test_resume_skips_done_and_failed_items(path):
+    interrupted_run(path)
+    journal = JobJournal("job", path)
+    assert journal.recover() == ["c"]
+    assert list(journal.remaining(["a", "b", "c", "d"])) == ["c", "d"]
+    assert journal.summary() == {PENDING: 2, "in_flight": 0, DONE: 1, FAILED: 1}
+
+def test_retry_failed_includes_failed_items(path):
+    interrupted_run(path)
+    journal = JobJournal("job", path)
+    journal.recover()
+    assert list(journal.remaining(["a", "b", "c", "d"], retry_failed=True)) == ["b", "c", "d"]
+    assert journal.failures() == [("b", 1, "broken")]
+    journal.begin("b")
+    journal.complete("b")
+    assert journal.status("b") == DONE
+    assert journal.failures() == []
+
+def test_recover_marks_items_with_output_done(path):
+    interrupted_run(path)
+    journal = JobJournal("job", path)
+    assert journal.recover(lambda item: item == "c") == []
+    assert journal.status("c") == DONE
+
+def test_register_keeps_existing_statuses(path):
+    interrupted_run(path)
+    journal = JobJournal("job", path)
+    assert journal.register(["a", "b", "e"]) == 1
+    assert (journal.status("a"), journal.status("b"), journal.status("e")) == (DONE, FAILED, PENDING)
+
+def test_jobs_are_kept_apart_and_reset(path):
+    interrupted_run(path)
+    other = JobJournal("other job", path)
+    assert not other.has_progress()
+    journal = JobJournal("job", path)
+    journal.reset()
+    assert JobJournal("job", path).summary()[DONE] == 0
+
+def test_csv_recorded_items(tmp_path):
+    output = tmp_path / "out.csv"
+    output.write_text("ReservationId,Data\n1,x\n2,y\n")
+    is_recorded = csv_recorded_items(str(output))
+    assert is_recorded("2") and not is_recorded("3")
@@ -0,0 +1,75 @@
+import pytest
+from includes.OutputSink import CsvSink, JsonlSink, SinkConfig, SqliteSink
+
+FIELDS = ["ReservationID", "BillingInfo"]
+
+@pytest.fixture
+def stem(tmp_path):
+    return str(tmp_path / "dump")
+
+def test_rows_are_buffered_until_batch_size(stem):
+    flushed = []
+    sink = CsvSink(stem, FIELDS, "ReservationID", batch_size=3, flush_interval=3600)
+    sink.write(["1", "a"], lambda: flushed.append("1"))
+    sink.write(["2", "b"], lambda: flushed.append("2"))
+    assert flushed == [] and sink.existing_parts() == []
+    sink.write(["3", "c"], lambda: flushed.append("3"))
+    assert flushed == ["1", "2", "3"]
+    assert [row["ReservationID"] for row in sink.read_rows()] == ["1", "2", "3"]
+    sink.close()
+
+def test_close_flushes_remaining_rows(stem):
+    flushed = []
+    with JsonlSink(stem, FIELDS, "ReservationID", batch_size=100, flush_interval=3600) as sink:
+        sink.write({"ReservationID": "1", "BillingInfo": "a"}, lambda: flushed.append("1"))
+    assert flushed == ["1"]
+    assert list(JsonlSink(stem, FIELDS).read_rows()) == [{"ReservationID": "1", "BillingInfo": "a"}]
+
+def test_maybe_flush_writes_rows_older_than_flush_interval(stem):
+    flushed = []
+    sink = CsvSink(stem, FIELDS, batch_size=100, flush_interval=5)
+    sink.write(["1", "a"], lambda: flushed.append("1"))
+    sink.maybe_flush()
+    assert flushed == []
+    sink.last_flush -= 5
+    sink.maybe_flush()
+    assert flushed == ["1"]
+    sink.close()
+
+def test_rotation_starts_numbered_parts(stem):
+    with CsvSink(stem, FIELDS, "ReservationID", batch_size=1, rotate_bytes=10) as sink:
+        for number in range(3):
+            sink.write([str(number), "x" * 20])
+    parts = CsvSink(stem, FIELDS).existing_parts()
+    assert parts == [f"{stem}.csv", f"{stem}.0001.csv", f"{stem}.0002.csv"]
+    reopened = CsvSink(stem, FIELDS, "ReservationID")
+    assert reopened.written_keys() == {"0", "1", "2"}
+    assert reopened.path == f"{stem}.0002.csv"
+
+def test_reset_removes_every_part(stem):
+    with CsvSink(stem, FIELDS, batch_size=1, rotate_bytes=10) as sink:
+        sink.write(["1", "x" * 20])
+        sink.write(["2", "x" * 20])
+    sink = CsvSink(stem, FIELDS)
+    sink.reset()
+    assert sink.existing_parts() == []
+
+def test_gzip_parts_append_across_runs(stem):
+    for number in range(2):
+        with CsvSink(stem, FIELDS, "ReservationID", compression="gzip") as sink:
+            sink.write([str(number), "a"])
+    assert CsvSink(stem, FIELDS, "ReservationID", compression="gzip").written_keys() == {"0", "1"}
+
+def test_recorded_check_filters_rows(stem):
+    with SqliteSink(stem, FIELDS, "ReservationID") as sink:
+        sink.write(["1", "ok"])
+        sink.write(["2", "Error: timeout"])
+        sink.write(["1", "ok again"])
+    is_recorded = SqliteSink(stem, FIELDS, "ReservationID").recorded_check(lambda row: not row["BillingInfo"].startswith("Error"))
+    assert is_recorded("1") and not is_recorded("2")
+
+def test_sink_config_opens_the_chosen_format(stem):
+    sink = SinkConfig("jsonl", "gzip", rotate_mb=1, batch_size=7).open(stem, FIELDS, "ReservationID")
+    assert isinstance(sink, JsonlSink)
+    assert sink.path == f"{stem}.jsonl.gz"
+    assert (sink.batch_size, sink.rotate_bytes) == (7, 1024 * 1024)
@@ -0,0 +1,48 @@
+import csv
+import pytest
+from includes.ReservationStore import ReservationStore
+
+FIELDS = ["ReservationId", "ResStatus", "GuestBill"]
+
+@pytest.fixture
+def store(tmp_path):
+    store = ReservationStore(str(tmp_path / "reservations.sqlite3"), FIELDS)
+    yield store
+    store.close()
+
+def test_find_incomplete_returns_missing_and_partial_rows_in_input_order(store):
+    store.upsert({"ReservationId": "1", "ResStatus": "Arrived", "GuestBill": "10.00"})
+    store.upsert({"ReservationId": "2", "ResStatus": "Arrived", "GuestBill": ""})
+    incomplete = store.find_incomplete(["3", "1", "2", "3"])
+    assert incomplete == [("3", None), ("2", {"ReservationId": "2", "ResStatus": "Arrived", "GuestBill": ""})]
+
+def test_find_incomplete_can_run_repeatedly(store):
+    store.upsert({"ReservationId": "1", "ResStatus": "Arrived", "GuestBill": "1"})
+    assert store.find_incomplete(["1", "2"]) == [("2", None)]
+    assert store.find_incomplete(["1"]) == []
+
+def test_upsert_replaces_the_stored_row(store):
+    store.upsert({"ReservationId": "1", "ResStatus": "Confirmed"})
+    store.upsert({"ReservationId": "1", "ResStatus": "Arrived", "GuestBill": "5"})
+    assert len(store) == 1
+    assert store.get("1") == {"ReservationId": "1", "ResStatus": "Arrived", "GuestBill": "5"}
+
+def test_rows_without_a_key_are_rejected(store):
+    with pytest.raises(ValueError):
+        store.upsert({"ResStatus": "Arrived"})
+
+def test_csv_round_trip_and_new_fields(tmp_path):
+    source = tmp_path / "in.csv"
+    source.write_text("GuestBill,ReservationId\n3.00,7\n,8\n4.00,7\n", encoding="utf-8")
+    path = str(tmp_path / "reservations.sqlite3")
+    store = ReservationStore(path, FIELDS)
+    assert store.import_csv(str(source)) == 3
+    store.close()
+
+    store = ReservationStore(path, FIELDS + ["ResNote"])
+    exported = tmp_path / "out.csv"
+    assert store.export_csv(str(exported)) == 2
+    with open(exported, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert rows[0] == {"ReservationId": "7", "ResStatus": "", "GuestBill": "4.00", "ResNote": ""}
+    store.close()
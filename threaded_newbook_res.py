@@ -1,33 +1,92 @@
 import csv
-import os
+import json
 import queue
 import time
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
-from selenium.webdriver.remote.webelement import WebElement
-from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import WebDriverException
 from includes.logging_config import setup_logging, get_logger
-from includes.constants import DEFAULT_TIMEOUT, NB_RESERVATION_URL
+from includes.constants import DEFAULT_TIMEOUT, NB_RESERVATION_URL, NB_CO_LOGIN_CODE
+from includes.billing_parser import TABLE_NOT_FOUND, is_failure_info, parse_billing_table
+from includes.OutputSink import OutputSink, SinkConfig
+from includes.BookingStore import BookingBlobStore
 from includes.BaseAutomation import BaseAutomation
-from includes.SeleniumHelper import SeleniumHelper
-from includes.argument_parser_utility import create_base_parser
+from includes.argument_parser_utility import create_base_parser, add_sink_arguments
 import includes.globals as globals
 
+# Registered with Chrome for each booking tab, so it runs at the start of every page the tab loads
+# (or, where that is not possible, run right after navigating). Records the tab's slot as ready in
+# localStorage, which every tab of the origin shares, as soon as the Booking Billing table exists.
+READY_OBSERVER_JS = """
+(function (slot) {
+var key = 'bookingReady:' + slot;
+window.__bookingReady = false;
+try { window.localStorage.removeItem(key); } catch (e) {}
+function isReady() {
+    var headers = document.getElementsByTagName('th');
+    for (var i = 0; i < headers.length; i++) {
+        if (headers[i].textContent.indexOf('Booking Billing') !== -1) {
+            return true;
+        }
+    }
+    return false;
+}
+function markReady() {
+    window.__bookingReady = true;
+    try { window.localStorage.setItem(key, String(Date.now())); } catch (e) {}
+}
+if (isReady()) {
+    markReady();
+} else {
+    var observer = new MutationObserver(function() {
+        if (isReady()) {
+            observer.disconnect();
+            markReady();
+        }
+    });
+    observer.observe(document, {childList: true, subtree: true});
+}
+})(__SLOT__);
+"""
+
+# Reads and clears every ready marker from whichever tab is currently focused
+READY_SLOTS_JS = """
+var ready = [];
+try {
+    for (var i = window.localStorage.length - 1; i >= 0; i--) {
+        var key = window.localStorage.key(i);
+        if (key && key.indexOf('bookingReady:') === 0) {
+            ready.push(key.substring('bookingReady:'.length));
+            window.localStorage.removeItem(key);
+        }
+    }
+} catch (e) {
+    return [];
+}
+return ready;
+"""
+
 class ThreadedNewbookResDump(BaseAutomation):
     def __init__(self, username: str, password: str, data: List[str], num_tabs: int = 5, 
-                 start_reservation_id: str = None, debug: bool = False, batch_size: int = 10):
+                 start_reservation_id: str = None, debug: bool = False, sink_config: SinkConfig = SinkConfig(batch_size=10),
+                 normalize_html: bool = True):
         super().__init__(username, password, debug)
         self.logger = get_logger('ThreadedNewbookResDump')
         self.data = data
         self.num_tabs = num_tabs
         self.start_reservation_id = start_reservation_id
-        self.output_csv = "newbook_co_res_dump_threaded.csv"
+        self.output_stem = "newbook_co_res_dump_threaded"
         self.bookings_folder = "bookings"
+        self.booking_store: Optional[BookingBlobStore] = None
+        self.normalize_html = normalize_html
         self.work_queue = queue.Queue()
-        self.result_queue = queue.Queue()
-        self.batch_size = batch_size
+        self.sink_config = sink_config
+        self.sink: Optional[OutputSink] = None
+        self.poll_interval = 0.1
+        self.tab_timeout = DEFAULT_TIMEOUT * 3
+        self.ready_observers_registered = False
 
     def setup(self):
         options = Options()
@@ -36,100 +95,141 @@ class ThreadedNewbookResDump(BaseAutomation):
         options.add_argument("--no-sandbox")
         options.add_argument("--disable-dev-shm-usage")
         self.driver = webdriver.Chrome(options=options)
-        self.selenium_helper = SeleniumHelper(self.driver)
+        self.selenium_helper = self.create_selenium_helper(self.driver)
 
-        if not os.path.exists(self.bookings_folder):
-            os.makedirs(self.bookings_folder)
+        self.booking_store = BookingBlobStore(self.bookings_folder, normalize=self.normalize_html)
 
-        if self.start_reservation_id and os.path.exists(self.output_csv):
+        self.sink = self.sink_config.open(self.output_stem, ["ReservationID", "BillingInfo"], key_field="ReservationID")
+        output_path = self.sink.part_path(0)
+        self.open_journal(f"{self.__class__.__name__}:{output_path}", self.data, self.sink.recorded_check(lambda row: not is_failure_info(str(row["BillingInfo"]))))
+        if self.start_reservation_id and self.sink.existing_parts():
             self.logger.info(f"Resuming from reservation ID: {self.start_reservation_id}")
+        elif self.journal.has_progress() and self.sink.existing_parts():
+            self.logger.info(f"Resuming {output_path} from the job journal")
         else:
-            self.write_csv_header()
+            self.sink.reset()
 
     def perform_automation(self):
-        self.login(isNewbook=True)
-        self.populate_work_queue()
-        self.process_reservations()
-        self.process_results()
+        try:
+            self.login(isNewbook=True)
+            self.populate_work_queue()
+            self.process_reservations()
+        finally:
+            self.sink.close()
+            self.booking_store.close()
 
-    def login(self, isNewbook: bool = True):
+    def session_tenant(self, isNewbook: bool = True) -> str:
+        if isNewbook:
+            return f"newbook-{NB_CO_LOGIN_CODE}"
+        return super().session_tenant(isNewbook)
+
+    def interactive_login(self, isNewbook: bool = True):
         if isNewbook:
             globals.NB_login_nopause(self.driver, self.username, self.password)
             self.logger.info("Main thread logged in successfully.")
         else:
-            super().login(isNewbook)
-
-    def write_csv_header(self):
-        with open(self.output_csv, 'w', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(["ReservationID", "BillingInfo"])
+            super().interactive_login(isNewbook)
 
     def populate_work_queue(self):
         start_processing = self.start_reservation_id is None
         for reservation_id in self.data:
             if self.start_reservation_id and reservation_id == self.start_reservation_id:
                 start_processing = True
-            if start_processing:
+            if start_processing and self.should_process(reservation_id):
                 self.work_queue.put(reservation_id)
 
     def process_reservations(self):
         window_handles = self.open_tabs()
-        tab_to_reservation: Dict[str, str] = {}
-        processed_count = 0
+        tab_to_reservation: Dict[str, Tuple[str, float]] = {}
         
         while not self.work_queue.empty() or tab_to_reservation:
+            self.sink.maybe_flush()
             # Fill empty tabs
-            for handle in window_handles:
+            for slot, handle in enumerate(window_handles):
                 if handle not in tab_to_reservation and not self.work_queue.empty():
                     reservation_id = self.work_queue.get()
                     self.driver.switch_to.window(handle)
                     url = f"{NB_RESERVATION_URL}{reservation_id}"
-                    self.driver.get(url)
-                    tab_to_reservation[handle] = reservation_id
+                    if self.ready_observers_registered:
+                        # Returns without waiting for the page, so the tabs load in parallel
+                        self.driver.execute_script("window.location.href = arguments[0];", url)
+                    else:
+                        self.driver.get(url)
+                        self.driver.execute_script(self.ready_observer_source(slot))
+                    self.journal.begin(reservation_id)
+                    tab_to_reservation[handle] = (reservation_id, time.time())
+
+            # Service whichever tabs reported ready, in the order they became ready
+            ready_handles = [window_handles[int(slot)] for slot in self.poll_ready_slots()]
+            ready_handles += self.find_stalled_tabs(tab_to_reservation)
 
-            # Process loaded tabs
-            for handle in list(tab_to_reservation.keys()):
-                reservation_id = tab_to_reservation[handle]
+            for handle in ready_handles:
+                if handle not in tab_to_reservation:
+                    continue
+                reservation_id, _ = tab_to_reservation.pop(handle)
                 self.driver.switch_to.window(handle)
                 if self.is_page_loaded():
                     self.process_loaded_reservation(reservation_id)
-                    del tab_to_reservation[handle]
-                    processed_count += 1
+                else:
+                    self.logger.warning(f"Booking billing table did not load within {self.tab_timeout}s for reservation: {reservation_id}")
+                    self.record_result(reservation_id, TABLE_NOT_FOUND, TABLE_NOT_FOUND)
 
-                    # Write results to CSV in batches
-                    if processed_count % self.batch_size == 0:
-                        self.write_results_to_csv()
-                    
-            time.sleep(0.5)  # Small delay to prevent excessive CPU usage
+            if not ready_handles:
+                time.sleep(self.poll_interval)
 
-        # Write any remaining results
-        self.write_results_to_csv()
+    def poll_ready_slots(self) -> List[str]:
+        try:
+            return self.driver.execute_script(READY_SLOTS_JS) or []
+        except WebDriverException as e:
+            self.logger.debug(f"Could not read ready markers: {str(e)}")
+            return []
+
+    def find_stalled_tabs(self, tab_to_reservation: Dict[str, Tuple[str, float]]) -> List[str]:
+        now = time.time()
+        return [handle for handle, (_, started) in tab_to_reservation.items() if now - started > self.tab_timeout]
 
     def open_tabs(self):
         for _ in range(self.num_tabs - 1):
             self.driver.execute_script("window.open('about:blank', '_blank');")
-        return self.driver.window_handles
+        window_handles = self.driver.window_handles
+        self.ready_observers_registered = self.register_ready_observers(window_handles)
+        return window_handles
 
-    def is_page_loaded(self):
+    def ready_observer_source(self, slot: int) -> str:
+        return READY_OBSERVER_JS.replace("__SLOT__", json.dumps(str(slot)))
+
+    def register_ready_observers(self, window_handles: List[str]) -> bool:
+        """Registers each tab's ready observer to run before the pages it loads; False if Chrome DevTools is not available."""
         try:
-            return self.selenium_helper.wait_for_element(By.XPATH, "//th[contains(text(), 'Booking Billing')]", timeout=0.1)
-        except TimeoutException:
+            for slot, handle in enumerate(window_handles):
+                self.driver.switch_to.window(handle)
+                self.driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": self.ready_observer_source(slot)})
+            return True
+        except (AttributeError, WebDriverException) as e:
+            self.logger.info(f"Ready observers not registered, installing them after each page load: {str(e)}")
             return False
 
+    def is_page_loaded(self):
+        # Zero-wait probe: the observer flag, or the header itself if the observer was never installed
+        if self.driver.execute_script("return window.__bookingReady === true;"):
+            return True
+        return len(self.driver.find_elements(By.XPATH, "//th[contains(text(), 'Booking Billing')]")) > 0
+
     def process_loaded_reservation(self, reservation_id: str):
         try:
             self.logger.info(f"Processing reservation: {reservation_id}")
             table = self.find_booking_billing_table()
             if table:
-                billing_info = self.extract_billing_info(table)
-                self.save_table_html(table, reservation_id)
-                self.result_queue.put((reservation_id, billing_info))
+                table_html = table.get_attribute('outerHTML')
+                billing_info = self.extract_billing_info(table_html)
+                self.save_table_html(table_html, reservation_id)
+                self.record_result(reservation_id, billing_info)
             else:
                 self.logger.warning(f"Booking billing table not found for reservation: {reservation_id}")
-                self.result_queue.put((reservation_id, "Table not found"))
+                self.record_result(reservation_id, TABLE_NOT_FOUND, TABLE_NOT_FOUND)
         except Exception as e:
             self.logger.error(f"Error processing reservation {reservation_id}: {str(e)}")
-            self.result_queue.put((reservation_id, f"Error: {str(e)}"))
+            self.record_result(reservation_id, f"Error: {str(e)}", str(e))
 
     def find_booking_billing_table(self):
         try:
@@ -142,47 +242,21 @@ class ThreadedNewbookResDump(BaseAutomation):
             self.logger.error(f"Error finding booking billing table: {str(e)}")
             return None
 
-    def extract_billing_info(self, table):
-        rows = table.find_elements(By.XPATH, ".//tbody/tr")
-        footer = table.find_elements(By.XPATH, ".//tfoot/tr/td")
-
-        billing_info = []
-        for row in rows:
-            cells = row.find_elements(By.TAG_NAME, "td")
-            if len(cells) >= 3:
-                key = cells[1].text.strip()
-                value = cells[2].text.strip()
-                billing_info.append(f"{key}:{value}")
-
-        if len(footer) >= 2:
-            billing_info.append(f"{footer[0].text.strip()}:{footer[1].text.strip()}")
-
-        return " | ".join(billing_info)
-
-    def save_table_html(self, table, reservation_id):
-        html_content = table.get_attribute('outerHTML')
-        current_url = self.driver.current_url
-        file_path = os.path.join(self.bookings_folder, f"{reservation_id}.html")
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(f"<!-- URL: {current_url} -->\n")
-            f.write(f"<!-- Reservation ID: {reservation_id} -->\n")
-            f.write(html_content)
+    def extract_billing_info(self, table_html: str) -> str:
+        return parse_billing_table(table_html).to_billing_info()
+
+    def save_table_html(self, html_content: str, reservation_id: str):
+        # The page URL goes in the store's index rather than a comment, so identical tables share one blob
+        self.booking_store.put(reservation_id, html_content, url=self.driver.current_url)
         self.logger.info(f"Saved HTML for reservation {reservation_id}")
 
-    def process_results(self):
-        with open(self.output_csv, 'a', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            while not self.result_queue.empty():
-                reservation_id, billing_info = self.result_queue.get()
-                writer.writerow([reservation_id, billing_info])
-
-    def write_results_to_csv(self):
-        with open(self.output_csv, 'a', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            while not self.result_queue.empty():
-                reservation_id, billing_info = self.result_queue.get()
-                writer.writerow([reservation_id, billing_info])
-        self.logger.info(f"Wrote batch of results to CSV")
+    def record_result(self, reservation_id: str, billing_info: str, error: Optional[str] = None):
+        if error is not None:
+            # Failures only go to the journal, so retrying them later does not leave a second row for the reservation
+            self.journal.fail(reservation_id, error)
+            return
+        # Results only count as done once the sink has written them, so rows lost in a crash are redone
+        self.sink.write([reservation_id, billing_info], lambda: self.journal.complete(reservation_id))
 
     def run(self, isNewbook: bool = True):
         try:
@@ -193,6 +267,8 @@ class ThreadedNewbookResDump(BaseAutomation):
         except Exception as e:
             self.logger.error(f"An error occurred: {str(e)}")
         finally:
+            self.close_journal()
+            self.log_reports()
             if self.driver:
                 self.driver.quit()
             self.logger.info("Script execution completed.")
@@ -207,6 +283,8 @@ def main():
     parser.add_argument("csv_file", help="Path to the CSV file containing reservation IDs")
     parser.add_argument("--start", help="Reservation ID to start processing from")
     parser.add_argument("--threads", type=int, default=5, help="Number of threads to use")
+    parser.add_argument("--raw-html", action="store_true", help="Save booking tables as fetched instead of normalized")
+    add_sink_arguments(parser, default_batch_size=20)
     args = parser.parse_args()
 
     logger = setup_logging("newbook_res_dump_threaded")
@@ -214,7 +292,9 @@ def main():
     reservation_ids = load_reservation_ids(args.csv_file)
     automation = ThreadedNewbookResDump(args.username, args.password, reservation_ids, 
                                         num_tabs=args.threads, start_reservation_id=args.start, 
-                                        debug=args.debug, batch_size=20)
+                                        debug=args.debug, sink_config=SinkConfig.from_args(args),
+                                        normalize_html=not args.raw_html)
+    automation.apply_common_args(args)
     automation.run(isNewbook=True)
 
 if __name__ == "__main__":